@@ -0,0 +1,138 @@
+"""
+Parse many Klageschriften in parallel and write one JSON line per document.
+
+Usage:
+
+	python batch.py ../*.pdf scans/ "archive/**/*.pdf" --output parsed.jsonl --workers 8
+
+Directories are searched recursively for PDFs, patterns are expanded with
+glob (to files only). Files that cannot be read are reported like documents
+that cannot be parsed, with an error line. Documents whose content hash is already in the output file are
+skipped, so an interrupted run can simply be restarted.
+"""
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fitz # type: ignore
+
+from parsing import get_info
+
+def expand_paths(patterns):
+	paths = []
+	for pattern in patterns:
+		if os.path.isdir(pattern):
+			for root, _, files in os.walk(pattern):
+				paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+		elif glob.has_magic(pattern):
+			# "dir/*" also matches subdirectories
+			paths.extend(path for path in glob.glob(pattern, recursive = True) if os.path.isfile(path))
+		else:
+			# Missing files are kept, so they are reported
+			paths.append(pattern)
+	seen = set()
+	unique = []
+	for path in sorted(paths):
+		key = os.path.abspath(path)
+		if key not in seen:
+			seen.add(key)
+			unique.append(path)
+	return unique
+
+def file_hash(path):
+	digest = hashlib.sha256()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(1 << 20), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+def done_hashes(output):
+	done = set()
+	if not output or not os.path.exists(output):
+		return done
+	with open(output, encoding = "utf-8") as f:
+		for line in f:
+			try:
+				record = json.loads(line)
+			except ValueError:
+				# A line cut off by an interrupted run
+				continue
+			if "error" not in record:
+				done.add(record.get("sha256"))
+	return done
+
+def parse_file(path, sha256):
+	start = time.perf_counter()
+	record = {"path": path, "sha256": sha256, "bytes": os.path.getsize(path)}
+	try:
+		with fitz.open(path) as doc:
+			record["pages"] = doc.page_count
+		record.update(get_info(path).to_dict())
+	except Exception as e:
+		record["error"] = f"{type(e).__name__}: {e}"
+	record["seconds"] = round(time.perf_counter() - start, 4)
+	return record
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Parse Klageschriften in parallel into JSON lines")
+	parser.add_argument("paths", nargs = "+", help = "PDF files, directories or glob patterns")
+	parser.add_argument("--output", "-o", help = "Append JSON lines to this file instead of stdout")
+	parser.add_argument("--workers", "-j", type = int, default = os.cpu_count() or 1)
+	parser.add_argument("--force", action = "store_true", help = "Parse documents already in the output file again")
+	args = parser.parse_args(argv)
+
+	start = time.perf_counter()
+	done = set() if args.force else done_hashes(args.output)
+	pending = []
+	unreadable = []
+	skipped = 0
+	for path in expand_paths(args.paths):
+		try:
+			sha256 = file_hash(path)
+		except OSError as e:
+			unreadable.append({"path": path, "error": f"{type(e).__name__}: {e}"})
+			continue
+		if sha256 in done:
+			skipped += 1
+			continue
+		# The same document under two names is only parsed once
+		done.add(sha256)
+		pending.append((path, sha256))
+
+	out = open(args.output, "a", encoding = "utf-8") if args.output else sys.stdout
+	stats = {"parsed": 0, "failed": 0, "pages": 0, "bytes": 0}
+	try:
+		with ProcessPoolExecutor(max_workers = max(1, args.workers)) as executor:
+			futures = [executor.submit(parse_file, path, sha256) for path, sha256 in pending]
+			for record in itertools.chain(unreadable, (future.result() for future in as_completed(futures))):
+				out.write(json.dumps(record, ensure_ascii = False) + "\n")
+				out.flush()
+				if "error" in record:
+					stats["failed"] += 1
+					print(f"{record['path']}: {record['error']}", file = sys.stderr)
+				else:
+					stats["parsed"] += 1
+					stats["pages"] += record["pages"]
+					stats["bytes"] += record["bytes"]
+	finally:
+		if out is not sys.stdout:
+			out.close()
+
+	seconds = time.perf_counter() - start
+	rate = lambda count: count / seconds if seconds else 0.0
+	print(
+		f"{stats['parsed']} parsed, {stats['failed']} failed, {skipped} skipped in {seconds:.2f} s "
+		f"with {args.workers} workers: {rate(stats['parsed']):.1f} documents/s, "
+		f"{rate(stats['pages']):.1f} pages/s, {rate(stats['bytes']) / 1e6:.2f} MB/s",
+		file = sys.stderr
+	)
+	return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -2,8 +2,7 @@ import fitz # type: ignore
 from docx import Document # type: ignore
 from python_docx_replace import docx_replace # type: ignore
 import re
-
-filename = "../Klageschrift.pdf"
+import sys
 
 class Address:
 	def __init__(self, street, city, po_box = None):
@@ -29,6 +28,9 @@ class Address:
 			space = " "
 		return ("," + space).join(parts)
 
+	def to_dict(self):
+		return {"street": self.street, "city": self.city, "po_box": self.po_box}
+
 
 class Entity:
 	def __init__(self, name, address, role = None, additional = None, representative = None):
@@ -59,6 +61,15 @@ class Entity:
 	def to_str(self):
 		return ", ".join([self.name, self.get_info()])
 
+	def to_dict(self):
+		return {
+			"name": self.name,
+			"address": self.address.to_dict(),
+			"role": self.role,
+			"additional": self.additional,
+			"representative": self.representative.to_dict() if self.representative else None
+		}
+
 class Header:
 	def __init__(self, court, plaintiff, defendant):
 		court.role = "Court"
@@ -75,6 +86,13 @@ class Header:
 		print("------------")
 		self.defendant.print()
 
+	def to_dict(self):
+		return {
+			"court": self.court.to_dict(),
+			"plaintiff": self.plaintiff.to_dict(),
+			"defendant": self.defendant.to_dict()
+		}
+
 class Argument:
 	def __init__(self, statement, evidence = None):
 		self.statement = statement
@@ -94,6 +112,9 @@ class Argument:
 			result += f" - {evidence}\n"
 		return result.strip()
 
+	def to_dict(self):
+		return {"statement": self.statement, "evidence": self.evidence or []}
+
 class Justification:
 	def __init__(self, formalities, jurisdiction, facts):
 		self.formalities = formalities
@@ -123,6 +144,13 @@ class Justification:
 			result += arg.to_string() + "\n"
 		return result.strip()
 
+	def to_dict(self):
+		return {
+			"formalities": [arg.to_dict() for arg in self.formalities],
+			"jurisdiction": [arg.to_dict() for arg in self.jurisdiction],
+			"facts": [arg.to_dict() for arg in self.facts]
+		}
+
 class Info:
 	def __init__(self, header, claims, justification):
 		self.header = header
@@ -155,6 +183,13 @@ class Info:
 		with open(filepath, "w", encoding = "utf-8") as f:
 			f.write(self.to_string(print_header))
 
+	def to_dict(self):
+		return {
+			"header": self.header.to_dict(),
+			"claims": self.claims,
+			"justification": self.justification.to_dict()
+		}
+
 def is_bold(span):
 	return "Bold" in span["font"]
 
@@ -350,9 +385,6 @@ def replace_placeholders_in_docx(template_path, output_path, replacements):
 	docx_replace(doc, **replacements)
 	doc.save(output_path)
 
-info = get_info(filename)
-header = info.header
-
 # replacements = {
 # 	"[court.name]" : header.court.name,
 # 	"[court.address]" : header.court.address.to_str(newline = True),
@@ -368,26 +400,32 @@ header = info.header
 # 	"[materielles]" : "Materielles"
 # }
 
-replacements = {
-	"court-name" : header.court.name,
-	"court-address" : header.court.address.to_str(newline = True),
-	"plaintiff-name" : header.plaintiff.name,
-	"plaintiff-info" : header.plaintiff.get_info(),
-	"plaintiff-representative" : "vetreten durch RA " + header.plaintiff.representative.to_str(),
-	"defendant-name" : header.defendant.name,
-	"defendant-info" : header.defendant.get_info(),
-	"defendant-representative" : "vetreten durch RA " + header.defendant.representative.to_str(),
-	"representative-name" : header.defendant.representative.name,
-	"counter" : "Counter arguments",
-	"formelles" : "Formelles dummy",
-	"materielles" : "Materielles"
-}
-
-for key in replacements:
-	print(replacements[key])
-
-# Define the input docx file and the output file
-input_file = "template2.docx"
-output_file = "filled_template.docx"
-
-replace_placeholders_in_docx(input_file, output_file, replacements)
\ No newline at end of file
+def get_replacements(header):
+	return {
+		"court-name" : header.court.name,
+		"court-address" : header.court.address.to_str(newline = True),
+		"plaintiff-name" : header.plaintiff.name,
+		"plaintiff-info" : header.plaintiff.get_info(),
+		"plaintiff-representative" : "vetreten durch RA " + header.plaintiff.representative.to_str(),
+		"defendant-name" : header.defendant.name,
+		"defendant-info" : header.defendant.get_info(),
+		"defendant-representative" : "vetreten durch RA " + header.defendant.representative.to_str(),
+		"representative-name" : header.defendant.representative.name,
+		"counter" : "Counter arguments",
+		"formelles" : "Formelles dummy",
+		"materielles" : "Materielles"
+	}
+
+if __name__ == "__main__":
+	filename = sys.argv[1] if len(sys.argv) > 1 else "../Klageschrift.pdf"
+	header = get_info(filename).header
+	replacements = get_replacements(header)
+
+	for key in replacements:
+		print(replacements[key])
+
+	# Define the input docx file and the output file
+	input_file = "template2.docx"
+	output_file = "filled_template.docx"
+
+	replace_placeholders_in_docx(input_file, output_file, replacements)
@@ -0,0 +1,7 @@
+"""
+Benchmark and load-test tooling for the emify pipeline.
+
+Run the modules from the ``webserv`` directory, e.g.::
+
+    python -m benchmarks.pipeline_bench --pages 6 24 --repeat 5
+"""
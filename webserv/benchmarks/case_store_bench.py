@@ -0,0 +1,114 @@
+"""
+Case store benchmark.
+
+Stores parsed synthetic Klageschriften in the case tables
+(``emify.case_store``) of an isolated database, once in bulk batches as
+``manage.py import_cases`` does and once document by document as uploads
+are stored, then reads them back and compares that with parsing the
+PDFs again. A handful of synthetic filings are parsed and stored under
+many content hashes.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.case_store_bench --documents 5000 --batch-size 500 --output case_store.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from .synthetic import SyntheticSpec, generate_pdf
+
+
+def _setup_django(db_path: str):
+    os.environ["EMIFY_DB_PATH"] = db_path
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "emify.settings")
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+def run(args, workdir: str) -> Dict:
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from emify.case_store import load_infos, store_case, store_cases
+    from emify.parsing import get_info
+
+    paths = []
+    for variant in range(args.variants):
+        spec = SyntheticSpec(pages=4 + 2 * (variant % 3), claims=1 + variant % 3, seed=variant)
+        paths.append(os.path.join(workdir, f"{spec.label()}.pdf"))
+        generate_pdf(spec, paths[-1])
+
+    start = time.perf_counter()
+    infos = [get_info(path) for path in paths]
+    parse_seconds = (time.perf_counter() - start) / len(paths)
+
+    def cases(prefix: str):
+        return ((f"{prefix}{number:063x}", infos[number % len(infos)]) for number in range(args.documents))
+
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        store_cases(cases("a"), args.batch_size)
+    bulk_seconds = time.perf_counter() - start
+    bulk_queries = len(queries)
+
+    documents = min(args.documents, args.single_documents)
+    start = time.perf_counter()
+    for document_key, info in list(cases("b"))[:documents]:
+        store_case(document_key, info)
+    single_seconds = time.perf_counter() - start
+
+    keys = [document_key for document_key, _ in cases("a")]
+    start = time.perf_counter()
+    for offset in range(0, len(keys), args.batch_size):
+        load_infos(keys[offset:offset + args.batch_size])
+    load_seconds = time.perf_counter() - start
+
+    return {
+        "documents": args.documents,
+        "bulk_seconds": bulk_seconds,
+        "bulk_documents_per_second": args.documents / bulk_seconds,
+        "bulk_queries": bulk_queries,
+        "single_documents": documents,
+        "single_documents_per_second": documents / single_seconds,
+        "load_ms_per_document": load_seconds / args.documents * 1000,
+        "parse_ms_per_document": parse_seconds * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bulk storage of extracted case data")
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--variants", type=int, default=6, help="Distinct synthetic documents")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--single-documents", type=int, default=500,
+                        help="Documents stored one by one for comparison")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="emify-cases-") as workdir:
+        _setup_django(os.path.join(workdir, "db.sqlite3"))
+        result = run(args, workdir)
+
+    print(f"bulk          {result['bulk_documents_per_second']:8.0f} documents/s   "
+          f"({result['documents']} documents, {result['bulk_queries']} queries)")
+    print(f"one by one    {result['single_documents_per_second']:8.0f} documents/s   "
+          f"({result['single_documents']} documents)")
+    print(f"read back     {result['load_ms_per_document']:8.2f} ms per document   "
+          f"(parsing: {result['parse_ms_per_document']:.1f} ms)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "result": result}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
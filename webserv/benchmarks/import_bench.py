@@ -0,0 +1,98 @@
+"""
+Startup benchmark.
+
+Measures the wall time of fresh Python processes that load the app the way
+management commands and web workers do: Django setup, importing the URL
+configuration (every command that runs system checks does this),
+``manage.py check``, and the ASGI application with and without the worker
+warm-up (``emify/warmup.py``). ``--top`` lists the modules with the highest
+cumulative import time (``python -X importtime``) of the URL configuration.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.import_bench --repeat 5 --top 15 --output imports.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+WEBSERV_DIR = Path(__file__).resolve().parent.parent
+
+SETUP = "import django; django.setup()"
+TARGETS: Dict[str, Tuple[List[str], Dict[str, str]]] = {
+    "python": (["-c", "pass"], {}),
+    "django_setup": (["-c", SETUP], {}),
+    "urls": (["-c", f"{SETUP}; import emify.urls"], {}),
+    "manage_check": (["manage.py", "check"], {}),
+    "asgi": (["-c", "import emify.asgi"], {"EMIFY_WARM_UP": "0"}),
+    "asgi_warm_up": (["-c", "import emify.asgi"], {"EMIFY_WARM_UP": "1", "EMIFY_WARM_UP_JOB_POOL": "0"}),
+}
+
+
+def _env(extra: Dict[str, str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "emify.settings")
+    # Client creation does not contact the API, but needs a key
+    env.setdefault("OPENAI_API_KEY", "benchmark-key")
+    env.update(extra)
+    return env
+
+
+def time_target(args: List[str], extra: Dict[str, str], repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=WEBSERV_DIR, env=_env(extra), check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return {"runs": repeat, "median_ms": statistics.median(samples) * 1000, "min_ms": min(samples) * 1000}
+
+
+def slowest_imports(count: int) -> List[Dict[str, object]]:
+    """Modules with the highest cumulative import time when the URL configuration is imported."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"{SETUP}; import emify.urls"],
+                            cwd=WEBSERV_DIR, env=_env({}), check=True, capture_output=True, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(modules, key=lambda module: module["cumulative_ms"], reverse=True)[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark process startup and import time")
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="List the N slowest imports of the URL configuration")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.targets:
+        command, extra = TARGETS[name]
+        results[name] = time_target(command, extra, args.repeat)
+        print(f"  {name:<14} median {results[name]['median_ms']:8.1f} ms   min {results[name]['min_ms']:8.1f} ms")
+
+    imports = slowest_imports(args.top) if args.top else []
+    if imports:
+        print("\nSlowest imports of emify.urls (cumulative)")
+        for module in imports:
+            print(f"  {module['cumulative_ms']:8.1f} ms  {module['module']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"targets": results, "imports": imports}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
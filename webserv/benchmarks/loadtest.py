@@ -0,0 +1,290 @@
+"""
+Concurrent load test for the Django endpoints.
+
+Starts the app locally with the mock LLM backend (isolated database and
+media directory) or targets a running server, then drives a weighted mix of
+upload flows (``/upload/`` -> ``/send_file/`` -> download) and
+``/placeholder_values/`` calls at one or more concurrency levels. Reports
+p50/p95/p99 latency, throughput and error rate per endpoint.
+
+The app can be started under WSGI (Django's threaded runserver) and ASGI
+(uvicorn) in the same run to compare their throughput; use
+``--mock-latency`` to simulate the provider round-trip of the LLM call.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.loadtest --concurrency 1 4 16 --duration 20 \\
+        --mix upload=1,placeholder=4 --output load.json
+    python -m benchmarks.loadtest --server wsgi asgi --mock-latency 2 \\
+        --concurrency 16 64 256 --mix placeholder=1
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+from .synthetic import SyntheticSpec, generate_pdf
+
+WEBSERV_DIR = Path(__file__).resolve().parent.parent
+DOWNLOAD_LINK = re.compile(r'href="([^"]+)"\s+download=')
+
+
+class Stats:
+    """Thread-safe latency and error samples per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, wall_seconds: float) -> Dict[str, Dict]:
+        report = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            errors = self.errors.get(endpoint, 0)
+            report[endpoint] = {
+                "requests": len(ordered),
+                "errors": errors,
+                "error_rate": errors / len(ordered),
+                "throughput_rps": len(ordered) / wall_seconds,
+                "p50_ms": percentile(ordered, 50) * 1000,
+                "p95_ms": percentile(ordered, 95) * 1000,
+                "p99_ms": percentile(ordered, 99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return report
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Client:
+    """One simulated user with its own HTTP session."""
+
+    def __init__(self, base_url: str, stats: Stats, document: bytes, file_text: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.document = document
+        self.file_text = file_text
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _call(self, endpoint: str, method: str, path: str, expected: Tuple[int, ...] = (200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            ok = response.status_code in expected
+        except requests.RequestException:
+            response, ok = None, False
+        self.stats.record(endpoint, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    def upload(self):
+        page = self._call("GET /upload/", "GET", "/upload/")
+        if page is None:
+            return
+        token = self.session.cookies.get("csrftoken", "")
+        redirect = self._call(
+            "POST /upload/", "POST", "/upload/", expected=(302,), allow_redirects=False,
+            data={"csrfmiddlewaretoken": token},
+            files={"file": ("klageschrift.pdf", self.document, "application/pdf")},
+            headers={"Referer": self.base_url + "/upload/"},
+        )
+        if redirect is None:
+            return
+        # The redirect names the upload by its hash (/send_file/?document=<sha256>), which is the cached path users take
+        location = urlsplit(redirect.headers["Location"])
+        result = self._call("GET /send_file/", "GET", f"{location.path}?{location.query}")
+        if result is None:
+            return
+        match = DOWNLOAD_LINK.search(result.text)
+        if not match:
+            # send_file answers 200 with an error message when processing fails
+            self.stats.record("GET /send_file/ (no download link)", 0.0, False)
+            return
+        self._call("GET download", "GET", match.group(1))
+
+    def placeholder(self):
+        self._call("POST /placeholder_values/", "POST", "/placeholder_values/", json={"file_text": self.file_text})
+
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("upload", "placeholder"):
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def run_level(base_url: str, concurrency: int, duration: float, max_requests: Optional[int],
+              mix: List[Tuple[str, float]], document: bytes, file_text: str, timeout: float, seed: int) -> Dict:
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+    remaining = [max_requests] if max_requests else None
+    lock = threading.Lock()
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    def take() -> bool:
+        if time.perf_counter() >= deadline:
+            return False
+        if remaining is None:
+            return True
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker(index: int):
+        rng = random.Random(seed + index)
+        client = Client(base_url, stats, document, file_text, timeout)
+        while take():
+            getattr(client, rng.choices(names, weights)[0])()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index in range(concurrency):
+            pool.submit(worker, index)
+    wall = time.perf_counter() - start
+    return {"concurrency": concurrency, "wall_seconds": wall, "endpoints": stats.report(wall)}
+
+
+def server_command(server: str, port: int) -> List[str]:
+    if server == "asgi":
+        return [sys.executable, "-m", "uvicorn", "emify.asgi:application", "--host", "127.0.0.1",
+                "--port", str(port), "--log-level", "warning"]
+    return [sys.executable, "manage.py", "runserver", f"127.0.0.1:{port}", "--noreload"]
+
+
+def start_server(port: int, workdir: str, server: str = "wsgi", mock_latency: float = 0) -> subprocess.Popen:
+    """Run migrations in an isolated database and start the app with the mock LLM backend."""
+    env = dict(os.environ)
+    env.update({
+        "EMIFY_LLM_BACKEND": "mock",
+        "EMIFY_MOCK_LLM_LATENCY": str(mock_latency),
+        "EMIFY_DB_PATH": os.path.join(workdir, "db.sqlite3"),
+        "EMIFY_MEDIA_ROOT": os.path.join(workdir, "media"),
+        "EMIFY_RETRIEVAL_DIR": os.path.join(workdir, "retrieval"),
+    })
+    env.setdefault("OPENAI_API_KEY", "loadtest-mock-key")
+    os.makedirs(os.path.join(workdir, "media", "uploads"), exist_ok=True)
+    subprocess.run([sys.executable, "manage.py", "migrate", "--noinput"], cwd=WEBSERV_DIR, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+    process = subprocess.Popen(server_command(server, port), cwd=WEBSERV_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError(f"{server} server exited with status {process.returncode}")
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{server} server did not start within 20 seconds")
+
+
+def _print_level(level: Dict):
+    print(f"\n{level['server']} concurrency {level['concurrency']}  ({level['wall_seconds']:.1f} s)")
+    print(f"  {'endpoint':<28}{'reqs':>7}{'err%':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, row in level["endpoints"].items():
+        print(f"  {endpoint:<28}{row['requests']:>7}{row['error_rate'] * 100:>7.1f}{row['throughput_rps']:>9.2f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+
+
+def _print_comparison(levels: List[Dict]):
+    print(f"\n{'concurrency':<14}" + "".join(f"{level:>14}" for level in sorted({l['server'] for l in levels})))
+    by_key = {(level["server"], level["concurrency"]): level for level in levels}
+    for concurrency in sorted({level["concurrency"] for level in levels}):
+        row = f"{concurrency:<14}"
+        for server in sorted({level["server"] for level in levels}):
+            level = by_key.get((server, concurrency))
+            total = sum(e["requests"] for e in level["endpoints"].values()) if level else 0
+            row += f"{total / level['wall_seconds'] if level else 0:>10.2f} rps"
+        print(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the emify endpoints")
+    parser.add_argument("--base-url", help="Target a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the locally started server")
+    parser.add_argument("--server", nargs="+", choices=["wsgi", "asgi"], default=["wsgi"],
+                        help="Server types to start and compare (ignored with --base-url)")
+    parser.add_argument("--mock-latency", type=float, default=0,
+                        help="Seconds the mock LLM backend waits per call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per concurrency level")
+    parser.add_argument("--requests", type=int, help="Stop a level after this many scenario runs")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("upload=1,placeholder=4"),
+                        help="Weighted scenarios, e.g. upload=1,placeholder=4")
+    parser.add_argument("--pages", type=int, default=6, help="Pages of the uploaded synthetic Klageschrift")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    from emify.parsing import get_info
+
+    with tempfile.TemporaryDirectory(prefix="emify-load-") as workdir:
+        document_path = os.path.join(workdir, "klageschrift.pdf")
+        document = generate_pdf(SyntheticSpec(pages=args.pages, seed=args.seed), document_path)
+        file_text = get_info(document_path).to_string()
+
+        levels = []
+        for server in ([args.base_url] if args.base_url else args.server):
+            process = None
+            base_url = server
+            if not args.base_url:
+                server_dir = os.path.join(workdir, server)
+                process = start_server(args.port, server_dir, server, args.mock_latency)
+                base_url = f"http://127.0.0.1:{args.port}"
+            try:
+                for concurrency in args.concurrency:
+                    level = run_level(base_url, concurrency, args.duration, args.requests, args.mix,
+                                      document, file_text, args.timeout, args.seed)
+                    level["server"] = server
+                    _print_level(level)
+                    levels.append(level)
+            finally:
+                if process:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+    if len(args.server) > 1 and not args.base_url:
+        _print_comparison(levels)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"mix": dict(args.mix), "mock_latency": args.mock_latency, "levels": levels}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
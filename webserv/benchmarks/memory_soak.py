@@ -0,0 +1,123 @@
+"""
+Memory soak benchmark.
+
+Runs the parse and render jobs for many documents in one process, the way
+a job pool worker runs them (through ``emify.memory.run_measured``), and
+samples the resident set size as it goes. A handful of synthetic
+Klageschriften of different sizes are cycled, alternating between paths
+and in-memory content. After a warm-up in which caches and allocator
+arenas fill, RSS should stay flat; the run fails (exit status 1) if it
+grows by more than ``--max-growth-mb``.
+
+``--no-collect`` calls the job functions directly, without the collection
+of reference cycles after each job, to show what it saves.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.memory_soak --documents 10000 --sample-every 250 --max-growth-mb 8 --output soak.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from .synthetic import SyntheticSpec, generate_pdf
+
+
+def _least_squares_slope(points: List[tuple]) -> float:
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator if denominator else 0.0
+
+
+def soak(args, workdir: str) -> Dict:
+    from emify.memory import rss_bytes, run_measured
+    from emify.parsing import get_info, get_replacements, replace_placeholders_in_docx
+    from emify.placeholders import scan_docx
+
+    template_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "emify", "template.docx")
+    with open(template_path, "rb") as f:
+        _, inventory = scan_docx(f.read())
+    sources = []
+    for variant in range(args.variants):
+        spec = SyntheticSpec(pages=4 + 4 * (variant % 4), claims=1 + variant % 3, seed=variant)
+        path = os.path.join(workdir, f"{spec.label()}.pdf")
+        data = generate_pdf(spec, path)
+        sources.extend([path, data])
+    output_path = os.path.join(workdir, "klageantwort.docx")
+    values = {"placeholder_values": ["Die Klage sei abzuweisen."] * 3}
+
+    def run(fn, *fn_args):
+        return fn(*fn_args) if args.no_collect else run_measured(fn, *fn_args)[0]
+
+    samples = [(0, rss_bytes())]
+    start = time.perf_counter()
+    for number in range(1, args.documents + 1):
+        info = run(get_info, sources[number % len(sources)])
+        if not args.no_render:
+            run(replace_placeholders_in_docx, template_path, output_path, get_replacements(info, values),
+                inventory.locations)
+        if number % args.sample_every == 0 or number == args.documents:
+            samples.append((number, rss_bytes()))
+            print(f"{number:7d} documents   RSS {samples[-1][1] / 1e6:8.1f} MB", file=sys.stderr)
+    seconds = time.perf_counter() - start
+
+    steady = [(number, rss) for number, rss in samples if number >= args.warmup]
+    baseline = steady[0][1] if steady else samples[-1][1]
+    return {
+        "documents": args.documents,
+        "collect": not args.no_collect,
+        "render": not args.no_render,
+        "seconds": seconds,
+        "documents_per_second": args.documents / seconds,
+        "rss_start": samples[0][1],
+        "rss_after_warmup": baseline,
+        "rss_end": samples[-1][1],
+        "rss_max": max(rss for _, rss in samples),
+        "growth_after_warmup": samples[-1][1] - baseline,
+        # Bytes per 1000 documents, fitted over the samples after the warm-up
+        "slope_per_1000": _least_squares_slope(steady) * 1000,
+        "samples": samples,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that parse/render workers keep a flat RSS")
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--variants", type=int, default=6, help="Distinct synthetic documents")
+    parser.add_argument("--sample-every", type=int, default=250)
+    parser.add_argument("--warmup", type=int, default=500, help="Documents before the baseline RSS is taken")
+    parser.add_argument("--max-growth-mb", type=float, default=8.0)
+    parser.add_argument("--no-render", action="store_true", help="Only parse")
+    parser.add_argument("--no-collect", action="store_true", help="Do not collect reference cycles after each job")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="emify-soak-") as workdir:
+        result = soak(args, workdir)
+
+    growth_mb = result["growth_after_warmup"] / 1e6
+    print(f"\n{result['documents']} documents in {result['seconds']:.1f} s ({result['documents_per_second']:.1f}/s)")
+    print(f"RSS {result['rss_start'] / 1e6:.1f} MB at start, {result['rss_after_warmup'] / 1e6:.1f} MB after "
+          f"{args.warmup} documents, {result['rss_end'] / 1e6:.1f} MB at the end (max {result['rss_max'] / 1e6:.1f} MB)")
+    print(f"Growth after warm-up {growth_mb:+.1f} MB, trend {result['slope_per_1000'] / 1e6:+.2f} MB per 1000 documents")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "result": result}, f, indent=2)
+        print(f"Results written to {args.output}")
+    if growth_mb > args.max_growth_mb:
+        print(f"RSS grew by more than {args.max_growth_mb} MB", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
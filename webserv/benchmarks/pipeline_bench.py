@@ -0,0 +1,236 @@
+"""
+End-to-end pipeline benchmark on synthetic Klageschriften.
+
+Times every pipeline stage (span extraction, header, claims, arguments,
+LLM with the mock backend, DOCX rendering, DOCX->PDF conversion) and the
+whole pipeline, and writes the results as JSON. ``--furniture`` adds
+running headers and page footers to the generated PDFs. A previous result file can
+be passed with ``--baseline`` to fail on regressions.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.pipeline_bench --pages 6 24 --claims 2 --evidence 8 \\
+        --repeat 5 --output bench.json --baseline previous.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from .synthetic import SyntheticSpec, generate_docx, generate_pdf
+
+WEBSERV_DIR = Path(__file__).resolve().parent.parent
+TEMPLATE_PATH = WEBSERV_DIR / "emify" / "template.docx"
+SCHEMA_VERSION = 1
+
+
+def positive_int(value: str) -> int:
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def _timed(fn: Callable, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "runs": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "max": max(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def mock_llm(text: str):
+    """Run the prompt construction and return the mock placeholder values."""
+    from emify.ai_lawyer_service import build_prompt, count_placeholders, get_placeholder_mock_values
+
+    regex = r'\$\{(.*?)\}'
+    template_text = "${counter}\n${formelles}\n${materielles}"
+    build_prompt(text, template_text, regex, count_placeholders(template_text, regex))
+    values, _ = get_placeholder_mock_values({"text": text})
+    return {"placeholder_values": values}
+
+
+def run_pipeline(pdf_path: str, output_path: str):
+    """The processing done by ``send_file`` with the mock LLM backend."""
+    from emify.parsing import get_info, get_replacements, replace_placeholders_in_docx
+
+    info = get_info(pdf_path)
+    json_data = mock_llm(info.to_string())
+    replace_placeholders_in_docx(str(TEMPLATE_PATH), output_path, get_replacements(info, json_data))
+
+
+def bench_case(spec: SyntheticSpec, repeat: int, workdir: str, convert: bool) -> Dict:
+    from emify.convert_docx_to_pdf import convert_docx_to_pdf
+    from emify.parsing import (get_claims, get_header, get_justification, get_replacements, get_spans,
+                               replace_placeholders_in_docx, Info)
+
+    pdf_path = os.path.join(workdir, f"{spec.label()}.pdf")
+    docx_path = os.path.join(workdir, f"{spec.label()}.docx")
+    output_path = os.path.join(workdir, f"{spec.label()}-klageantwort.docx")
+    pdf_bytes = generate_pdf(spec, pdf_path)
+    generate_docx(spec, docx_path)
+
+    samples: Dict[str, List[float]] = {}
+
+    def record(stage, seconds):
+        samples.setdefault(stage, []).append(seconds)
+
+    # Warm-up run so that imports and font loading are not measured
+    run_pipeline(pdf_path, output_path)
+
+    for _ in range(repeat):
+        spans, seconds = _timed(get_spans, pdf_path)
+        record("get_spans", seconds)
+        header, seconds = _timed(get_header, spans)
+        record("header", seconds)
+        claims, seconds = _timed(get_claims, spans)
+        record("get_claims", seconds)
+        justification, seconds = _timed(get_justification, spans)
+        record("get_arguments", seconds)
+        info = Info(header, claims, justification)
+        json_data, seconds = _timed(mock_llm, info.to_string())
+        record("llm_mock", seconds)
+        _, seconds = _timed(replace_placeholders_in_docx, str(TEMPLATE_PATH), output_path,
+                            get_replacements(info, json_data))
+        record("render", seconds)
+        if convert:
+            converted = os.path.join(workdir, f"{spec.label()}-converted.pdf")
+            ok, seconds = _timed(convert_docx_to_pdf, docx_path, converted)
+            if ok:
+                record("conversion", seconds)
+        _, seconds = _timed(run_pipeline, pdf_path, output_path)
+        record("pipeline", seconds)
+
+    return {
+        "spec": {"pages": spec.pages, "claims": spec.claims, "evidence": spec.evidence, "seed": spec.seed,
+                 "furniture": spec.furniture},
+        "label": spec.label(),
+        "document": {"pdf_bytes": len(pdf_bytes), "spans": len(spans),
+                     "claims": len(claims), "prompt_chars": len(info.to_string())},
+        "stages": {stage: _summary(values) for stage, values in samples.items()},
+    }
+
+
+def _environment() -> Dict:
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import fitz  # type: ignore
+        env["pymupdf"] = fitz.VersionBind
+    except (ImportError, AttributeError):
+        pass
+    try:
+        env["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=WEBSERV_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return env
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return a message for every stage whose median got slower than the baseline allows."""
+    regressions = []
+    previous = {case["label"]: case for case in baseline.get("cases", [])}
+    for case in results["cases"]:
+        old_case = previous.get(case["label"])
+        if not old_case:
+            continue
+        for stage, stats in case["stages"].items():
+            old_stats = old_case["stages"].get(stage)
+            if not old_stats or old_stats["median"] <= 0:
+                continue
+            ratio = stats["median"] / old_stats["median"]
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    f"{case['label']} {stage}: {old_stats['median'] * 1000:.2f} ms -> "
+                    f"{stats['median'] * 1000:.2f} ms ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def _print_table(results: Dict):
+    for case in results["cases"]:
+        doc = case["document"]
+        print(f"\n{case['label']}  ({doc['pdf_bytes']} bytes, {doc['spans']} spans)")
+        for stage, stats in case["stages"].items():
+            print(f"  {stage:<14} median {stats['median'] * 1000:9.2f} ms   "
+                  f"min {stats['min'] * 1000:9.2f} ms   max {stats['max'] * 1000:9.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Klageschrift pipeline on synthetic documents")
+    parser.add_argument("--pages", type=int, nargs="+", default=[6])
+    parser.add_argument("--claims", type=int, nargs="+", default=[2])
+    parser.add_argument("--evidence", type=int, nargs="+", default=[8])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=positive_int, default=5)
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout summary only)")
+    parser.add_argument("--baseline", help="Previous JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown of a stage median relative to the baseline (0.25 = 25%%)")
+    parser.add_argument("--no-conversion", action="store_true", help="Skip the DOCX->PDF conversion stage")
+    parser.add_argument("--furniture", action="store_true", help="Add running headers and page footers to the PDFs")
+    args = parser.parse_args(argv)
+
+    convert = not args.no_conversion and shutil.which("unoconv") is not None
+    if not args.no_conversion and not convert:
+        print("unoconv not found, skipping the conversion stage", file=sys.stderr)
+
+    results = {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "environment": _environment(),
+        "repeat": args.repeat,
+        "cases": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="emify-bench-") as workdir:
+        for pages in args.pages:
+            for claims in args.claims:
+                for evidence in args.evidence:
+                    spec = SyntheticSpec(pages, claims, evidence, args.seed, args.furniture)
+                    results["cases"].append(bench_case(spec, args.repeat, workdir, convert))
+
+    _print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nPerformance regressions:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Precedent retrieval benchmark.
+
+Builds the memory-mapped retrieval index (``emify.retrieval``) from
+synthetic documents and measures build time, index size, single-document
+append latency and top-k query latency.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.retrieval_bench --entries 10000 100000 --queries 200 --output retrieval.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from .pipeline_bench import positive_int
+from .search_bench import filing_fields
+
+
+def synthetic_items(count: int, seed: int) -> List:
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        fields = filing_fields(rng)
+        items.append((f"{i:064x}", f"{fields['claims']}\n{fields['statements']}",
+                      {"claims": fields["claims"].split("\n"), "answer": fields["answers"]}))
+    return items
+
+
+def _summary_ms(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[max(0, int(round(0.95 * len(ordered))) - 1)] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def bench_size(entries: int, queries: int, k: int, seed: int, workdir: str) -> Dict:
+    from emify.retrieval import RetrievalIndex
+
+    path = os.path.join(workdir, f"index-{entries}")
+    items = synthetic_items(entries, seed)
+    index = RetrievalIndex(path)
+    start = time.perf_counter()
+    index.build(items)
+    build_seconds = time.perf_counter() - start
+
+    rng = random.Random(seed + 1)
+    query_samples = []
+    for _ in range(queries):
+        text = rng.choice(items)[1]
+        start = time.perf_counter()
+        index.search(text, k)
+        query_samples.append(time.perf_counter() - start)
+
+    add_samples = []
+    for key, text, payload in synthetic_items(min(queries, 100), seed + 2):
+        start = time.perf_counter()
+        index.add(f"added-{key}", text, payload)
+        add_samples.append(time.perf_counter() - start)
+
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return {
+        "entries": entries,
+        "dim": index.dim,
+        "build_seconds": build_seconds,
+        "index_bytes": size,
+        "query": _summary_ms(query_samples),
+        "add": _summary_ms(add_samples),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the precedent retrieval index")
+    parser.add_argument("--entries", type=positive_int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=positive_int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="emify-retrieval-") as workdir:
+        for entries in args.entries:
+            result = bench_size(entries, args.queries, args.k, args.seed, workdir)
+            results.append(result)
+            print(f"\n{entries} entries  (built in {result['build_seconds']:.2f} s, "
+                  f"{result['index_bytes'] / 1e6:.1f} MB on disk)")
+            for name in ("query", "add"):
+                stats = result[name]
+                print(f"  {name:<6} median {stats['median_ms']:8.2f} ms   p95 {stats['p95_ms']:8.2f} ms   "
+                      f"max {stats['max_ms']:8.2f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"k": args.k, "sizes": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
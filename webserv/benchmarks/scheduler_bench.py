@@ -0,0 +1,120 @@
+"""
+LLM scheduler benchmark.
+
+Simulates a batch run competing with interactive users for a rate-limited
+LLM provider. The provider is a sleep with the given latency, so no API
+key is needed. One user submits ``--batch`` batch jobs at once, and
+``--users`` interactive users each send a request every
+``--interactive-interval`` seconds while the batch runs. The run is made
+twice: with the priority scheduler (``emify.llm_scheduler``) and with
+every job in one FIFO class, as without priorities. Reported are the
+queueing times of interactive requests and the batch makespan.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.scheduler_bench --batch 80 --users 3 --rpm 60 --concurrency 8 --latency 1.0 --output scheduler.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+
+def _setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "emify.settings")
+    import django
+
+    django.setup()
+
+
+def _percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+async def _simulate(args, prioritized: bool) -> Dict:
+    from emify.llm_scheduler import BATCH, INTERACTIVE, LlmScheduler
+
+    scheduler = LlmScheduler(
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_concurrency=args.concurrency,
+        batch_max_concurrency=args.batch_concurrency if prioritized else None,
+    )
+    waits: Dict[str, List[float]] = {INTERACTIVE: [], BATCH: []}
+
+    async def request(priority: str, user: str):
+        # Without priorities every job shares one class and one user, so it is served first come, first served
+        slot = scheduler.slot(priority if prioritized else BATCH, user if prioritized else "", args.tokens)
+        async with slot as job:
+            await asyncio.sleep(args.latency)
+            job.record(args.tokens - 500, 500)
+        waits[priority].append(job.queued_seconds)
+
+    start = time.perf_counter()
+    batch = [asyncio.ensure_future(request(BATCH, "batch-user")) for _ in range(args.batch)]
+
+    async def interactive_user(number: int):
+        await asyncio.sleep(number * args.interactive_interval / max(args.users, 1))
+        while not all(task.done() for task in batch):
+            await request(INTERACTIVE, f"user-{number}")
+            await asyncio.sleep(args.interactive_interval)
+
+    users = [asyncio.ensure_future(interactive_user(number)) for number in range(args.users)]
+    await asyncio.gather(*batch)
+    makespan = time.perf_counter() - start
+    await asyncio.gather(*users)
+
+    interactive = waits[INTERACTIVE]
+    return {
+        "prioritized": prioritized,
+        "batch_makespan_s": makespan,
+        "interactive_requests": len(interactive),
+        "interactive_wait_p50_s": statistics.median(interactive) if interactive else 0.0,
+        "interactive_wait_p95_s": _percentile(interactive, 0.95),
+        "interactive_wait_max_s": max(interactive, default=0.0),
+        "batch_wait_p50_s": statistics.median(waits[BATCH]) if waits[BATCH] else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the priority-aware LLM scheduler")
+    parser.add_argument("--batch", type=int, default=80, help="Batch jobs submitted at once")
+    parser.add_argument("--users", type=int, default=3, help="Interactive users")
+    parser.add_argument("--interactive-interval", type=float, default=2.0, help="Seconds between requests of a user")
+    parser.add_argument("--rpm", type=float, default=60, help="Requests per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=float, default=0, help="Tokens per minute (0 = unlimited)")
+    parser.add_argument("--tokens", type=int, default=6000, help="Tokens per request")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-concurrency", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=1.0, help="Simulated provider latency in seconds")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+    _setup_django()
+
+    results = []
+    for prioritized in (False, True):
+        result = asyncio.run(_simulate(args, prioritized))
+        results.append(result)
+        print(f"{'priority scheduler' if prioritized else 'FIFO':<20}"
+              f"interactive wait p50 {result['interactive_wait_p50_s']:6.2f} s   "
+              f"p95 {result['interactive_wait_p95_s']:6.2f} s   "
+              f"max {result['interactive_wait_max_s']:6.2f} s   "
+              f"({result['interactive_requests']} requests)   "
+              f"batch makespan {result['batch_makespan_s']:6.1f} s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "runs": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
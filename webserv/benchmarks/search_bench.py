@@ -0,0 +1,131 @@
+"""
+Full-text search benchmark.
+
+Fills the FTS5 index (``emify.search``) of an isolated database with
+synthetic filings built from the same vocabulary as the synthetic
+Klageschriften, then measures index build time and the latency of ranked
+queries by party, court and claim wording.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.search_bench --filings 10000 50000 --queries 200 --output search.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from .synthetic import (CITIES, CLAIM_TEXTS, COMPANIES, COURTS, EVIDENCE_TEXTS, LAWYERS, PERSONS, PROFESSIONS,
+                        STATEMENTS, STREETS, _fill)
+
+QUERIES = [
+    "Müller Janser",
+    "Zivilgericht Basel",
+    "Rechtsvorschlag Betreibung",
+    "Kaufvertrag",
+    "Zins seit",
+    "Peter Meister Werbegrafiker",
+    "Mahn*",
+    "Kosten Entschädigungsfolgen",
+]
+
+
+def filing_fields(rng: random.Random) -> Dict[str, str]:
+    """Search columns of one synthetic filing."""
+    court, street, city = rng.choice(COURTS)
+    claims = [_fill(rng, text) for text in rng.sample(CLAIM_TEXTS, rng.randint(1, len(CLAIM_TEXTS)))]
+    statements = [_fill(rng, text) for text in rng.sample(STATEMENTS, 4)]
+    return {
+        "court": f"{court}, {street}, {city}",
+        "plaintiff": f"{rng.choice(COMPANIES)}, {rng.choice(STREETS)} {rng.randint(1, 99)}, {rng.choice(CITIES)}",
+        "defendant": f"{rng.choice(PERSONS)}, {rng.choice(PROFESSIONS)}, {rng.choice(STREETS)} "
+                     f"{rng.randint(1, 99)}, {rng.choice(CITIES)}",
+        "representatives": "\n".join(rng.sample(LAWYERS, 2)),
+        "claims": "\n".join(claims),
+        "statements": "\n".join(statements),
+        "evidence": "\n".join(_fill(rng, text) for text in rng.sample(EVIDENCE_TEXTS, 3)),
+        "answers": "\n".join(statements[:2]),
+    }
+
+
+def _setup_django(db_path: str):
+    os.environ["EMIFY_DB_PATH"] = db_path
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "emify.settings")
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+def build_index(filings: int, seed: int, start_rowid: int) -> float:
+    from django.db import transaction
+    from emify.search import index_fields
+
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    with transaction.atomic():
+        for rowid in range(start_rowid, start_rowid + filings):
+            index_fields(rowid, f"{rowid:064x}", f"klage-{rowid}.pdf", filing_fields(rng))
+    return time.perf_counter() - start
+
+
+def query_latencies(queries: int, limit: int, seed: int) -> Dict[str, Dict[str, float]]:
+    from emify.search import search
+
+    rng = random.Random(seed)
+    samples: Dict[str, List[float]] = {query: [] for query in QUERIES}
+    for _ in range(queries):
+        query = rng.choice(QUERIES)
+        start = time.perf_counter()
+        search(query, limit)
+        samples[query].append(time.perf_counter() - start)
+    return {
+        query: {"runs": len(values), "median_ms": statistics.median(values) * 1000, "max_ms": max(values) * 1000}
+        for query, values in samples.items() if values
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the full-text search index")
+    parser.add_argument("--filings", type=int, nargs="+", default=[10000, 50000],
+                        help="Index sizes to measure (cumulative, ascending)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per index size")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="emify-search-") as workdir:
+        _setup_django(os.path.join(workdir, "db.sqlite3"))
+        indexed = 0
+        for size in sorted(args.filings):
+            added = size - indexed
+            build_seconds = build_index(added, args.seed + indexed, indexed + 1)
+            indexed = size
+            latencies = query_latencies(args.queries, args.limit, args.seed)
+            results.append({
+                "filings": size,
+                "build_seconds": build_seconds,
+                "filings_per_second": added / build_seconds if build_seconds else 0.0,
+                "queries": latencies,
+            })
+            print(f"\n{size} filings  ({added} indexed in {build_seconds:.2f} s)")
+            for query, stats in latencies.items():
+                print(f"  {query:<32} median {stats['median_ms']:8.2f} ms   max {stats['max_ms']:8.2f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"limit": args.limit, "sizes": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Info serialization benchmark.
+
+Parses synthetic Klageschriften once and measures the encode and decode
+cost and the encoded size of their Info objects with pickle (what the job
+pool and the cache use), the versioned JSON form (``Info.to_json``) and the
+compact msgpack form (``Info.to_msgpack``, skipped if msgpack is not
+installed). Every format is checked to round-trip to an equal Info.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.serialization_bench --pages 6 24 --claims 2 --evidence 8 --repeat 2000 --output serialization.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from .pipeline_bench import positive_int
+from .synthetic import SyntheticSpec, generate_pdf
+
+
+def formats() -> Dict[str, tuple]:
+    from emify.parsing import Info
+
+    codecs = {
+        "pickle": (lambda info: pickle.dumps(info, pickle.HIGHEST_PROTOCOL), pickle.loads),
+        "json": (Info.to_json, Info.from_json),
+    }
+    if importlib.util.find_spec("msgpack") is not None:
+        codecs["msgpack"] = (Info.to_msgpack, Info.from_msgpack)
+    else:
+        print("msgpack is not installed, skipping it", file=sys.stderr)
+    return codecs
+
+
+def _median_us(fn: Callable, arg, repeat: int) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def bench_case(spec: SyntheticSpec, repeat: int, workdir: str) -> Dict:
+    from emify.parsing import get_info
+
+    pdf_path = os.path.join(workdir, f"{spec.label()}.pdf")
+    generate_pdf(spec, pdf_path)
+    info = get_info(pdf_path)
+
+    results = {}
+    for name, (encode, decode) in formats().items():
+        data = encode(info)
+        if decode(data) != info:
+            raise AssertionError(f"{name} does not round-trip {spec.label()}")
+        results[name] = {
+            "bytes": len(data.encode("utf-8") if isinstance(data, str) else data),
+            "encode_us": _median_us(encode, info, repeat),
+            "decode_us": _median_us(decode, data, repeat),
+        }
+    return {"label": spec.label(), "claims": len(info.claims), "formats": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Info serialization formats")
+    parser.add_argument("--pages", type=int, nargs="+", default=[6, 24])
+    parser.add_argument("--claims", type=int, default=2)
+    parser.add_argument("--evidence", type=int, default=8)
+    parser.add_argument("--repeat", type=positive_int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="emify-serialization-") as workdir:
+        for pages in args.pages:
+            spec = SyntheticSpec(pages=pages, claims=args.claims, evidence=args.evidence, seed=args.seed)
+            result = bench_case(spec, args.repeat, workdir)
+            results.append(result)
+            print(f"\n{result['label']}")
+            for name, stats in result["formats"].items():
+                print(f"  {name:<8} {stats['bytes']:8d} bytes   encode {stats['encode_us']:8.1f} us   "
+                      f"decode {stats['decode_us']:8.1f} us")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"repeat": args.repeat, "cases": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Style map benchmark.
+
+Renders the Klageantwort of a synthetic Klageschrift with
+``emify/template.docx`` and formats it like a lawyer's style template
+(``emify.styles``): once with the style map cached by template hash, as
+job pool workers do after the first render, and once reading the style
+template for every render. By default the style template is a python-docx
+document with changed fonts and margins; ``--template`` takes a real one.
+
+Usage (from the ``webserv`` directory):
+
+    python -m benchmarks.style_bench --repeat 30 --template kanzlei.docx --output styles.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from .pipeline_bench import TEMPLATE_PATH, mock_llm, positive_int
+from .synthetic import SyntheticSpec, generate_pdf
+
+
+def _style_template(path: str) -> None:
+    from docx import Document  # type: ignore
+    from docx.shared import Pt  # type: ignore
+
+    document = Document()
+    document.styles["Normal"].font.name = "Garamond"
+    document.styles["Normal"].font.size = Pt(12)
+    document.styles["Heading 1"].font.name = "Arial"
+    for section in document.sections:
+        section.left_margin = section.right_margin = Pt(72)
+    document.save(path)
+
+
+def _median_ms(fn: Callable, repeat: int) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def run(args, workdir: str) -> Dict:
+    from emify.parsing import get_info, get_replacements, replace_placeholders_in_docx
+    from emify.placeholders import scan_docx
+    from emify.styles import apply_style_map, extract_style_map, get_style_map, render_docx
+
+    style_path = args.template or os.path.join(workdir, "style.docx")
+    if not args.template:
+        _style_template(style_path)
+    pdf_path = os.path.join(workdir, "klageschrift.pdf")
+    generate_pdf(SyntheticSpec(pages=args.pages, claims=2, seed=args.seed), pdf_path)
+    info = get_info(pdf_path)
+    replacements = get_replacements(info, mock_llm(info.to_string()))
+    output_path = os.path.join(workdir, "klageantwort.docx")
+    style = ("benchmark", style_path)
+    # Rendered from the placeholder inventory, as registered templates are
+    _, inventory = scan_docx(TEMPLATE_PATH.read_bytes())
+
+    def render():
+        replace_placeholders_in_docx(str(TEMPLATE_PATH), output_path, replacements, inventory.locations)
+
+    def uncached():
+        render()
+        apply_style_map(output_path, extract_style_map(style_path))
+
+    def cached():
+        render_docx(str(TEMPLATE_PATH), output_path, replacements, inventory.locations, style)
+
+    # Warm-up, which also fills the style map cache
+    uncached()
+    get_style_map(*style)
+    style_map = extract_style_map(style_path)
+
+    render_ms = _median_ms(render, args.repeat)
+    extract_ms = _median_ms(lambda: extract_style_map(style_path), args.repeat)
+    render()
+    apply_ms = _median_ms(lambda: apply_style_map(output_path, style_map), args.repeat)
+    return {
+        "style_template_bytes": os.path.getsize(style_path),
+        "styles": len(style_map.style_ids),
+        "render_ms": render_ms,
+        "extract_ms": extract_ms,
+        "apply_ms": apply_ms,
+        "styled_cached_ms": _median_ms(cached, args.repeat),
+        "styled_uncached_ms": _median_ms(uncached, args.repeat),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark applying a style template to rendered documents")
+    parser.add_argument("--repeat", type=positive_int, default=30)
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--template", help="Style template to apply (default: a generated one)")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="emify-styles-") as workdir:
+        result = run(args, workdir)
+
+    print(f"render                  {result['render_ms']:8.2f} ms")
+    print(f"extract style map       {result['extract_ms']:8.2f} ms   "
+          f"({result['styles']} styles, {result['style_template_bytes']} bytes)")
+    print(f"apply style map         {result['apply_ms']:8.2f} ms")
+    print(f"styled render, cached   {result['styled_cached_ms']:8.2f} ms")
+    print(f"styled render, uncached {result['styled_uncached_ms']:8.2f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "result": result}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+"""
+Synthetic Klageschrift generator.
+
+Produces documents with the same layout conventions as the bundled
+``Klageschrift.pdf`` (court block after "An das", bold party names, "BO:"
+evidence lines, numbered Rechtsbegehren, ...) so that ``emify.parsing`` can
+extract them. Size is controlled through the number of pages, claims and
+evidence entries; the output is fully determined by the seed. With
+``furniture`` every PDF page also gets a running header and a "Seite n von
+m" footer, as produced by word processors.
+"""
+import random
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN_LEFT = 60
+MARGIN_TOP = 70
+MARGIN_BOTTOM = 70
+FONT_SIZE = 11
+LINE_HEIGHT = 15
+BODY_INDENT = 36
+EVIDENCE_ACT_OFFSET = 360
+HEADER_Y = 40
+FOOTER_Y = PAGE_HEIGHT - 30
+
+REGULAR_FONT = "helv"
+BOLD_FONT = "hebo"
+
+COURTS = [
+    ("Zivilgericht Basel-Stadt", "Bäumleingasse 5", "4001 Basel"),
+    ("Bezirksgericht Zürich", "Wengistrasse 28", "8004 Zürich"),
+    ("Regionalgericht Bern-Mittelland", "Effingerstrasse 34", "3008 Bern"),
+    ("Kantonsgericht Luzern", "Hirschengraben 16", "6002 Luzern"),
+]
+COMPANIES = ["Müller & Janser AG", "Keller Handels GmbH", "Brunner Logistik AG", "Steiner Import AG"]
+PERSONS = ["Peter Meister", "Anna Huber", "Marco Frei", "Laura Baumann", "Thomas Graf"]
+PROFESSIONS = ["Werbegrafiker", "Schreiner", "Architektin", "Treuhänder", "Gärtner"]
+LAWYERS = ["Dr. Sandro Maurer", "Dr. Mark Sacher", "lic. iur. Eva Roth", "Dr. Jonas Weber"]
+LAW_FIRMS = ["Sacher Rechtsanwälte", "Roth & Partner", "Weber Advokatur"]
+STREETS = ["Scheideggstrasse", "Freie Strasse", "Erzenbergstrasse", "Klingentalstrasse", "Marktgasse"]
+CITIES = ["8002 Zürich", "4001 Basel", "4410 Liestal", "4057 Basel", "3011 Bern"]
+
+CLAIM_TEXTS = [
+    "Der Beklagte sei zu verpflichten, an die Klägerin CHF {amount}.- nebst 5% Zins seit dem {date} zu zahlen.",
+    "Der Beklagte sei zu verpflichten, der Klägerin die Kosten der Betreibung von CHF {amount}.- zu ersetzen.",
+    "Der Rechtsvorschlag in der Betreibung Nr. {number} sei zu beseitigen.",
+    "Unter Kosten- und Entschädigungsfolgen zulasten des Beklagten.",
+]
+STATEMENTS = [
+    "Die Klägerin ist eine im Handelsregister eingetragene Aktiengesellschaft nach Schweizer Recht.",
+    "Der Beklagte suchte den Betrieb der Klägerin auf und liess sich das Fahrzeug vorführen.",
+    "Nach einer Probefahrt entschloss sich der Beklagte zum Kauf und unterzeichnete den Kaufvertrag.",
+    "Nach dem Vertrag betrug der Kaufpreis CHF {amount}.-, wovon ein Teil bei Übergabe zu zahlen war.",
+    "Den Restbetrag hat der Beklagte trotz mehrfacher Mahnung nicht beglichen.",
+    "Der Beklagte wird vermutlich einwenden, dass die Ware mangelhaft sei. Damit kann er nicht gehört werden.",
+    "Zusicherungen über den Zustand der Kaufsache sind nicht abgegeben worden.",
+    "Dem Beklagten waren Alter und Zustand der Kaufsache bei Vertragsschluss bekannt.",
+]
+FORMAL_STATEMENTS = [
+    "Die Sühneverhandlung vor dem Friedensrichteramt fand ergebnislos am {date} statt.",
+    "Gleichentags wurde die Klagebewilligung ausgestellt. Der Unterzeichnende ist gehörig bevollmächtigt.",
+]
+JURISDICTION_STATEMENTS = [
+    "Die Klägerin hat ihren Geschäftssitz in Zürich, der Beklagte wohnt im Gerichtskreis, weshalb das "
+    "angerufene Gericht sachlich und örtlich zuständig ist (Art. 31 ZPO).",
+    "Die Klägerin offeriert für ihre tatsächlichen Ausführungen im Rahmen der Beweislast den "
+    "rechtsgenügenden Beweis, auch dort, wo nachfolgend keine Beweismittel genannt werden.",
+]
+EVIDENCE_TEXTS = [
+    "Anwaltsvollmacht", "Klagebewilligung vom {date}", "Handelsregisterauszug", "Kaufvertrag vom {date}",
+    "Mahnschreiben vom {date}", "Zahlungsbeleg vom {date}", "Korrespondenz der Parteien",
+]
+DATES = ["13. Februar 2012", "28. Mai 2012", "5. April 2012", "1. März 2013", "30. April 2012"]
+
+
+@dataclass
+class SyntheticSpec:
+    """Size parameters of a generated Klageschrift."""
+    pages: int = 6
+    claims: int = 2
+    evidence: int = 8
+    seed: int = 0
+    furniture: bool = False
+
+    def label(self) -> str:
+        label = f"p{self.pages}-c{self.claims}-e{self.evidence}-s{self.seed}"
+        return label + "-f" if self.furniture else label
+
+
+@dataclass
+class Line:
+    """One visual line: a list of (x offset, text, bold) segments."""
+    segments: List[Tuple[float, str, bool]]
+    gap_before: float = 0
+
+
+@dataclass
+class Layout:
+    pages: List[List[Tuple[float, float, str, bool]]] = field(default_factory=list)
+
+
+class _Writer:
+    """Collects document content as lines for the PDF and paragraphs for DOCX."""
+
+    def __init__(self):
+        self.lines: List[Line] = []
+        self.paragraphs: List[List[Tuple[str, bool]]] = []
+        self.running_header = ""
+
+    def line(self, *segments, gap=0, x=0.0):
+        parts = []
+        for segment in segments:
+            if isinstance(segment, tuple) and len(segment) == 3:
+                parts.append(segment)
+            else:
+                text, bold = segment if isinstance(segment, tuple) else (segment, False)
+                parts.append((None, text, bold))
+        # Fill in x offsets for consecutive segments of the same line
+        cursor = x
+        positioned = []
+        for offset, text, bold in parts:
+            if offset is not None:
+                cursor = offset
+            positioned.append((cursor, text, bold))
+            cursor += _text_width(text, bold)
+        self.lines.append(Line(positioned, gap_before=gap))
+        self.paragraphs.append([(text, bold) for _, text, bold in positioned])
+
+    def paragraph(self, text, x=0.0, bold=False, gap=0):
+        """Add text wrapped to the page width; wrapped lines keep a trailing space."""
+        width = PAGE_WIDTH - MARGIN_LEFT * 2 - x
+        for i, chunk in enumerate(_wrap(text, width, bold)):
+            self.lines.append(Line([(x, chunk, bold)], gap_before=gap if i == 0 else 0))
+        self.paragraphs.append([(text, bold)])
+
+
+@lru_cache(maxsize=None)
+def _text_width(text, bold):
+    import fitz  # type: ignore
+    return fitz.get_text_length(text, fontname=BOLD_FONT if bold else REGULAR_FONT, fontsize=FONT_SIZE)
+
+
+def _tokens(text):
+    # Keep tokens starting with a digit on the previous word so that wrapped
+    # lines never start with a number (the parser treats those as claim numbers)
+    tokens = []
+    for word in text.split(" "):
+        if tokens and word[:1].isdigit():
+            tokens[-1] += " " + word
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def _wrap(text, width, bold):
+    # Base-14 fonts have no kerning, so line widths are sums of token widths
+    lines = []
+    current = ""
+    current_width = 0.0
+    for token in _tokens(text):
+        token_width = _text_width(token, bold)
+        extra = _text_width(" ", bold) + token_width if current else token_width
+        if current and current_width + extra > width:
+            lines.append(current + " ")
+            current, current_width = token, token_width
+        else:
+            current = f"{current} {token}" if current else token
+            current_width += extra
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _fill(rng, text):
+    return text.format(
+        amount=f"{rng.randint(2, 90)}'{rng.randint(0, 9)}00",
+        date=rng.choice(DATES),
+        number=rng.randint(100000, 999999),
+    )
+
+
+def _content(spec: SyntheticSpec, filler_paragraphs: int) -> _Writer:
+    rng = random.Random(spec.seed)
+    w = _Writer()
+    court, court_street, court_city = rng.choice(COURTS)
+    plaintiff = rng.choice(COMPANIES)
+    defendant = rng.choice(PERSONS)
+    plaintiff_lawyer, defendant_lawyer = rng.sample(LAWYERS, 2)
+    w.running_header = f"{plaintiff} ./. {defendant}"
+
+    w.line(("Klageschrift", True))
+    w.line(("Einschreiben", True), gap=30, x=250)
+    w.line("An das", x=250)
+    w.line(court, x=250)
+    w.line(court_street, x=250)
+    w.line(f"Postfach {rng.randint(100, 999)}", x=250)
+    w.line(court_city, x=250)
+    w.line(f"{rng.choice(CITIES)[5:]}, {rng.choice(DATES)}", gap=20, x=250)
+
+    w.line("Sehr geehrte Damen und Herren", gap=30)
+    w.line("Hiermit reiche ich vorliegende")
+    w.line(("Klage", True), gap=10, x=200)
+    w.line("in Sachen", gap=10, x=195)
+    w.line((plaintiff + ", ", True), f"{rng.choice(STREETS)} {rng.randint(1, 99)}, {rng.choice(CITIES)}", gap=10)
+    w.line(("Klägerin", True), x=330)
+    w.line(f"vertreten durch RA {plaintiff_lawyer}, {rng.choice(STREETS)} {rng.randint(1, 99)}, "
+           f"Postfach, {rng.choice(CITIES)}")
+    w.line("gegen", gap=10)
+    w.line((defendant, True), f", {rng.choice(PROFESSIONS)}, {rng.choice(STREETS)} {rng.randint(1, 99)}, "
+           f"Postfach {rng.randint(100, 999)}, {rng.choice(CITIES)}", gap=10)
+    w.line(("Beklagter", True), x=330)
+    w.line(f"vertreten durch RA {defendant_lawyer}, {rng.choice(LAW_FIRMS)}, ")
+    w.line(f"{rng.choice(STREETS)} {rng.randint(1, 99)}, Postfach, {rng.choice(CITIES)}")
+    w.line(("betreffend Forderung", True), gap=15, x=180)
+    w.line(f"(Streitwert CHF {rng.randint(2, 90)}'000.-)", x=180)
+
+    w.line("ein und stelle folgende", gap=20)
+    w.line(("Rechtsbegehren:", True), gap=10)
+    for i in range(spec.claims):
+        # The last claim is always the cost claim, the others cycle through the money claims
+        if i == spec.claims - 1 and spec.claims > 1:
+            text = CLAIM_TEXTS[-1]
+        else:
+            text = _fill(rng, CLAIM_TEXTS[i % (len(CLAIM_TEXTS) - 1)])
+        w.line(f"{i + 1}.", gap=8)
+        width = PAGE_WIDTH - MARGIN_LEFT * 2 - BODY_INDENT
+        chunks = _wrap(text, width, False)
+        # The claim number and the first chunk share a line
+        w.lines[-1].segments.append((BODY_INDENT, chunks[0], False))
+        for chunk in chunks[1:]:
+            w.lines.append(Line([(BODY_INDENT, chunk, False)]))
+        w.paragraphs[-1] = [(f"{i + 1}.\t", False), (text, False)]
+
+    w.line(("Begründung:", True), gap=15, x=BODY_INDENT)
+
+    evidence_left = spec.evidence
+    act = 0
+
+    def evidence_line():
+        nonlocal evidence_left, act
+        w.line(("BO:", True), (BODY_INDENT * 2, _fill(rng, rng.choice(EVIDENCE_TEXTS)), False),
+               (EVIDENCE_ACT_OFFSET, f"kläg.act. {act}", True), x=BODY_INDENT)
+        evidence_left -= 1
+        act += 1
+
+    w.line(("I.", True), (BODY_INDENT, "Formelles", True), gap=15)
+    for statement in FORMAL_STATEMENTS:
+        w.paragraph(_fill(rng, statement), x=BODY_INDENT)
+    for _ in range(min(2, evidence_left)):
+        evidence_line()
+
+    w.line(("II.", True), (BODY_INDENT, "Zuständigkeit", True), gap=15)
+    for statement in JURISDICTION_STATEMENTS:
+        w.paragraph(statement, x=BODY_INDENT, gap=6)
+
+    w.line(("III. Materielles", True), gap=15)
+    facts = max(1, evidence_left) + filler_paragraphs
+    for i in range(facts):
+        w.paragraph(" ".join(_fill(rng, s) for s in rng.sample(STATEMENTS, 3)), gap=10)
+        if evidence_left > 0:
+            evidence_line()
+
+    w.paragraph("Der Zinsanspruch steht der Klägerin als Verzugsschaden zu. Der Beklagte befindet sich "
+                "seit dem vereinbarten Zahlungsdatum in Verzug.", gap=15)
+    w.paragraph("Abschliessend werden Sie noch einmal um Gutheissung der eingangs gestellten "
+                "Rechtsbegehren ersucht.", gap=15)
+    w.line(plaintiff_lawyer, gap=30)
+    w.line("Rechtsanwalt")
+    w.line(("Beilagen gemäss separatem Aktenverzeichnis", True), gap=20)
+    return w
+
+
+def _layout(lines: List[Line]) -> Layout:
+    layout = Layout()
+    page: List[Tuple[float, float, str, bool]] = []
+    y = MARGIN_TOP
+    for line in lines:
+        y += line.gap_before
+        if y + LINE_HEIGHT > PAGE_HEIGHT - MARGIN_BOTTOM and page:
+            layout.pages.append(page)
+            page = []
+            y = MARGIN_TOP
+        for x, text, bold in line.segments:
+            page.append((MARGIN_LEFT + x, y + FONT_SIZE, text, bold))
+        y += LINE_HEIGHT
+    if page:
+        layout.pages.append(page)
+    return layout
+
+
+def _sized_content(spec: SyntheticSpec) -> Tuple[_Writer, Layout]:
+    """Add filler fact paragraphs until the layout reaches ``spec.pages``."""
+    filler = 0
+    while True:
+        writer = _content(spec, filler)
+        layout = _layout(writer.lines)
+        missing = spec.pages - len(layout.pages)
+        if missing <= 0:
+            return writer, layout
+        # A filler paragraph takes roughly four lines plus its gap
+        filler += max(1, missing * (PAGE_HEIGHT - MARGIN_TOP - MARGIN_BOTTOM) // (LINE_HEIGHT * 5))
+
+
+def generate_pdf(spec: SyntheticSpec, path: Optional[str] = None) -> bytes:
+    """
+    Generate a synthetic Klageschrift as PDF.
+
+    Args:
+        spec: Size parameters of the document
+        path: Optional path the PDF is written to
+
+    Returns:
+        The PDF file content
+    """
+    import fitz  # type: ignore
+
+    writer, layout = _sized_content(spec)
+    doc = fitz.open()
+    try:
+        for number, items in enumerate(layout.pages, start=1):
+            page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            if spec.furniture:
+                footer = f"Seite {number} von {len(layout.pages)}"
+                items = items + [
+                    (MARGIN_LEFT, HEADER_Y, writer.running_header, False),
+                    (PAGE_WIDTH - MARGIN_LEFT - _text_width(footer, False), FOOTER_Y, footer, False),
+                ]
+            for x, y, text, bold in items:
+                page.insert_text((x, y), text, fontname=BOLD_FONT if bold else REGULAR_FONT, fontsize=FONT_SIZE)
+        # Fixed metadata and file id keep the output byte-identical per seed
+        doc.set_metadata({"producer": "emify synthetic", "creationDate": "", "modDate": ""})
+        data = doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+    finally:
+        doc.close()
+    if path:
+        with open(path, "wb") as f:
+            f.write(data)
+    return data
+
+
+def generate_docx(spec: SyntheticSpec, path: str) -> str:
+    """
+    Generate a synthetic Klageschrift as DOCX with the same content as the PDF.
+
+    Page furniture is not added: DOCX has no fixed pages to repeat it on.
+
+    Args:
+        spec: Size parameters of the document
+        path: Path the DOCX is written to
+
+    Returns:
+        The path of the written file
+    """
+    from docx import Document  # type: ignore
+
+    writer, _ = _sized_content(spec)
+    doc = Document()
+    for runs in writer.paragraphs:
+        paragraph = doc.add_paragraph()
+        for text, bold in runs:
+            paragraph.add_run(text).bold = bold
+    doc.save(path)
+    return path
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic Klageschrift")
+    parser.add_argument("output", help="Output path ending in .pdf or .docx")
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--claims", type=int, default=2)
+    parser.add_argument("--evidence", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--furniture", action="store_true", help="Add running headers and page footers")
+    args = parser.parse_args(argv)
+
+    spec = SyntheticSpec(args.pages, args.claims, args.evidence, args.seed, args.furniture)
+    if args.output.endswith(".docx"):
+        generate_docx(spec, args.output)
+    else:
+        generate_pdf(spec, args.output)
+    print(f"Wrote {args.output} ({spec.label()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,51 @@
 import os
-import re
+from functools import lru_cache
 from typing import List, Optional, Dict, Tuple, Any, Union
-from dotenv import load_dotenv
-from openai import OpenAI
-from pydantic import BaseModel
 
-# Load environment variables from .env file
-load_dotenv()
+from asgiref.sync import async_to_sync
+from django.conf import settings
 
-# Access the API key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+from .llm_scheduler import INTERACTIVE, estimate_tokens, get_scheduler
+from .placeholders import get_inventory
+from .tracing import span
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+OPENAI_MODEL = "gpt-4o-2024-08-06"
+# Seconds the scheduler pauses after a 429 without Retry-After
+DEFAULT_RATE_LIMIT_PAUSE = 10.0
 
-class PlaceholderValues(BaseModel):
-    values: List[Optional[str]]
+# The OpenAI SDK and pydantic take most of the import time of the app, so
+# they are imported when the first real LLM request is made (or by warmup.py)
+
+@lru_cache(maxsize=None)
+def get_api_key() -> Optional[str]:
+    """Return the OpenAI API key, loading the .env file on first use."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return os.getenv("OPENAI_API_KEY")
+
+@lru_cache(maxsize=None)
+def get_async_client():
+    """Return the async OpenAI client used by the async views."""
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=get_api_key())
+
+@lru_cache(maxsize=None)
+def placeholder_values_format():
+    """Return the structured output model of a placeholder request."""
+    from pydantic import BaseModel
+
+    class PlaceholderValues(BaseModel):
+        values: List[Optional[str]]
+
+    return PlaceholderValues
 
 def count_placeholders(template_text: str, regex_pattern: str) -> int:
     """
     Count placeholders in template text using the provided regex pattern.
+
+    JS-style regex literals ('/.../g') are accepted, see placeholders.clean_regex.
     
     Args:
         template_text: The template text to search for placeholders
@@ -28,17 +54,16 @@ def count_placeholders(template_text: str, regex_pattern: str) -> int:
     Returns:
         The number of placeholders found in the template
     """
-    # Clean up regex pattern for Python (remove JS-specific parts)
-    clean_regex = regex_pattern.rstrip('g')
-    if clean_regex.startswith('/'):
-        clean_regex = clean_regex[1:]
-    if clean_regex.endswith('/'):
-        clean_regex = clean_regex[:-1]
-        
-    # Count matches if template is provided
-    return len(re.findall(clean_regex, template_text)) if template_text else 0
+    # The inventory is cached by template hash, so a template is only scanned once
+    return get_inventory(template_text, regex_pattern).count if template_text else 0
 
-def build_prompt(text: str, template_text: str, placeholder_regex: str, placeholder_count: int) -> Tuple[str, str]:
+def build_prompt(
+    text: str,
+    template_text: str,
+    placeholder_regex: str,
+    placeholder_count: int,
+    precedents: Optional[List[Dict[str, Any]]] = None
+) -> Tuple[str, str]:
     """
     Build the prompt for the AI model.
     
@@ -47,6 +72,7 @@ def build_prompt(text: str, template_text: str, placeholder_regex: str, placehol
         template_text: The template text
         placeholder_regex: The regex pattern for placeholders
         placeholder_count: The number of placeholders found
+        precedents: Optional similar past cases (claims and generated answer), see retrieval.py
         
     Returns:
         Tuple of (user_prompt, system_prompt)
@@ -78,6 +104,21 @@ Suche nach allen Textstellen, die diesem Muster entsprechen, und fülle sie mit
 Im Template wurden genau {placeholder_count} Platzhalter gefunden. Dein Array MUSS exakt {placeholder_count} Einträge enthalten.
 Versuche, mindestens {int(placeholder_count * 0.8)} Platzhalter auszufüllen. Verwende nur für maximal {int(placeholder_count * 0.2)} Platzhalter null-Werte.
 Sei kreativ und entwickle starke juristische Gegenargumente, um die Position des Beklagten zu verteidigen.
+"""
+
+    if precedents:
+        user_prompt += """
+#Ähnliche frühere Fälle
+Die folgenden Rechtsbegehren wurden in früheren Klageschriften gestellt. Die damaligen Klageantworten dienen nur als Orientierung; massgebend ist allein die vorliegende Klageschrift.
+"""
+        for i, precedent in enumerate(precedents):
+            claims = "\n".join(f"{j + 1}. {claim}" for j, claim in enumerate(precedent['claims']))
+            user_prompt += f"""
+##Fall {i + 1}
+Rechtsbegehren:
+{claims}
+Klageantwort:
+{precedent['answer']}
 """
 
     user_prompt += f"""
@@ -93,20 +134,111 @@ Sei kreativ und entwickle starke juristische Gegenargumente, um die Position des
 def get_placeholder_values(
     parsed_json_file: Dict[str, Any], 
     parsed_json_template_file: Optional[Dict[str, Any]] = None, 
-    agreed_claims: Optional[List[str]] = None
-) -> Tuple[List[Optional[str]], Dict[str, str]]:
+    agreed_claims: Optional[List[str]] = None,
+    priority: str = INTERACTIVE,
+    user: str = ''
+) -> Tuple[List[Optional[str]], Dict[str, Any]]:
     """
     Get placeholder values from OpenAI API based on the provided text.
+
+    Runs aget_placeholder_values, so sync callers share the LLM scheduler's
+    limits, priorities and usage accounting with the async views.
     
     Args:
         parsed_json_file: Dictionary containing the 'text' field with legal document content
         parsed_json_template_file: Optional dictionary containing template text
         agreed_claims: Optional list of agreed claims
+        priority: INTERACTIVE or BATCH
+        user: Identifies the user for fair queuing
         
     Returns:
         Tuple of (placeholder_values, ai_prompt) where placeholder_values is a list of values 
         and ai_prompt is a dictionary containing the full prompts sent to the AI
     """
+    return async_to_sync(aget_placeholder_values)(
+        parsed_json_file, parsed_json_template_file, agreed_claims, priority, user
+    )
+
+async def aget_placeholder_values(
+    parsed_json_file: Dict[str, Any], 
+    parsed_json_template_file: Optional[Dict[str, Any]] = None, 
+    agreed_claims: Optional[List[str]] = None,
+    priority: str = INTERACTIVE,
+    user: str = ''
+) -> Tuple[List[Optional[str]], Dict[str, Any]]:
+    """
+    Async variant of get_placeholder_values using the async OpenAI client.
+    
+    The event loop is free while the request is in flight, so a single ASGI
+    worker can keep many LLM calls open at once. Requests go through the
+    process's LLM scheduler (see llm_scheduler.py), which enforces the
+    request and token limits and serves interactive requests first. A 429
+    from the provider pauses the scheduler and the request is queued again.
+    
+    Args:
+        parsed_json_file: Dictionary containing the 'text' field with legal document content
+        parsed_json_template_file: Optional dictionary containing template text
+        agreed_claims: Optional list of agreed claims
+        priority: INTERACTIVE or BATCH
+        user: Identifies the user for fair queuing
+        
+    Returns:
+        Tuple of (placeholder_values, ai_prompt), see get_placeholder_values; ai_prompt
+        also holds the token usage and cost of the request under 'usage'
+    """
+    prompt_info = prepare_prompt(parsed_json_file, parsed_json_template_file)
+    scheduler = get_scheduler()
+    estimated_tokens = estimate_tokens(prompt_info["system_prompt"], prompt_info["user_prompt"])
+    job = None
+    
+    try:
+        for attempt in range(settings.LLM_RATE_LIMIT_RETRIES + 1):
+            with span('llm_request', priority=priority, attempt=attempt) as current:
+                async with scheduler.slot(priority, user, estimated_tokens) as job:
+                    if current is not None:
+                        current.set(queued_seconds=round(job.queued_seconds, 3))
+                    try:
+                        response = await get_async_client().responses.parse(
+                            model=OPENAI_MODEL,
+                            input=_prompt_messages(prompt_info),
+                            text_format=placeholder_values_format(),
+                        )
+                    except Exception as e:
+                        if getattr(e, 'status_code', None) != 429 or attempt == settings.LLM_RATE_LIMIT_RETRIES:
+                            raise
+                        scheduler.pause(_retry_after(e))
+                        continue
+                    if response.usage is not None:
+                        job.record(response.usage.input_tokens, response.usage.output_tokens)
+            prompt_info["usage"] = job.usage()
+            return response.output_parsed.values, prompt_info
+    except Exception as e:
+        if job is not None:
+            prompt_info["usage"] = job.usage()
+        return _fallback_values(e, prompt_info, parsed_json_file, parsed_json_template_file, agreed_claims)
+
+def _retry_after(error: Exception) -> float:
+    """Seconds to pause after a 429, from its Retry-After header."""
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return DEFAULT_RATE_LIMIT_PAUSE
+
+def prepare_prompt(
+    parsed_json_file: Dict[str, Any], 
+    parsed_json_template_file: Optional[Dict[str, Any]] = None
+) -> Dict[str, str]:
+    """
+    Build the system and user prompts for a placeholder request.
+    
+    Args:
+        parsed_json_file: Dictionary containing the 'text' field with legal document content
+        parsed_json_template_file: Optional dictionary containing template text
+        
+    Returns:
+        Dictionary with the 'system_prompt' and 'user_prompt' sent to the AI
+    """
     # Extract text from inputs
     text = parsed_json_file.get('text', '')
     placeholder_regex = parsed_json_file.get('placeholder_regex', r'\$\{(.*?)\}')
@@ -116,33 +248,33 @@ def get_placeholder_values(
     placeholder_count = count_placeholders(template_text, placeholder_regex)
     
     # Build prompt
-    user_prompt, system_prompt = build_prompt(text, template_text, placeholder_regex, placeholder_count)
+    user_prompt, system_prompt = build_prompt(
+        text, template_text, placeholder_regex, placeholder_count, parsed_json_file.get('precedents')
+    )
     
-    # Prepare prompt information for return
-    prompt_info = {
+    return {
         "system_prompt": system_prompt,
         "user_prompt": user_prompt
     }
-    
-    try:
-        # Make request to OpenAI with structured outputs
-        response = client.responses.parse(
-            model="gpt-4o-2024-08-06",
-            input=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            text_format=PlaceholderValues,
-        )
-        
-        # Return the parsed values and the prompts
-        return response.output_parsed.values, prompt_info
-    except Exception as e:
-        print(f"OpenAI API error: {str(e)}")
-        # Fall back to mock values if there's an error
-        mock_values, _ = get_placeholder_mock_values(parsed_json_file, parsed_json_template_file, agreed_claims)
-        prompt_info["error"] = str(e)
-        return mock_values, prompt_info
+
+def _prompt_messages(prompt_info: Dict[str, str]) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": prompt_info["system_prompt"]},
+        {"role": "user", "content": prompt_info["user_prompt"]}
+    ]
+
+def _fallback_values(
+    error: Exception,
+    prompt_info: Dict[str, str],
+    parsed_json_file: Dict[str, Any], 
+    parsed_json_template_file: Optional[Dict[str, Any]], 
+    agreed_claims: Optional[List[str]]
+) -> Tuple[List[str], Dict[str, str]]:
+    print(f"OpenAI API error: {str(error)}")
+    # Fall back to mock values if there's an error
+    mock_values, _ = get_placeholder_mock_values(parsed_json_file, parsed_json_template_file, agreed_claims)
+    prompt_info["error"] = str(error)
+    return mock_values, prompt_info
 
 def get_placeholder_mock_values(
     parsed_json_file: Dict[str, Any], 
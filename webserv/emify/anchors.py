@@ -0,0 +1,111 @@
+import json
+import os
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List
+
+RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'anchor_rules')
+DEFAULT_RULESET = 'default'
+
+
+class AnchorMatcher:
+    """
+    Aho-Corasick automaton over all anchor patterns of a ruleset.
+
+    ``labels(text)`` returns the names of all anchors with at least one
+    pattern occurring in ``text`` (the same as a substring test per pattern)
+    in a single left-to-right scan, so the cost per span does not grow with
+    the number of rules.
+    """
+
+    def __init__(self, anchors: Dict[str, Iterable[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[FrozenSet[str]] = [frozenset()]
+        for label, patterns in anchors.items():
+            for pattern in patterns:
+                self._add(pattern, label)
+        self._link()
+
+    def _add(self, pattern: str, label: str):
+        if not pattern:
+            raise ValueError(f"Empty pattern for anchor {label}")
+        state = 0
+        for char in pattern:
+            following = self._goto[state].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][char] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(frozenset())
+            state = following
+        self._out[state] = self._out[state] | {label}
+
+    def _link(self):
+        # Breadth-first so that fail links always point to already finished states
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[following] = target if target != following else 0
+                # Patterns ending at the fail state also end here
+                self._out[following] = self._out[following] | self._out[self._fail[following]]
+
+    def labels(self, text: str) -> FrozenSet[str]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found: FrozenSet[str] = frozenset()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found = found | out[state]
+        return found
+
+
+class Ruleset:
+    """Anchor patterns and settings for one court/filing style."""
+
+    def __init__(self, name: str, anchors: Dict[str, List[str]], representative_prefix: str = ''):
+        self.name = name
+        self.anchors = anchors
+        self.representative_prefix = representative_prefix
+        self.matcher = AnchorMatcher(anchors)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'Ruleset':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['name'], data['anchors'], data.get('representative_prefix', ''))
+
+
+def available_rulesets() -> List[str]:
+    return sorted(name[:-len('.json')] for name in os.listdir(RULES_DIR) if name.endswith('.json'))
+
+
+@lru_cache(maxsize=None)
+def get_ruleset(name: str = None) -> Ruleset:
+    """
+    Load and compile a ruleset from emify/anchor_rules/<name>.json.
+
+    Without a name the EMIFY_ANCHOR_RULESET environment variable (default
+    "default") decides, which also applies to parse jobs in pool workers.
+    """
+    name = name or os.getenv('EMIFY_ANCHOR_RULESET', DEFAULT_RULESET)
+    path = os.path.join(RULES_DIR, f"{os.path.basename(name)}.json")
+    if not os.path.exists(path):
+        raise ValueError(f"Unknown anchor ruleset '{name}', available: {', '.join(available_rulesets())}")
+    return Ruleset.from_file(path)
+
+
+def classify_spans(spans: List[dict], ruleset: Ruleset) -> List[dict]:
+    """Store the anchor labels of every span under span["anchors"]."""
+    labels = ruleset.matcher.labels
+    for span in spans:
+        span["anchors"] = labels(span["text"])
+    return spans
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from .ingest import aload_info, ingest_upload
+from .job_pool import JobTimeout, PoolBusy, WorkerCrashed
+from .llm_scheduler import BATCH
+from .pipeline import generate_klageantwort
+from .profiling import sync_to_async
+from .template_registry import default_docx_template
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+BATCH_DIR = 'batches'
+DOCUMENT_EXTENSIONS = ('.pdf', '.docx')
+# Attempts and seconds between them when the job pool is full
+POOL_BUSY_RETRIES = 5
+POOL_BUSY_DELAY = 2.0
+# What a failed document's entry says; exception details can name server paths and stay in the log
+ERROR_MESSAGES = (
+    (PoolBusy, "The server was busy, please submit the document again"),
+    (JobTimeout, "Processing the document took too long"),
+    (WorkerCrashed, "Processing the document failed, please submit it again"),
+)
+UNKNOWN_ERROR = "The document could not be processed"
+
+
+class BatchError(Exception):
+    """Raised when a batch upload cannot be processed at all."""
+
+
+def collect_files(uploads: List[Any]) -> List[Tuple[str, Any]]:
+    """
+    Turn the uploaded files of a batch request into (name, file) pairs.
+
+    ZIP archives are unpacked; their PDF and DOCX members become in-memory
+    uploads. Other files are returned with file None, so they show up as
+    skipped in the manifest.
+
+    Raises:
+        BatchError: If there are no documents, too many or too large ones, or a ZIP archive is unreadable
+    """
+    files = []
+
+    def check_count() -> None:
+        if len(files) >= settings.BATCH_MAX_DOCUMENTS:
+            raise BatchError(f"A batch can hold at most {settings.BATCH_MAX_DOCUMENTS} documents")
+
+    for upload in uploads:
+        name = os.path.basename(upload.name)
+        if not name.lower().endswith('.zip'):
+            check_count()
+            if upload.size > settings.BATCH_MAX_FILE_SIZE:
+                raise BatchError(f"{name} is larger than {settings.BATCH_MAX_FILE_SIZE} bytes")
+            files.append((name, upload if name.lower().endswith(DOCUMENT_EXTENSIONS) else None))
+            continue
+        try:
+            with zipfile.ZipFile(upload) as archive:
+                for member in archive.infolist():
+                    member_name = os.path.basename(member.filename)
+                    if member.is_dir() or not member_name or member.filename.startswith('__MACOSX/'):
+                        continue
+                    # Checked before reading, so a large archive is not unpacked into memory first
+                    check_count()
+                    if not member_name.lower().endswith(DOCUMENT_EXTENSIONS):
+                        files.append((member_name, None))
+                    elif member.file_size > settings.BATCH_MAX_FILE_SIZE:
+                        # Checked before reading, so a ZIP bomb is not unpacked into memory
+                        raise BatchError(f"{member_name} is larger than {settings.BATCH_MAX_FILE_SIZE} bytes")
+                    else:
+                        files.append((member_name, SimpleUploadedFile(member_name, archive.read(member))))
+        except zipfile.BadZipFile:
+            raise BatchError(f"{name} is not a readable ZIP archive")
+    if not any(upload for _, upload in files):
+        raise BatchError("No PDF or DOCX documents in the upload")
+    return files
+
+
+def _output_name(index: int, name: str) -> str:
+    return f"{index + 1:03d}-{os.path.splitext(name)[0]}-klageantwort.docx"
+
+
+def _error_message(error: Exception) -> str:
+    for error_type, message in ERROR_MESSAGES:
+        if isinstance(error, error_type):
+            return message
+    return UNKNOWN_ERROR
+
+
+async def _with_retry(coroutine_function, *args):
+    for attempt in range(POOL_BUSY_RETRIES):
+        try:
+            return await coroutine_function(*args)
+        except PoolBusy:
+            if attempt == POOL_BUSY_RETRIES - 1:
+                raise
+            await asyncio.sleep(POOL_BUSY_DELAY)
+
+
+async def _process(index: int, name: str, upload, template, workdir: str, semaphore: asyncio.Semaphore,
+                   user: str) -> Dict:
+    entry: Dict[str, Any] = {'index': index, 'name': name}
+    if upload is None:
+        entry.update(status='skipped', error='Not a PDF or DOCX file')
+        return entry
+    async with semaphore:
+        # Every document of a batch is traced on its own (see tracing.py)
+        with span('batch_document', index=index, name=name) as current:
+            if current is not None:
+                entry['trace'] = current.trace_id
+            start = time.perf_counter()
+            try:
+                document, _ = await sync_to_async(ingest_upload, thread_sensitive=False)(upload)
+                entry['sha256'] = document.sha256
+                info = await _with_retry(aload_info, document)
+                output = _output_name(index, name)
+                json_data = await _with_retry(generate_klageantwort, info, template, os.path.join(workdir, output),
+                                              document, BATCH, user)
+                prompt = json_data.get('prompt') or {}
+                entry.update(status='ok', output=output, claims=len(info.claims),
+                             placeholder_values=len(json_data['placeholder_values']))
+                if 'reused_from' in prompt:
+                    entry['reused_from'] = prompt['reused_from']
+                if 'error' in prompt:
+                    # The LLM failed and mock values were used
+                    entry['llm_error'] = prompt['error']
+            except Exception as e:
+                logger.exception("Batch document %s failed", name)
+                entry.update(status='error', error=_error_message(e))
+            entry['seconds'] = round(time.perf_counter() - start, 3)
+    return entry
+
+
+def _write_zip(zip_path: str, workdir: str, manifest: Dict) -> None:
+    with zipfile.ZipFile(zip_path + '.tmp', 'w', zipfile.ZIP_DEFLATED) as archive:
+        for entry in manifest['documents']:
+            if entry['status'] == 'ok':
+                archive.write(os.path.join(workdir, entry['output']), entry['output'])
+        archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+    os.replace(zip_path + '.tmp', zip_path)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _line(event: Dict) -> bytes:
+    return (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+async def run_batch(files: List[Tuple[str, Optional[Any]]], user: str = '') -> AsyncIterator[bytes]:
+    """
+    Process a batch and stream its progress as NDJSON lines.
+
+    At most BATCH_CONCURRENCY documents of the batch are processed at once;
+    parsing and rendering also share the bounded job pool with all other
+    requests, and their LLM requests are scheduled as BATCH, behind
+    interactive ones. Every finished document yields a 'document' event. The last
+    event, 'finished', holds the manifest and the URL of a ZIP with every
+    generated Klageantwort and manifest.json.
+    """
+    batch_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    created_at = datetime.now(timezone.utc).isoformat()
+    workdir = os.path.join(settings.MEDIA_ROOT, BATCH_DIR, batch_id)
+    await sync_to_async(os.makedirs, thread_sensitive=False)(workdir, exist_ok=True)
+    yield _line({'event': 'started', 'batch': batch_id, 'documents': len(files)})
+
+    template = await sync_to_async(default_docx_template, thread_sensitive=False)()
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    tasks = [asyncio.ensure_future(_process(index, name, upload, template, workdir, semaphore, user))
+             for index, (name, upload) in enumerate(files)]
+    entries = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            entry = await next_done
+            entries.append(entry)
+            yield _line({'event': 'document', 'completed': len(entries), **entry})
+    finally:
+        # The client went away: do not keep processing for nobody
+        for task in tasks:
+            task.cancel()
+
+    entries.sort(key=lambda entry: entry['index'])
+    manifest = {
+        'batch': batch_id,
+        'created_at': created_at,
+        'documents': entries,
+        'succeeded': sum(entry['status'] == 'ok' for entry in entries),
+        'failed': sum(entry['status'] == 'error' for entry in entries),
+        'skipped': sum(entry['status'] == 'skipped' for entry in entries),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    zip_name = f"{BATCH_DIR}/{batch_id}.zip"
+    await sync_to_async(_write_zip, thread_sensitive=False)(
+        os.path.join(settings.MEDIA_ROOT, zip_name), workdir, manifest
+    )
+    yield _line({'event': 'finished', 'download_url': f"{settings.MEDIA_URL}{zip_name}", 'manifest': manifest})
@@ -0,0 +1,220 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Argument, Case, Claim, Court, Evidence, Party, Representative, UploadedFile
+from . import parsing
+
+# Cases written per transaction; every table is filled with one bulk insert per batch
+DEFAULT_BATCH_SIZE = 500
+
+# Party roles and argument sections are named like the Header and Justification fields holding them
+ROLES = (Party.PLAINTIFF, Party.DEFENDANT)
+SECTIONS = (Argument.FORMALITIES, Argument.JURISDICTION, Argument.FACTS)
+_ENTITY_FIELDS = ('name', 'additional', 'street', 'city', 'po_box')
+
+
+def _entity_fields(entity: parsing.Entity) -> Dict[str, str]:
+    address = entity.address
+    # Blank instead of NULL, so the unique constraint of Court covers courts without a PO box
+    values = (entity.name, entity.additional, address.street, address.city, address.po_box)
+    return {name: value or '' for name, value in zip(_ENTITY_FIELDS, values)}
+
+
+def _court_key(fields: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(fields[name] for name in _ENTITY_FIELDS)
+
+
+def _entity(row, role: Optional[str] = None, representative: Optional[parsing.Entity] = None) -> parsing.Entity:
+    address = parsing.Address(row.street, row.city, row.po_box or None)
+    # Header sets the roles of the court and the parties
+    return parsing.Entity(row.name, address, role, row.additional or None, representative)
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _court_ids(courts: List[Dict[str, str]]) -> Dict[Tuple[str, ...], int]:
+    """Primary keys of the given courts, creating the ones not stored yet."""
+    wanted = {_court_key(fields): fields for fields in courts}
+    names = {fields['name'] for fields in wanted.values()}
+
+    def stored():
+        return {_court_key(row): row['pk'] for row in Court.objects.filter(name__in=names).values('pk', *_ENTITY_FIELDS)}
+
+    ids = stored()
+    missing = [Court(**fields) for court_key, fields in wanted.items() if court_key not in ids]
+    if missing:
+        # Another worker may store the same court meanwhile; the unique constraint keeps one
+        Court.objects.bulk_create(missing, ignore_conflicts=True)
+        ids = stored()
+    return ids
+
+
+def _store_batch(cases: Sequence[Tuple[str, parsing.Info]]) -> None:
+    keys = [document_key for document_key, _ in cases]
+    documents = dict(UploadedFile.objects.filter(sha256__in=keys).values_list('sha256', 'pk'))
+    # Case numbers are entered after filing and survive a new parse of the same document
+    case_numbers = dict(Case.objects.filter(document_key__in=keys).exclude(case_number='')
+                        .values_list('document_key', 'case_number'))
+    court_ids = _court_ids([_entity_fields(info.header.court) for _, info in cases])
+    Case.objects.filter(document_key__in=keys).delete()
+
+    rows = Case.objects.bulk_create([
+        Case(
+            document_key=document_key,
+            document_id=documents.get(document_key),
+            court_id=court_ids[_court_key(_entity_fields(info.header.court))],
+            case_number=case_numbers.get(document_key, ''),
+            schema_version=parsing.SCHEMA_VERSION,
+        )
+        for document_key, info in cases
+    ])
+
+    # SQLite 3.35+, PostgreSQL and MariaDB return the primary keys of bulk inserts
+    parties, representatives, claims, arguments, evidence = [], [], [], [], []
+    for case, (_, info) in zip(rows, cases):
+        for role in ROLES:
+            entity = getattr(info.header, role)
+            party = Party(case=case, role=role, **_entity_fields(entity))
+            parties.append(party)
+            if entity.representative:
+                representatives.append((party, _entity_fields(entity.representative)))
+        claims.extend(Claim(case=case, position=position, text=text) for position, text in enumerate(info.claims))
+        for section in SECTIONS:
+            for position, item in enumerate(getattr(info.justification, section)):
+                argument = Argument(case=case, section=section, position=position, statement=item.statement)
+                arguments.append(argument)
+                evidence.extend((argument, number, text) for number, text in enumerate(item.evidence or []))
+
+    Party.objects.bulk_create(parties)
+    Claim.objects.bulk_create(claims)
+    Argument.objects.bulk_create(arguments)
+    Representative.objects.bulk_create([Representative(party=party, **fields) for party, fields in representatives])
+    Evidence.objects.bulk_create([
+        Evidence(argument=argument, position=position, text=text) for argument, position, text in evidence
+    ])
+
+
+def store_cases(cases: Iterable[Tuple[str, parsing.Info]], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Store parsed Klageschriften, replacing the stored data of the same documents.
+
+    Every batch is written in one transaction with one bulk insert per
+    table, so importing thousands of documents takes a few dozen queries
+    per batch instead of dozens per document. Courts are shared between
+    cases; a case number entered for a document is kept.
+
+    Args:
+        cases: (document content hash, Info) pairs, consumed lazily
+        batch_size: Cases per transaction
+
+    Returns:
+        Number of cases stored
+    """
+    count = 0
+    for batch in _chunks(cases, batch_size):
+        # A document listed twice in one batch is stored once, with its last Info
+        batch = list(dict(batch).items())
+        with transaction.atomic():
+            _store_batch(batch)
+        count += len(batch)
+    return count
+
+
+def store_case(document_key: str, info: parsing.Info) -> None:
+    store_cases([(document_key, info)])
+
+
+def link_document(document: UploadedFile) -> None:
+    """Attach a case stored before its upload record existed (PDFs are parsed first) to the record."""
+    Case.objects.filter(document_key=document.sha256, document=None).update(document=document)
+
+
+def _info(case: Case) -> parsing.Info:
+    parties = {party.role: party for party in case.parties.all()}
+    entities = []
+    for role in ROLES:
+        party = parties[role]
+        try:
+            representative = _entity(party.representative, 'Representative')
+        except Representative.DoesNotExist:
+            representative = None
+        entities.append(_entity(party, representative=representative))
+    arguments = {section: [] for section in SECTIONS}
+    for argument in case.arguments.all():
+        evidence = [item.text for item in argument.evidence.all()]
+        arguments[argument.section].append(parsing.Argument(argument.statement, evidence))
+    return parsing.Info(
+        parsing.Header(_entity(case.court), *entities),
+        [claim.text for claim in case.claims.all()],
+        parsing.Justification(*(arguments[section] for section in SECTIONS)),
+    )
+
+
+def load_infos(document_keys: Iterable[str]) -> Dict[str, parsing.Info]:
+    """
+    Rebuild the Info of stored documents without parsing them.
+
+    Documents that are not stored, or were stored with another
+    parsing.SCHEMA_VERSION, are left out.
+
+    Returns:
+        Info by document content hash
+    """
+    cases = (
+        Case.objects.filter(document_key__in=list(document_keys), schema_version=parsing.SCHEMA_VERSION)
+        .select_related('court')
+        .prefetch_related('parties__representative', 'claims', 'arguments__evidence')
+    )
+    return {case.document_key: _info(case) for case in cases}
+
+
+def load_info(document_key: str) -> Optional[parsing.Info]:
+    return load_infos([document_key]).get(document_key)
+
+
+def find_cases(court: str = '', party: str = '', case_number: str = ''):
+    """
+    Select stored cases by court, party or representative name and case number.
+
+    Names match case-insensitively from their start ("Zivilgericht" finds
+    "Zivilgericht Basel-Stadt"); a party name also matches the parties'
+    representatives.
+
+    Returns:
+        QuerySet of Case
+    """
+    cases = Case.objects.all()
+    if court:
+        cases = cases.filter(court__name__istartswith=court)
+    if party:
+        cases = cases.filter(pk__in=Party.objects.filter(
+            Q(name__istartswith=party) | Q(representative__name__istartswith=party)).values('case_id'))
+    if case_number:
+        cases = cases.filter(case_number=case_number)
+    return cases
+
+
+def case_summaries(cases, limit: int = 20) -> List[Dict[str, str]]:
+    """Document, file name, court, party names and case number of the newest of the given cases."""
+    rows = cases.select_related('court', 'document').prefetch_related('parties').order_by('-created_at')[:limit]
+    return [
+        {
+            'document': case.document_key,
+            'name': case.document.original_name if case.document else '',
+            'court': case.court.name,
+            **{party.role: party.name for party in case.parties.all()},
+            'case_number': case.case_number,
+        }
+        for case in rows
+    ]
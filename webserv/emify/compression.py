@@ -0,0 +1,127 @@
+import asyncio
+import functools
+import zlib
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+
+def _brotli():
+    try:
+        import brotli  # type: ignore
+    except ImportError:
+        return None
+    return brotli
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """Content codings of an Accept-Encoding header with a non-zero quality, best first."""
+    codings = []
+    for position, item in enumerate(header.split(',')):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name and quality > 0:
+            codings.append((-quality, position, name.strip().lower()))
+    return [name for _, _, name in sorted(codings)]
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    """Pick brotli (if installed) or gzip, in the client's order of preference."""
+    available = ['br', 'gzip'] if _brotli() else ['gzip']
+    for name in accepted_encodings(header):
+        if name == '*':
+            return available[0]
+        if name in available:
+            return name
+    return None
+
+
+class _Compressor:
+    """Incremental gzip or brotli compressor; flush() ends a chunk the client can decode right away."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = _brotli().Compressor(quality=settings.COMPRESS_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def _compress_iterator(chunks: Iterator[bytes], compressor: _Compressor) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush()
+    yield compressor.finish()
+
+
+async def _compress_async_iterator(chunks: AsyncIterator[bytes], compressor: _Compressor) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush()
+    yield compressor.finish()
+
+
+def compress(request, response):
+    """
+    Compress a response with brotli or gzip according to Accept-Encoding.
+
+    Regular responses are compressed when they are at least
+    COMPRESS_MIN_SIZE bytes. Streaming responses are compressed chunk by
+    chunk and flushed after every chunk, so NDJSON lines still reach the
+    client as they are produced.
+    """
+    if response.status_code != 200 or response.has_header('Content-Encoding'):
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+
+    compressor = _Compressor(encoding)
+    if response.streaming:
+        if response.is_async:
+            response.streaming_content = _compress_async_iterator(response.streaming_content, compressor)
+        else:
+            response.streaming_content = _compress_iterator(response.streaming_content, compressor)
+        del response['Content-Length']
+    else:
+        if len(response.content) < settings.COMPRESS_MIN_SIZE:
+            return response
+        response.content = compressor.compress(response.content) + compressor.finish()
+        response['Content-Length'] = str(len(response.content))
+    response['Content-Encoding'] = encoding
+    return response
+
+
+def compressed(view: Callable) -> Callable:
+    """Decorator applying compress() to the responses of a sync or async view."""
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            return compress(request, await view(request, *args, **kwargs))
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return compress(request, view(request, *args, **kwargs))
+    return wrapper
@@ -1,5 +1,6 @@
 import os
 import subprocess
+from typing import Optional
 
 def convert_docx_to_pdf(input_docx: str, output_pdf: str) -> bool:
     if not os.path.isfile(input_docx):
@@ -18,3 +19,30 @@ def convert_docx_to_pdf(input_docx: str, output_pdf: str) -> bool:
         print("❌ Conversion failed:")
         print(e.stderr.decode())
         return False
+    except OSError as e:
+        # unoconv is not installed or cannot be started
+        print(f"❌ Conversion failed: {e}")
+        return False
+
+
+def convert_docx_to_pdf_bytes(input_docx: str) -> Optional[bytes]:
+    """Convert a DOCX file and return the PDF content without writing it to disk."""
+    if not os.path.isfile(input_docx):
+        print(f"❌ Input file not found: {input_docx}")
+        return None
+    try:
+        result = subprocess.run(
+            ['unoconv', '-f', 'pdf', '--stdout', input_docx],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        return result.stdout
+    except subprocess.CalledProcessError as e:
+        print("❌ Conversion failed:")
+        print(e.stderr.decode())
+        return None
+    except OSError as e:
+        # unoconv is not installed or cannot be started
+        print(f"❌ Conversion failed: {e}")
+        return None
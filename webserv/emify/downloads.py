@@ -0,0 +1,183 @@
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+CHUNK_SIZE = 1 << 16
+ETAG_CACHE_SIZE = 1024
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_etags: 'OrderedDict[tuple, str]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def file_etag(path: str, stat: Optional[os.stat_result] = None) -> str:
+    """
+    Strong ETag from the SHA-256 of the file content.
+
+    The hash is cached per (path, inode, size, mtime), so a file is only
+    read again after it changed.
+    """
+    stat = stat or os.stat(path)
+    key = (path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        etag = _etags.get(key)
+    if etag is None:
+        with open(path, 'rb') as f:
+            etag = quote_etag(hashlib.file_digest(f, 'sha256').hexdigest()[:32])
+        with _lock:
+            _etags[key] = etag
+            while len(_etags) > ETAG_CACHE_SIZE:
+                _etags.popitem(last=False)
+    return etag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    return '*' in candidates or etag in (candidate.removeprefix('W/') for candidate in candidates)
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range.
+
+    Args:
+        header: The Range header
+        size: File size in bytes
+
+    Returns:
+        Tuple of (first, last) byte, inclusive; None if the header should be ignored
+
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    match = RANGE.match(header.strip())
+    # Multiple ranges and other units are ignored and answered with the whole file
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-500: the last 500 bytes
+        length = int(last)
+        if not length:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        raise ValueError("Range not satisfiable")
+    return first, last
+
+
+def _read_range(path: str, first: int, length: int) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload(response: HttpResponse, path: str) -> HttpResponse:
+    """Let the front proxy send the file (see EMIFY_DOWNLOAD_OFFLOAD)."""
+    if settings.DOWNLOAD_OFFLOAD == 'x-accel-redirect':
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = settings.DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + relative
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def serve_file(request, path: str, filename: Optional[str] = None, as_attachment: bool = False) -> HttpResponse:
+    """
+    Serve a file with a content-hash ETag, conditional GET and byte ranges.
+
+    If-None-Match with the current ETag is answered with 304. A single byte
+    range is answered with 206 (unless If-Range names an older version).
+    With EMIFY_DOWNLOAD_OFFLOAD the headers are set here and the transfer,
+    including ranges, is left to nginx (X-Accel-Redirect) or Apache/lighttpd
+    (X-Sendfile).
+
+    Args:
+        request: The GET or HEAD request
+        path: Absolute path of the file
+        filename: Download name, defaults to the file name
+        as_attachment: Ask the browser to save the file instead of showing it
+
+    Returns:
+        The response
+
+    Raises:
+        Http404: If the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404("File not found.")
+    if not os.path.isfile(path):
+        raise Http404("File not found.")
+
+    etag = file_etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': settings.DOWNLOAD_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return HttpResponseNotModified(headers=headers)
+
+    filename = filename or os.path.basename(path)
+    if settings.DOWNLOAD_OFFLOAD:
+        content_type, _ = mimetypes.guess_type(filename)
+        response = HttpResponse(content_type=content_type or 'application/octet-stream', headers=headers)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        return _offload(response, path)
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    byte_range = None
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416, headers=headers)
+            response['Content-Range'] = f"bytes */{stat.st_size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), as_attachment=as_attachment, filename=filename)
+    else:
+        first, last = byte_range
+        length = last - first + 1
+        content_type, _ = mimetypes.guess_type(filename)
+        response = StreamingHttpResponse(_read_range(path, first, length), status=206,
+                                         content_type=content_type or 'application/octet-stream')
+        response['Content-Range'] = f"bytes {first}-{last}/{stat.st_size}"
+        response['Content-Length'] = str(length)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def serve_media(request, path: str, as_attachment: bool = False) -> HttpResponse:
+    """Serve a file below MEDIA_ROOT; paths leaving it answer 404."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found.")
+    return serve_file(request, full_path, as_attachment=as_attachment)
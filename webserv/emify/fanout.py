@@ -0,0 +1,102 @@
+import os
+import time
+import uuid
+import zipfile
+from typing import Any, Dict, List, Sequence
+
+from django.conf import settings
+from django.utils.text import slugify
+
+from .ingest import aload_info
+from .pipeline import generate_klageantworten
+from .models import Template
+from .profiling import sync_to_async
+from .template_registry import default_docx_template
+
+RENDER_DIR = 'renders'
+# Key that selects the built-in Klageantwort template
+DEFAULT_TEMPLATE_KEY = 'default'
+
+
+class FanoutError(Exception):
+    """Raised when the templates of a render request cannot be used."""
+
+
+def resolve_templates(keys: Sequence[str]) -> List[Template]:
+    """
+    Look up the DOCX templates of a render request, in the order given.
+
+    Args:
+        keys: Template keys from /templates/, or 'default' for the built-in template
+
+    Raises:
+        FanoutError: If there are no keys, too many, unknown or text-only templates
+    """
+    if not keys:
+        raise FanoutError("Give at least one template")
+    if len(keys) > settings.RENDER_MAX_TEMPLATES:
+        raise FanoutError(f"A render can use at most {settings.RENDER_MAX_TEMPLATES} templates")
+    if len(set(keys)) != len(keys):
+        raise FanoutError("Templates must not repeat")
+    found = {template.key: template for template in Template.objects.filter(key__in=keys)}
+    templates = []
+    for key in keys:
+        template = default_docx_template() if key == DEFAULT_TEMPLATE_KEY else found.get(key)
+        if template is None:
+            raise FanoutError(f"Unknown template {key}")
+        if not template.is_docx:
+            raise FanoutError(f"Template {key} is a text template and cannot be rendered")
+        templates.append(template)
+    return templates
+
+
+def _output_name(index: int, template: Template) -> str:
+    return f"{index + 1:02d}-{slugify(template.name) or template.key[:12]}-klageantwort.docx"
+
+
+def _write_zip(zip_path: str, workdir: str, names: List[str]) -> None:
+    with zipfile.ZipFile(zip_path + '.tmp', 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name in names:
+            archive.write(os.path.join(workdir, name), name)
+    os.replace(zip_path + '.tmp', zip_path)
+
+
+async def render_templates(document, templates: List[Template], user: str = '', style=None) -> Dict[str, Any]:
+    """
+    Render an uploaded Klageschrift into several templates at once.
+
+    The document is parsed (or loaded) once and its placeholder values come
+    from a single LLM run; every template is then filled from the same
+    values in parallel (see pipeline.generate_klageantworten). The outputs
+    are kept under MEDIA_ROOT/renders/<id>/ together with a ZIP of all of them.
+    A style template formats every output (see styles.py).
+
+    Raises:
+        PoolBusy, JobTimeout, WorkerCrashed: If parsing or a render job cannot run
+    """
+    render_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    workdir = os.path.join(settings.MEDIA_ROOT, RENDER_DIR, render_id)
+    await sync_to_async(os.makedirs, thread_sensitive=False)(workdir, exist_ok=True)
+
+    info = await aload_info(document)
+    names = [_output_name(index, template) for index, template in enumerate(templates)]
+    json_data = await generate_klageantworten(
+        info, [(template, os.path.join(workdir, name)) for template, name in zip(templates, names)],
+        document, user=user, style=style,
+    )
+    await sync_to_async(_write_zip, thread_sensitive=False)(os.path.join(workdir, 'klageantworten.zip'), workdir, names)
+
+    base_url = f"{settings.MEDIA_URL}{RENDER_DIR}/{render_id}/"
+    return {
+        'render': render_id,
+        'document': document.sha256,
+        'style': style.key if style is not None else None,
+        'placeholder_values': json_data['placeholder_values'],
+        'outputs': [
+            {'template': template.key, 'name': template.name, 'download_url': base_url + name}
+            for template, name in zip(templates, names)
+        ],
+        'download_url': base_url + 'klageantworten.zip',
+        'seconds': round(time.perf_counter() - started, 3),
+    }
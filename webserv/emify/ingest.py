@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import os
+from functools import partial
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+
+from .case_store import link_document, load_info, store_case
+from .convert_docx_to_pdf import convert_docx_to_pdf_bytes
+from .job_pool import get_job_pool, run_job
+from .memory import track_stage
+from .models import UploadedFile
+from .parsing import get_info
+from .profiling import sync_to_async
+from .singleflight import acoalesce, coalesce, flight_key
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = 'uploads'
+
+
+def info_cache_key(sha256: str) -> str:
+    return f"emify:info:{sha256}"
+
+
+def hash_upload(uploaded_file) -> str:
+    """Hash an upload chunk by chunk, straight from Django's upload buffer."""
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def _pdf_source(uploaded_file):
+    """
+    Return what fitz should open for a PDF upload.
+
+    Large uploads are spooled to a temporary file by Django, which is parsed
+    in place; small uploads live in memory and are parsed from their buffer.
+    """
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        return uploaded_file.temporary_file_path()
+    uploaded_file.seek(0)
+    data = uploaded_file.read()
+    uploaded_file.seek(0)
+    return data
+
+
+def _parse_and_cache(sha256: str, load_source: Callable[[], object]) -> None:
+    try:
+        # DOCX conversion included: a failure leaves the upload stored and unparsed
+        source = load_source()
+        if source is None:
+            return
+        # Identical uploads arriving together are parsed once
+        info = coalesce(flight_key('info', sha256), get_job_pool().run, get_info, source)
+    except Exception:
+        # Parsing is retried (and its error reported) when the document is processed
+        logger.exception("Parsing upload %s failed", sha256)
+        return
+    _remember(sha256, info)
+
+
+def _remember(sha256: str, info) -> None:
+    """Cache a parsed Info and store it in the case tables, so it is not parsed again."""
+    cache.set(info_cache_key(sha256), info, settings.INGEST_INFO_CACHE_TIMEOUT)
+    try:
+        store_case(sha256, info)
+    except Exception:
+        # The cached Info serves this request; the document is stored when it is parsed again
+        logger.exception("Storing case %s failed", sha256)
+
+
+def load_stored_info(sha256: str):
+    """Return the Info of a document from the cache or the case tables, None if it has to be parsed."""
+    info = cache.get(info_cache_key(sha256))
+    if info is None:
+        info = load_info(sha256)
+        if info is not None:
+            cache.set(info_cache_key(sha256), info, settings.INGEST_INFO_CACHE_TIMEOUT)
+    return info
+
+
+def _store(uploaded_file, sha256: str, extension: str) -> Tuple[UploadedFile, bool]:
+    """Persist the upload once under its content hash."""
+    name = default_storage.save(os.path.join(UPLOAD_DIR, f"{sha256}{extension}"), uploaded_file)
+    try:
+        return UploadedFile.objects.create(file=name, sha256=sha256, original_name=uploaded_file.name), True
+    except IntegrityError:
+        # A concurrent request stored the same content first
+        default_storage.delete(name)
+        return UploadedFile.objects.get(sha256=sha256), False
+
+
+def ingest_upload(uploaded_file) -> Tuple[UploadedFile, bool]:
+    """
+    Hash, parse and store an uploaded Klageschrift.
+
+    The PDF is parsed from the upload buffer (or Django's temporary upload
+    file) before it is stored, so it is not read back from disk. The parsed
+    Info is cached by content hash for send_file and stored in the case
+    tables (see case_store.py). Identical uploads are
+    deduplicated: the existing record is returned and nothing is written.
+
+    Args:
+        uploaded_file: The UploadedFile from request.FILES
+
+    Returns:
+        Tuple of (record, created)
+    """
+    sha256 = hash_upload(uploaded_file)
+    existing = UploadedFile.objects.filter(sha256=sha256).first()
+    if existing:
+        if load_stored_info(sha256) is None:
+            _parse_and_cache(sha256, partial(load_document_source, existing))
+        return existing, False
+
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    if extension == '.docx':
+        # unoconv needs a file, so DOCX is stored first and converted from there
+        document, created = _store(uploaded_file, sha256, extension)
+        _parse_and_cache(sha256, partial(load_document_source, document))
+        return document, created
+
+    # Parse before storing: storing moves Django's temporary upload file away
+    _parse_and_cache(sha256, partial(_pdf_source, uploaded_file))
+    document, created = _store(uploaded_file, sha256, extension)
+    link_document(document)
+    return document, created
+
+
+def load_document_source(document: UploadedFile) -> Optional[object]:
+    """Return the stored PDF path, or the converted PDF content for a DOCX upload."""
+    path = document.file.path
+    if document.is_docx:
+        with track_stage('convert_docx_to_pdf'), span('convert_docx_to_pdf'):
+            return convert_docx_to_pdf_bytes(path)
+    return path
+
+
+async def aload_info(document: UploadedFile):
+    """Return the parsed Info of an upload, from the cache, the case tables or by parsing the stored file."""
+    with span('load_info', document=document.sha256) as current:
+        info = await sync_to_async(load_stored_info, thread_sensitive=False)(document.sha256)
+        if current is not None:
+            current.set(stored=info is not None)
+        if info is not None:
+            return info
+        # Shared with the parse of a concurrent upload or send_file of the same document
+        return await acoalesce(flight_key('info', document.sha256), _aparse, document)
+
+
+async def _aparse(document: UploadedFile):
+    source = await sync_to_async(load_document_source, thread_sensitive=False)(document)
+    if source is None:
+        raise ValueError("DOCX conversion failed")
+    info = await run_job(get_info, source)
+    await sync_to_async(_remember, thread_sensitive=False)(document.sha256, info)
+    return info
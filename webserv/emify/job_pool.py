@@ -0,0 +1,226 @@
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple
+
+from django.conf import settings
+
+from .memory import run_measured, watermarks
+from .profiling import current_profile, run_profiled
+from .tracing import SpanContext, current_span, record_spans, run_traced, span
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusy(Exception):
+    """Raised when the job pool queue is full."""
+
+
+class JobTimeout(Exception):
+    """Raised when a job does not finish within its timeout."""
+
+
+class WorkerCrashed(Exception):
+    """Raised when the worker process of a job, or of a job running next to it, died."""
+
+
+class JobPool:
+    """
+    Bounded process pool for CPU-bound parse and render jobs.
+
+    At most ``max_workers + max_queue`` jobs are accepted at once; further
+    submissions wait up to ``queue_timeout`` seconds for a free slot and are
+    then rejected with PoolBusy. Worker processes are replaced after
+    ``max_tasks_per_child`` jobs so that memory growth in PyMuPDF or
+    python-docx cannot accumulate.
+
+    A job that exceeds its timeout raises JobTimeout in the caller. Pending
+    jobs are cancelled; a job that is already running finishes in its worker
+    and keeps its slot until then, so backpressure stays accurate.
+
+    A worker that dies (a segfault in PyMuPDF, an OOM kill) breaks its
+    executor, and every job it held raises WorkerCrashed. They are not
+    retried, since the job that killed the worker cannot be told apart and
+    would take the others down again. The executor is replaced, so later
+    jobs run on new workers.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue: int,
+        job_timeout: Optional[float] = None,
+        queue_timeout: float = 0,
+        max_tasks_per_child: Optional[int] = None,
+        start_method: str = "spawn",
+        initializer: Optional[Callable] = None
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._executor_options = {
+            'max_workers': max_workers,
+            'mp_context': multiprocessing.get_context(start_method),
+            'max_tasks_per_child': max_tasks_per_child,
+            'initializer': initializer,
+        }
+        self._executor_lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(**self._executor_options)
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> None:
+        # Only the first caller that saw this executor break replaces it
+        with self._executor_lock:
+            if self._executor is broken:
+                logger.warning("A job pool worker died, starting new workers")
+                self._executor = ProcessPoolExecutor(**self._executor_options)
+                broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        """
+        Submit a job to the pool.
+
+        Args:
+            fn: A picklable, module-level function
+            *args: Picklable arguments for fn
+
+        Returns:
+            The future of the job
+
+        Raises:
+            PoolBusy: If no slot became free within the queue timeout
+        """
+        return self._submit(fn, *args)[0]
+
+    def _submit(self, fn: Callable, *args: Any) -> Tuple[Future, ProcessPoolExecutor]:
+        # The executor is returned too, so a caller whose job broke it can replace that one
+        if self.queue_timeout:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            raise PoolBusy("Job pool is full, try again later")
+        try:
+            executor = self._executor
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._replace_executor(executor)
+                executor = self._executor
+                future = executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future, executor
+
+    def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run a job and block until its result is available."""
+        with span(f"job {fn.__name__}"):
+            call, call_args, profile, traced = _worker_call(fn, args)
+            future, executor = self._submit(call, *call_args)
+            try:
+                outcome = future.result(timeout=timeout or self.job_timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise JobTimeout(f"{fn.__name__} did not finish in time")
+            except BrokenProcessPool as e:
+                self._replace_executor(executor)
+                raise WorkerCrashed(f"A worker process died while running {fn.__name__}") from e
+            return _unwrap(fn, outcome, profile, traced)
+
+    async def run_async(self, fn: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run a job and await its result without blocking the event loop."""
+        with span(f"job {fn.__name__}"):
+            call, call_args, profile, traced = _worker_call(fn, args)
+            if self.queue_timeout:
+                # Waiting for a slot blocks, so do it off the event loop
+                future, executor = await asyncio.to_thread(self._submit, call, *call_args)
+            else:
+                future, executor = self._submit(call, *call_args)
+            try:
+                outcome = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.job_timeout)
+            except asyncio.TimeoutError:
+                raise JobTimeout(f"{fn.__name__} did not finish in time")
+            except BrokenProcessPool as e:
+                self._replace_executor(executor)
+                raise WorkerCrashed(f"A worker process died while running {fn.__name__}") from e
+            return _unwrap(fn, outcome, profile, traced)
+
+    def start_workers(self) -> None:
+        """Start the worker processes now instead of on the first jobs."""
+        # Idle workers are counted by the executor, so one no-op job per worker starts all of them.
+        # The no-ops take pool slots like any job and count towards max_tasks_per_child.
+        wait_futures([self.submit(_noop) for _ in range(self.max_workers)])
+
+    def shutdown(self, wait: bool = True):
+        with self._executor_lock:
+            executor = self._executor
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _noop() -> None:
+    pass
+
+
+def _worker_call(fn: Callable, args: tuple):
+    """
+    What a worker runs for a job: run_measured, or run_profiled for a
+    profiled request, inside run_traced when the job is part of a trace.
+
+    Returns:
+        Tuple of (function, arguments, request profile, traced)
+    """
+    profile = current_profile()
+    wrapper = run_profiled if profile else run_measured
+    parent = current_span()
+    if parent is None:
+        return wrapper, (fn, *args), profile, False
+    return run_traced, (SpanContext(parent.trace_id, parent.span_id), wrapper, fn, *args), profile, True
+
+
+def _unwrap(fn: Callable, outcome: Any, profile=None, traced: bool = False) -> Any:
+    # Undo the wrappers of _worker_call
+    if traced:
+        outcome, spans = outcome
+        record_spans(spans)
+    if profile is not None:
+        outcome, stats = outcome
+        profile.add_job(fn.__name__, stats)
+    result, sample = outcome
+    watermarks.record(fn.__name__, sample)
+    return result
+
+
+_pool: Optional[JobPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_job_pool() -> JobPool:
+    """Return the job pool shared by all requests of this web worker."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from .warmup import warm_up_job_worker
+
+                _pool = JobPool(
+                    max_workers=settings.JOB_POOL_WORKERS,
+                    max_queue=settings.JOB_POOL_QUEUE_SIZE,
+                    job_timeout=settings.JOB_POOL_JOB_TIMEOUT,
+                    queue_timeout=settings.JOB_POOL_QUEUE_TIMEOUT,
+                    max_tasks_per_child=settings.JOB_POOL_MAX_TASKS_PER_CHILD,
+                    initializer=warm_up_job_worker if settings.WARM_UP else None,
+                )
+                atexit.register(_pool.shutdown, False)
+    return _pool
+
+
+async def run_job(fn: Callable, *args: Any) -> Any:
+    """Run a CPU-bound job in the shared pool from an async view."""
+    return await get_job_pool().run_async(fn, *args)
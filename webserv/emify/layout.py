@@ -0,0 +1,131 @@
+import math
+import re
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Share of the page height at the top and bottom searched for running headers and footers
+MARGIN_BAND = 0.08
+# Furniture has to repeat on at least this share of the pages (and on two pages at least)
+MIN_PAGE_SHARE = 0.5
+# Vertical positions within this distance (pt) count as the same header/footer line
+Y_TOLERANCE = 2.0
+# Left edges closer than this (pt) belong to the same indentation level
+INDENT_TOLERANCE = 4.0
+
+DIGITS = re.compile(r"\d+")
+PAGE_NUMBER = re.compile(r"^\W*(?:(?:seite|page|s\.)\s*)?\d+(?:\s*(?:/|von|of)\s*\d+)?\W*$", re.IGNORECASE)
+LIST_MARKER = re.compile(r"^\s*\d{1,2}[.)](?:\s+|$)")
+
+
+def span_arrays(spans: Sequence[dict]) -> Dict[str, np.ndarray]:
+    """Load page numbers and bounding boxes of all spans into NumPy arrays."""
+    boxes = np.array([span["bbox"] for span in spans], dtype=float).reshape(-1, 4)
+    return {
+        "page": np.fromiter((span["page"] for span in spans), dtype=int, count=len(spans)),
+        "x0": boxes[:, 0],
+        "y0": boxes[:, 1],
+        "x1": boxes[:, 2],
+        "y1": boxes[:, 3],
+    }
+
+
+def _group_ids(*columns: np.ndarray) -> np.ndarray:
+    if not len(columns[0]):
+        return np.zeros(0, dtype=int)
+    _, ids = np.unique(np.stack(columns), axis=1, return_inverse=True)
+    return ids.reshape(-1)
+
+
+def _pages_per_group(group_ids: np.ndarray, page: np.ndarray) -> np.ndarray:
+    """Number of distinct pages each span's group occurs on."""
+    if not len(group_ids):
+        return np.zeros(0, dtype=int)
+    pairs = np.unique(np.stack([group_ids, page]), axis=1)
+    return np.bincount(pairs[0], minlength=group_ids.max() + 1)[group_ids]
+
+
+def find_furniture(spans: Sequence[dict], page_heights: Sequence[float]) -> np.ndarray:
+    """
+    Flag running headers, footers and page numbers.
+
+    A span is furniture if it lies in the top or bottom margin band and the
+    same text (with digits ignored, so "Seite 2 von 6" matches "Seite 3 von
+    6") repeats at the same distance from the page edge on enough pages.
+    Page numbers are also recognised when their position varies.
+
+    Args:
+        spans: Spans with "page", "bbox" and "text"
+        page_heights: Height of every page of the document
+
+    Returns:
+        Boolean array, True for spans that are page furniture
+    """
+    furniture = np.zeros(len(spans), dtype=bool)
+    pages = len(page_heights)
+    if not len(spans) or pages < 2:
+        return furniture
+    min_pages = max(2, math.ceil(pages * MIN_PAGE_SHARE))
+
+    arrays = span_arrays(spans)
+    page, y0, y1 = arrays["page"], arrays["y0"], arrays["y1"]
+    heights = np.asarray(page_heights, dtype=float)[page]
+    top = y1 <= heights * MARGIN_BAND
+    bottom = y0 >= heights * (1 - MARGIN_BAND)
+    band = np.flatnonzero(top | bottom)
+    if not len(band):
+        return furniture
+
+    # Headers are aligned to the top edge, footers to the bottom edge of the page
+    offset = np.where(top[band], y0[band], y1[band] - heights[band])
+    position = np.round(offset / Y_TOLERANCE).astype(int)
+    keys: Dict[str, int] = {}
+    texts = [" ".join(spans[i]["text"].split()) for i in band]
+    key = np.fromiter((keys.setdefault(DIGITS.sub("#", text), len(keys)) for text in texts),
+                      dtype=int, count=len(band))
+    repeated = _pages_per_group(_group_ids(key, position), page[band]) >= min_pages
+
+    numbers = np.fromiter((bool(PAGE_NUMBER.match(text)) for text in texts), dtype=bool, count=len(band))
+    if numbers.any():
+        numbered_pages = np.unique(page[band][numbers])
+        numbers &= len(numbered_pages) >= min_pages
+
+    furniture[band] = repeated | numbers
+    return furniture
+
+
+def indent_levels(spans: Sequence[dict]) -> np.ndarray:
+    """
+    Assign every span an indentation level (0 = left margin of its page).
+
+    Left edges are measured from the leftmost span of each page, so pages
+    with different margins share the same levels; edges closer than
+    INDENT_TOLERANCE are merged into one level.
+    """
+    if not len(spans):
+        return np.zeros(0, dtype=int)
+    arrays = span_arrays(spans)
+    page, x0 = arrays["page"], arrays["x0"]
+    margins = np.full(page.max() + 1, np.inf)
+    np.minimum.at(margins, page, x0)
+    relative = np.round(x0 - margins[page])
+    edges = np.unique(relative)
+    starts = np.concatenate([[True], np.diff(edges) > INDENT_TOLERANCE])
+    return (np.cumsum(starts) - 1)[np.searchsorted(edges, relative)]
+
+
+def analyze_layout(spans: List[dict], page_heights: Sequence[float]) -> List[dict]:
+    """
+    Remove page furniture and store the indentation level under span["indent"].
+
+    Args:
+        spans: Spans of the whole document with "page" set
+        page_heights: Height of every page of the document
+
+    Returns:
+        The spans without running headers, footers and page numbers
+    """
+    body = [span for span, noise in zip(spans, find_furniture(spans, page_heights)) if not noise]
+    for span, level in zip(body, indent_levels(body).tolist()):
+        span["indent"] = level
+    return body
@@ -0,0 +1,285 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, Optional
+
+from django.conf import settings
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+# Dispatch order: every queued interactive job goes before any batch job
+PRIORITIES = (INTERACTIVE, BATCH)
+
+# Rough size of a token in German legal text, used until the provider reports the real usage
+CHARS_PER_TOKEN = 3.5
+EXPECTED_OUTPUT_TOKENS = 2000
+
+
+def estimate_tokens(*texts: str, output_tokens: int = EXPECTED_OUTPUT_TOKENS) -> int:
+    """Estimate the tokens of a request from its prompt texts and the expected answer."""
+    return int(sum(len(text) for text in texts) / CHARS_PER_TOKEN) + output_tokens
+
+
+def token_cost(input_tokens: int, output_tokens: int) -> float:
+    """Cost in USD of a request, from the per-million-token prices in the settings."""
+    return (input_tokens * settings.LLM_INPUT_COST_PER_MTOK + output_tokens * settings.LLM_OUTPUT_COST_PER_MTOK) / 1e6
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at ``per_minute`` tokens per minute, holding at most one minute's worth.
+
+    A rate of 0 or less means no limit. The level may go negative when a
+    request used more tokens than estimated; later requests then wait
+    until the debt is refilled.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self._clock = clock
+        self._updated = clock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self.level
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available (requests larger than the bucket wait for a full one)."""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(missing / self.rate, 0.0)
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self._refill()
+            self.level -= amount
+
+
+class LlmJob:
+    """One scheduled LLM request and its token accounting."""
+
+    def __init__(self, priority: str, user: str, estimated_tokens: int):
+        self.priority = priority
+        self.user = user
+        self.estimated_tokens = estimated_tokens
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.granted: Future = Future()
+
+    def record(self, input_tokens: int, output_tokens: int) -> None:
+        """Record the usage reported by the provider."""
+        self.input_tokens = input_tokens or 0
+        self.output_tokens = output_tokens or 0
+
+    @property
+    def used_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def queued_seconds(self) -> float:
+        return (self.started_at or time.monotonic()) - self.enqueued_at
+
+    def usage(self) -> Dict[str, Any]:
+        end = self.finished_at or time.monotonic()
+        return {
+            'priority': self.priority,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cost': round(token_cost(self.input_tokens, self.output_tokens), 6),
+            'queued_seconds': round(self.queued_seconds, 3),
+            'seconds': round(end - (self.started_at or end), 3),
+        }
+
+
+class _Slot:
+    def __init__(self, scheduler: 'LlmScheduler', job: LlmJob):
+        self.scheduler = scheduler
+        self.job = job
+
+    async def __aenter__(self) -> LlmJob:
+        self.scheduler._enqueue(self.job)
+        try:
+            await asyncio.wrap_future(self.job.granted)
+        except asyncio.CancelledError:
+            if not self.job.granted.cancel():
+                # Granted while the caller was cancelled: hand the slot back once the grant completes
+                self.job.granted.add_done_callback(lambda _: self.scheduler._release(self.job))
+            raise
+        return self.job
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.scheduler._release(self.job)
+
+
+class LlmScheduler:
+    """
+    Admission control for LLM requests of one worker process.
+
+    A request waits for a slot until the request and token buckets allow
+    it, fewer than ``max_concurrency`` requests are running, and no
+    provider rate limit pause is active. Interactive jobs are always
+    dispatched before batch jobs, and batch jobs never hold more than
+    ``batch_max_concurrency`` slots, so a batch run leaves room for
+    interactive users. Within a priority, users take turns (round robin),
+    so one user's hundred documents do not delay another user's one.
+
+    Jobs are granted through concurrent futures and the state is guarded
+    by a lock, so the scheduler works across event loops (ASGI, or async
+    views run by WSGI workers) and threads.
+
+    Usage:
+        async with scheduler.slot(INTERACTIVE, user, estimate_tokens(prompt)) as job:
+            response = await client.responses.parse(...)
+            job.record(response.usage.input_tokens, response.usage.output_tokens)
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_concurrency: int,
+        batch_max_concurrency: Optional[int] = None
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.batch_max_concurrency = min(batch_max_concurrency or max_concurrency, max_concurrency)
+        # Per priority: user -> their waiting jobs; the first user is served next
+        self._queues: Dict[str, 'OrderedDict[str, Deque[LlmJob]]'] = {priority: OrderedDict() for priority in PRIORITIES}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._paused_until = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        self._stats = {priority: {'jobs': 0, 'input_tokens': 0, 'output_tokens': 0, 'queued_seconds': 0.0}
+                       for priority in PRIORITIES}
+
+    def slot(self, priority: str = INTERACTIVE, user: str = '', estimated_tokens: int = EXPECTED_OUTPUT_TOKENS) -> _Slot:
+        """Async context manager that waits for a slot and releases it when the request is done."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}")
+        return _Slot(self, LlmJob(priority, user, estimated_tokens))
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all jobs after the provider answered 429."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._dispatch()
+
+    def _enqueue(self, job: LlmJob) -> None:
+        with self._lock:
+            self._queues[job.priority].setdefault(job.user, deque()).append(job)
+        self._dispatch()
+
+    def _release(self, job: LlmJob) -> None:
+        with self._lock:
+            job.finished_at = time.monotonic()
+            self._running[job.priority] -= 1
+            if job.used_tokens:
+                # Settle the estimate taken at dispatch against the real usage
+                self.tokens.take(job.used_tokens - job.estimated_tokens)
+            stats = self._stats[job.priority]
+            stats['jobs'] += 1
+            stats['input_tokens'] += job.input_tokens
+            stats['output_tokens'] += job.output_tokens
+            stats['queued_seconds'] += job.queued_seconds
+        self._dispatch()
+
+    def _next(self) -> Optional[LlmJob]:
+        """The job to dispatch next, dropping cancelled ones on the way."""
+        for priority in PRIORITIES:
+            if priority == BATCH and self._running[BATCH] >= self.batch_max_concurrency:
+                continue
+            queue = self._queues[priority]
+            while queue:
+                user, jobs = next(iter(queue.items()))
+                while jobs and jobs[0].granted.cancelled():
+                    jobs.popleft()
+                if jobs:
+                    return jobs[0]
+                del queue[user]
+        return None
+
+    def _pop(self, job: LlmJob) -> None:
+        queue = self._queues[job.priority]
+        jobs = queue[job.user]
+        jobs.popleft()
+        if jobs:
+            # The user goes to the back of the line
+            queue.move_to_end(job.user)
+        else:
+            del queue[job.user]
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            while sum(self._running.values()) < self.max_concurrency:
+                job = self._next()
+                if job is None:
+                    return
+                delay = max(
+                    self._paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(job.estimated_tokens),
+                )
+                if delay > 0:
+                    # The head of the line waits for the buckets; nobody behind it overtakes
+                    self._timer = threading.Timer(delay, self._dispatch)
+                    self._timer.daemon = True
+                    self._timer.start()
+                    return
+                self._pop(job)
+                if not job.granted.set_running_or_notify_cancel():
+                    continue
+                self.requests.take(1)
+                self.tokens.take(job.estimated_tokens)
+                self._running[job.priority] += 1
+                job.started_at = time.monotonic()
+                job.granted.set_result(None)
+
+    def state(self) -> Dict[str, Any]:
+        """Queue lengths, running jobs, bucket levels and per-priority totals of this process."""
+        with self._lock:
+            return {
+                'queued': {priority: sum(len(jobs) for jobs in self._queues[priority].values())
+                           for priority in PRIORITIES},
+                'running': dict(self._running),
+                'requests_available': None if self.requests.unlimited else round(self.requests.available, 1),
+                'tokens_available': None if self.tokens.unlimited else round(self.tokens.available),
+                'paused_seconds': round(max(self._paused_until - time.monotonic(), 0.0), 1),
+                'totals': {priority: dict(stats, queued_seconds=round(stats['queued_seconds'], 3),
+                                          cost=round(token_cost(stats['input_tokens'], stats['output_tokens']), 4))
+                           for priority, stats in self._stats.items()},
+            }
+
+
+@lru_cache(maxsize=None)
+def get_scheduler() -> LlmScheduler:
+    """Return the LLM scheduler shared by this process."""
+    return LlmScheduler(
+        requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        batch_max_concurrency=settings.LLM_BATCH_MAX_CONCURRENCY,
+    )
@@ -0,0 +1,68 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from emify.case_store import DEFAULT_BATCH_SIZE, store_cases
+from emify.ingest import load_document_source
+from emify.job_pool import get_job_pool
+from emify.models import Case, UploadedFile
+from emify.parsing import SCHEMA_VERSION, Info, get_info
+
+
+class Command(BaseCommand):
+    help = "Store parsed Klageschriften in the case tables, from parsing/batch.py output or the stored uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help="JSON lines files written by parsing/batch.py")
+        parser.add_argument('--uploads', action='store_true',
+                            help="Parse the stored uploads that are not in the case tables yet")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Cases per transaction")
+
+    def handle(self, *args, **options):
+        if not options['files'] and not options['uploads']:
+            raise CommandError("Give JSON lines files or --uploads")
+        start = time.perf_counter()
+        count = 0
+        for path in options['files']:
+            count += store_cases(self._records(path), options['batch_size'])
+        if options['uploads']:
+            count += store_cases(self._parsed_uploads(), options['batch_size'])
+        seconds = time.perf_counter() - start
+        self.stdout.write(f"Stored {count} cases in {seconds:.1f} s ({count / max(seconds, 1e-9):.0f}/s)")
+
+    def _records(self, path):
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'error' in record:
+                    # Documents batch.py could not parse
+                    continue
+                try:
+                    yield record['sha256'], Info.from_dict(record)
+                except (KeyError, TypeError) as e:
+                    self.stderr.write(f"{path}:{number}: not a parsed document ({e})")
+
+    def _parsed_uploads(self):
+        stored = Case.objects.filter(schema_version=SCHEMA_VERSION).values('document_key')
+        documents = UploadedFile.objects.exclude(sha256=None).exclude(sha256__in=stored)
+        pool = get_job_pool()
+
+        def parse(document):
+            source = load_document_source(document)
+            if source is None:
+                raise ValueError("DOCX conversion failed")
+            return document.sha256, pool.run(get_info, source)
+
+        # One thread per pool worker keeps the pool busy without exceeding its queue
+        with ThreadPoolExecutor(pool.max_workers) as executor:
+            futures = {executor.submit(parse, document): document for document in documents}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    document = futures[future]
+                    self.stderr.write(f"{document.original_name or document.sha256}: {e}")
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from emify.retrieval import get_retrieval_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precedent retrieval index to refresh its IDF weights"
+
+    def handle(self, *args, **options):
+        index = get_retrieval_index()
+        if not len(index):
+            self.stdout.write("The retrieval index is empty")
+            return
+        start = time.perf_counter()
+        count = index.build(list(index.entries()))
+        self.stdout.write(f"Rebuilt {count} entries in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from emify.tracing import critical_path, format_trace, last_trace_id, load_trace
+
+
+class Command(BaseCommand):
+    help = "Show a recorded trace as a tree of spans with its critical path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace_id', nargs='?', help="Trace id (X-Emify-Trace-Id, or 'trace' of a batch document)")
+        parser.add_argument('--last', metavar='NAME', nargs='?', const='',
+                            help="Show the last trace, or the last one whose root span starts with NAME")
+        parser.add_argument('--file', help="Trace file (default EMIFY_TRACE_FILE)")
+        parser.add_argument('--json', action='store_true', help="Print the spans of the critical path as JSON lines")
+
+    def handle(self, *args, **options):
+        trace_id = options['trace_id']
+        if trace_id is None:
+            if options['last'] is None:
+                raise CommandError("Give a trace id or --last")
+            trace_id = last_trace_id(options['file'], options['last'])
+            if trace_id is None:
+                raise CommandError("No matching trace recorded")
+        spans = load_trace(trace_id, options['file'])
+        if not spans:
+            raise CommandError(f"Trace {trace_id} not found")
+
+        if options['json']:
+            for record in critical_path(spans):
+                self.stdout.write(json.dumps(record, ensure_ascii=False))
+            return
+        self.stdout.write(format_trace(spans))
+        path = critical_path(spans)
+        self.stdout.write("\nCritical path: " + " > ".join(
+            f"{record['name']} {(record['end'] - record['start']) * 1000:.1f} ms" for record in path
+        ))
@@ -0,0 +1,176 @@
+import gc
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Processes remembered per stage
+MAX_PROCESSES = 64
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (the peak where /proc is not available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """Highest resident set size this process ever had."""
+    if resource is None:
+        return 0
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def _sample(rss_before: int, traced_before: Optional[int], start: float) -> Dict[str, Any]:
+    sample = {
+        'pid': os.getpid(),
+        'rss_before': rss_before,
+        'rss_after': rss_bytes(),
+        'seconds': time.perf_counter() - start,
+    }
+    if traced_before is not None:
+        # Python allocations of the stage on top of what was allocated before it
+        sample['traced_peak'] = max(tracemalloc.get_traced_memory()[1] - traced_before, 0)
+    return sample
+
+
+def _start_tracing() -> Optional[int]:
+    if not tracemalloc.is_tracing():
+        return None
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def run_measured(fn: Callable, *args: Any) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Run a job function and measure the memory of the process running it.
+
+    Used by the job pool inside its worker processes, which run one job at
+    a time, so RSS and tracemalloc figures belong to this job alone.
+    Objects the job left in reference cycles (python-docx packages, see
+    parsing.open_docx) are collected before the next job starts; the young
+    generations are enough and take well under a millisecond.
+
+    Returns:
+        Tuple of (result, memory sample)
+    """
+    rss_before = rss_bytes()
+    traced_before = _start_tracing()
+    start = time.perf_counter()
+    try:
+        result = fn(*args)
+    finally:
+        gc.collect(1)
+    return result, _sample(rss_before, traced_before, start)
+
+
+class Watermarks:
+    """Memory high watermarks per processing stage and process, shared by the threads of a web worker."""
+
+    def __init__(self):
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, sample: Dict[str, Any]) -> None:
+        growth = sample['rss_after'] - sample['rss_before']
+        with self._lock:
+            stats = self._stages.setdefault(stage, {
+                'count': 0, 'seconds': 0.0, 'rss_max': 0, 'rss_growth_max': 0, 'rss_growth_total': 0,
+                'traced_peak_max': None, 'processes': {},
+            })
+            stats['count'] += 1
+            stats['seconds'] += sample['seconds']
+            stats['rss_max'] = max(stats['rss_max'], sample['rss_after'])
+            stats['rss_growth_max'] = max(stats['rss_growth_max'], growth)
+            stats['rss_growth_total'] += growth
+            if 'traced_peak' in sample:
+                stats['traced_peak_max'] = max(stats['traced_peak_max'] or 0, sample['traced_peak'])
+            # Last RSS of every process that ran the stage: a worker growing over time shows up here
+            processes = stats['processes']
+            processes.pop(sample['pid'], None)
+            processes[sample['pid']] = sample['rss_after']
+            while len(processes) > MAX_PROCESSES:
+                # Recycled job pool workers are forgotten, oldest first
+                del processes[next(iter(processes))]
+
+        logger.debug("%s in %d: RSS %.1f MB (%+.1f MB) in %.3f s", stage, sample['pid'],
+                     sample['rss_after'] / 1e6, growth / 1e6, sample['seconds'])
+        if settings.MEMORY_RSS_WARNING and sample['rss_after'] > settings.MEMORY_RSS_WARNING:
+            logger.warning("%s in %d: RSS %.1f MB is above EMIFY_MEMORY_RSS_WARNING", stage, sample['pid'],
+                           sample['rss_after'] / 1e6)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {stage: dict(stats, processes=dict(stats['processes'])) for stage, stats in self._stages.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+
+watermarks = Watermarks()
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """
+    Record the RSS of this process before and after a stage run in the web worker.
+
+    Other requests run in the same process at the same time, so the figures
+    are the process's watermarks while the stage ran, not the stage's own
+    allocations; job pool stages are measured in their workers instead.
+    """
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        watermarks.record(stage, _sample(rss_before, None, start))
+
+
+def top_allocations(limit: int = 20) -> List[Dict[str, Any]]:
+    """Source lines holding the most traced memory; empty unless tracemalloc runs (PYTHONTRACEMALLOC)."""
+    if not tracemalloc.is_tracing():
+        return []
+    statistics = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    )).statistics('lineno')
+    return [{'location': str(stat.traceback), 'bytes': stat.size, 'blocks': stat.count}
+            for stat in statistics[:limit]]
+
+
+def memory_report(allocations: int = 0) -> Dict[str, Any]:
+    """Memory state of this web worker and the stage watermarks of it and its job pool processes."""
+    report = {
+        'pid': os.getpid(),
+        'rss': rss_bytes(),
+        'peak_rss': peak_rss_bytes(),
+        'gc_counts': gc.get_count(),
+        'tracemalloc': tracemalloc.is_tracing(),
+        'stages': watermarks.snapshot(),
+    }
+    if tracemalloc.is_tracing():
+        report['traced_current'], report['traced_peak'] = tracemalloc.get_traced_memory()
+        if allocations:
+            report['top_allocations'] = top_allocations(allocations)
+    return report
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emify', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
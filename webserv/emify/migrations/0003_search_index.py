@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emify', '0002_uploadedfile_sha256'),
+    ]
+
+    operations = [
+        # Full-text index of processed documents, see emify/search.py
+        migrations.RunSQL(
+            sql="""
+                CREATE VIRTUAL TABLE emify_search USING fts5(
+                    document UNINDEXED,
+                    name UNINDEXED,
+                    court,
+                    plaintiff,
+                    defendant,
+                    representatives,
+                    claims,
+                    statements,
+                    evidence,
+                    answers,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS emify_search;",
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emify', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnsweredDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_key', models.CharField(max_length=64, unique=True)),
+                ('template_key', models.CharField(db_index=True, max_length=64)),
+                ('values', models.JSONField()),
+                ('header', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReuseCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ClaimSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('claim', 'Claim'), ('statement', 'Statement')], max_length=16)),
+                ('text', models.TextField()),
+                ('minhash', models.BinaryField()),
+                ('answer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signatures', to='emify.answereddocument')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LshBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=24)),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='emify.claimsignature')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emify', '0004_answer_reuse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Template',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('file', models.FileField(blank=True, upload_to='templates/')),
+                ('text', models.TextField()),
+                ('placeholder_regex', models.CharField(max_length=255)),
+                ('placeholders', models.JSONField(default=list)),
+                ('placeholder_count', models.PositiveIntegerField(default=0)),
+                ('locations', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
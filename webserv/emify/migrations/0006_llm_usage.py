@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emify', '0005_template_registry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LlmUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.CharField(blank=True, db_index=True, max_length=150)),
+                ('priority', models.CharField(max_length=16)),
+                ('document_key', models.CharField(blank=True, max_length=64)),
+                ('model', models.CharField(max_length=64)),
+                ('input_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('cost', models.FloatField(default=0)),
+                ('queued_seconds', models.FloatField(default=0)),
+                ('seconds', models.FloatField(default=0)),
+                ('error', models.TextField(blank=True)),
+            ],
+        ),
+    ]
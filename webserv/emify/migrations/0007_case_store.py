@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emify', '0006_llm_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Case',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_key', models.CharField(max_length=64, unique=True)),
+                ('case_number', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('schema_version', models.PositiveSmallIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cases', to='emify.uploadedfile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Argument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('formalities', 'Formelles'), ('jurisdiction', 'Zuständigkeit'), ('facts', 'Materielles')], max_length=16)),
+                ('position', models.PositiveIntegerField()),
+                ('statement', models.TextField()),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arguments', to='emify.case')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Claim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claims', to='emify.case')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Court',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('additional', models.CharField(blank=True, max_length=255)),
+                ('street', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=255)),
+                ('po_box', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'additional', 'street', 'city', 'po_box'), name='unique_court')],
+            },
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='court',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='cases', to='emify.court'),
+        ),
+        migrations.CreateModel(
+            name='Evidence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('argument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evidence', to='emify.argument')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Party',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('plaintiff', 'Plaintiff'), ('defendant', 'Defendant')], max_length=16)),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('additional', models.CharField(blank=True, max_length=255)),
+                ('street', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=255)),
+                ('po_box', models.CharField(blank=True, max_length=255)),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parties', to='emify.case')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Representative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('additional', models.CharField(blank=True, max_length=255)),
+                ('street', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=255)),
+                ('po_box', models.CharField(blank=True, max_length=255)),
+                ('party', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='representative', to='emify.party')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='argument',
+            constraint=models.UniqueConstraint(fields=('case', 'section', 'position'), name='unique_argument_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='claim',
+            constraint=models.UniqueConstraint(fields=('case', 'position'), name='unique_claim_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='party',
+            constraint=models.UniqueConstraint(fields=('case', 'role'), name='unique_party_role'),
+        ),
+    ]
@@ -2,4 +2,174 @@ from django.db import models
 
 class UploadedFile(models.Model):
     file = models.FileField(upload_to='uploads/')
-    uploaded_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Content hash; identical uploads share one record and one stored file
+    sha256 = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    original_name = models.CharField(max_length=255, blank=True)
+
+    @property
+    def is_docx(self):
+        return self.file.name.endswith('.docx')
+
+
+class AnsweredDocument(models.Model):
+    """Generated placeholder values of a document, kept for reuse on near-duplicates (see reuse.py)."""
+    document_key = models.CharField(max_length=64, unique=True)
+    # Hash of the template text: values only fit the template they were generated for
+    template_key = models.CharField(max_length=64, db_index=True)
+    values = models.JSONField()
+    # Party and court names and claim numbers used to adapt the values to a new document
+    header = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class ClaimSignature(models.Model):
+    """MinHash signature of one claim or argument statement of an answered document."""
+    CLAIM = 'claim'
+    STATEMENT = 'statement'
+    KIND_CHOICES = [(CLAIM, 'Claim'), (STATEMENT, 'Statement')]
+
+    answer = models.ForeignKey(AnsweredDocument, on_delete=models.CASCADE, related_name='signatures')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    text = models.TextField()
+    minhash = models.BinaryField()
+
+
+class LshBucket(models.Model):
+    """One LSH band of a signature; signatures sharing a bucket are candidate near-duplicates."""
+    signature = models.ForeignKey(ClaimSignature, on_delete=models.CASCADE, related_name='buckets')
+    key = models.CharField(max_length=24, db_index=True)
+
+
+class ReuseCounter(models.Model):
+    """Hit-rate counters of answer reuse, shared by all worker processes."""
+    name = models.CharField(max_length=32, unique=True)
+    value = models.BigIntegerField(default=0)
+
+
+class Template(models.Model):
+    """A registered answer template with its placeholder inventory (see template_registry.py)."""
+    # Hash of the DOCX file, or of the template text and placeholder regex
+    key = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, blank=True)
+    # DOCX templates are kept in the file store; text templates only have text
+    file = models.FileField(upload_to='templates/', blank=True)
+    text = models.TextField()
+    placeholder_regex = models.CharField(max_length=255)
+    placeholders = models.JSONField(default=list)
+    placeholder_count = models.PositiveIntegerField(default=0)
+    # (paragraph index, names) of the DOCX paragraphs holding placeholders
+    locations = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def is_docx(self):
+        return bool(self.file)
+
+
+class LlmUsage(models.Model):
+    """Tokens, cost and queueing time of one LLM request (see llm_scheduler.py)."""
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Username, or client address of anonymous requests
+    user = models.CharField(max_length=150, blank=True, db_index=True)
+    priority = models.CharField(max_length=16)
+    document_key = models.CharField(max_length=64, blank=True)
+    model = models.CharField(max_length=64)
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    cost = models.FloatField(default=0)
+    queued_seconds = models.FloatField(default=0)
+    seconds = models.FloatField(default=0)
+    # The LLM error, if the mock values were returned instead
+    error = models.TextField(blank=True)
+
+
+class Court(models.Model):
+    """A court addressed by Klageschriften, shared by all of its cases."""
+    name = models.CharField(max_length=255, db_index=True)
+    additional = models.CharField(max_length=255, blank=True)
+    street = models.CharField(max_length=255, blank=True)
+    city = models.CharField(max_length=255, blank=True)
+    po_box = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'additional', 'street', 'city', 'po_box'], name='unique_court'),
+        ]
+
+
+class Case(models.Model):
+    """The extracted data of one Klageschrift, stored by case_store.py instead of parsing it again."""
+    # Content hash of the document, as UploadedFile.sha256
+    document_key = models.CharField(max_length=64, unique=True)
+    document = models.ForeignKey(UploadedFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='cases')
+    court = models.ForeignKey(Court, on_delete=models.PROTECT, related_name='cases')
+    # Assigned by the court after filing, so a Klageschrift has none; kept when the case is stored again
+    case_number = models.CharField(max_length=64, blank=True, db_index=True)
+    # parsing.SCHEMA_VERSION of the stored data
+    schema_version = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Party(models.Model):
+    PLAINTIFF = 'plaintiff'
+    DEFENDANT = 'defendant'
+    ROLE_CHOICES = [(PLAINTIFF, 'Plaintiff'), (DEFENDANT, 'Defendant')]
+
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='parties')
+    role = models.CharField(max_length=16, choices=ROLE_CHOICES)
+    name = models.CharField(max_length=255, db_index=True)
+    # Firm or profession
+    additional = models.CharField(max_length=255, blank=True)
+    street = models.CharField(max_length=255, blank=True)
+    city = models.CharField(max_length=255, blank=True)
+    po_box = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['case', 'role'], name='unique_party_role')]
+
+
+class Representative(models.Model):
+    party = models.OneToOneField(Party, on_delete=models.CASCADE, related_name='representative')
+    name = models.CharField(max_length=255, db_index=True)
+    additional = models.CharField(max_length=255, blank=True)
+    street = models.CharField(max_length=255, blank=True)
+    city = models.CharField(max_length=255, blank=True)
+    po_box = models.CharField(max_length=255, blank=True)
+
+
+class Claim(models.Model):
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='claims')
+    position = models.PositiveIntegerField()
+    text = models.TextField()
+
+    class Meta:
+        ordering = ['position']
+        constraints = [models.UniqueConstraint(fields=['case', 'position'], name='unique_claim_position')]
+
+
+class Argument(models.Model):
+    FORMALITIES = 'formalities'
+    JURISDICTION = 'jurisdiction'
+    FACTS = 'facts'
+    SECTION_CHOICES = [(FORMALITIES, 'Formelles'), (JURISDICTION, 'Zuständigkeit'), (FACTS, 'Materielles')]
+
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='arguments')
+    section = models.CharField(max_length=16, choices=SECTION_CHOICES)
+    position = models.PositiveIntegerField()
+    statement = models.TextField()
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['case', 'section', 'position'], name='unique_argument_position'),
+        ]
+
+
+class Evidence(models.Model):
+    argument = models.ForeignKey(Argument, on_delete=models.CASCADE, related_name='evidence')
+    position = models.PositiveIntegerField()
+    text = models.TextField()
+
+    class Meta:
+        ordering = ['position']
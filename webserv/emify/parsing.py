@@ -1,16 +1,26 @@
-import fitz # type: ignore
-from docx import Document # type: ignore
-from python_docx_replace import docx_replace # type: ignore
+import io
+import json
+import os
 import re
+from dataclasses import dataclass
+from typing import List, Optional
+from .anchors import classify_spans, get_ruleset
+from .layout import LIST_MARKER, analyze_layout
 
 filename = "../Klageschrift.pdf"
 
-class Address:
-	def __init__(self, street, city, po_box = None):
-		self.street = street
-		self.city = city
-		self.po_box = po_box
+# Version of the to_json / to_msgpack format, increase it when a field is added, removed or changes meaning
+SCHEMA_VERSION = 1
+
+def check_version(version):
+	if version != SCHEMA_VERSION:
+		raise ValueError(f"Unsupported Info schema version {version!r}, expected {SCHEMA_VERSION}")
 
+@dataclass(slots = True)
+class Address:
+	street: str
+	city: str
+	po_box: Optional[str] = None
 
 	def print(self):
 		if self.po_box:
@@ -29,15 +39,29 @@ class Address:
 			space = " "
 		return ("," + space).join(parts)
 
+	def to_dict(self):
+		return {"street": self.street, "city": self.city, "po_box": self.po_box}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(data["street"], data["city"], data.get("po_box"))
+
+	def to_tuple(self):
+		return (self.street, self.city, self.po_box)
+
+	@classmethod
+	def from_tuple(cls, values):
+		return cls(*values)
+
 
+@dataclass(slots = True)
 class Entity:
-	def __init__(self, name, address, role = None, additional = None, representative = None):
-		self.name = name
-		self.address = address
-		self.role = role
-		self.additional = additional
-		#additional is either firm or profession
-		self.representative = representative
+	name: str
+	address: Address
+	role: Optional[str] = None
+	#additional is either firm or profession
+	additional: Optional[str] = None
+	representative: Optional["Entity"] = None
 
 	def print(self):
 		if self.role:
@@ -59,14 +83,46 @@ class Entity:
 	def to_str(self):
 		return ", ".join([self.name, self.get_info()])
 
+	def to_dict(self):
+		return {
+			"name": self.name,
+			"address": self.address.to_dict(),
+			"role": self.role,
+			"additional": self.additional,
+			"representative": self.representative.to_dict() if self.representative else None
+		}
+
+	@classmethod
+	def from_dict(cls, data):
+		representative = data.get("representative")
+		return cls(
+			data["name"],
+			Address.from_dict(data["address"]),
+			data.get("role"),
+			data.get("additional"),
+			cls.from_dict(representative) if representative else None
+		)
+
+	def to_tuple(self):
+		representative = self.representative.to_tuple() if self.representative else None
+		return (self.name, self.address.to_tuple(), self.role, self.additional, representative)
+
+	@classmethod
+	def from_tuple(cls, values):
+		name, address, role, additional, representative = values
+		representative = cls.from_tuple(representative) if representative else None
+		return cls(name, Address.from_tuple(address), role, additional, representative)
+
+@dataclass(slots = True)
 class Header:
-	def __init__(self, court, plaintiff, defendant):
-		court.role = "Court"
-		plaintiff.role = "Plaintiff"
-		defendant.role = "Defendant"
-		self.court = court
-		self.plaintiff = plaintiff
-		self.defendant = defendant
+	court: Entity
+	plaintiff: Entity
+	defendant: Entity
+
+	def __post_init__(self):
+		self.court.role = "Court"
+		self.plaintiff.role = "Plaintiff"
+		self.defendant.role = "Defendant"
 
 	def print(self):
 		self.court.print()
@@ -75,10 +131,28 @@ class Header:
 		print("------------")
 		self.defendant.print()
 
+	def to_dict(self):
+		return {
+			"court": self.court.to_dict(),
+			"plaintiff": self.plaintiff.to_dict(),
+			"defendant": self.defendant.to_dict()
+		}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(Entity.from_dict(data["court"]), Entity.from_dict(data["plaintiff"]), Entity.from_dict(data["defendant"]))
+
+	def to_tuple(self):
+		return (self.court.to_tuple(), self.plaintiff.to_tuple(), self.defendant.to_tuple())
+
+	@classmethod
+	def from_tuple(cls, values):
+		return cls(*(Entity.from_tuple(entity) for entity in values))
+
+@dataclass(slots = True)
 class Argument:
-	def __init__(self, statement, evidence = None):
-		self.statement = statement
-		self.evidence = evidence
+	statement: str
+	evidence: Optional[List[str]] = None
 
 	def print(self):
 		print("Statement:")
@@ -94,11 +168,26 @@ class Argument:
 			result += f" - {evidence}\n"
 		return result.strip()
 
+	def to_dict(self):
+		return {"statement": self.statement, "evidence": self.evidence}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(data["statement"], data.get("evidence"))
+
+	def to_tuple(self):
+		return (self.statement, self.evidence)
+
+	@classmethod
+	def from_tuple(cls, values):
+		statement, evidence = values
+		return cls(statement, list(evidence) if evidence is not None else None)
+
+@dataclass(slots = True)
 class Justification:
-	def __init__(self, formalities, jurisdiction, facts):
-		self.formalities = formalities
-		self.jurisdiction = jurisdiction
-		self.facts = facts
+	formalities: List[Argument]
+	jurisdiction: List[Argument]
+	facts: List[Argument]
 	
 	def print(self):
 		print("I. Formelles")
@@ -123,11 +212,29 @@ class Justification:
 			result += arg.to_string() + "\n"
 		return result.strip()
 
+	def to_dict(self):
+		return {
+			"formalities": [arg.to_dict() for arg in self.formalities],
+			"jurisdiction": [arg.to_dict() for arg in self.jurisdiction],
+			"facts": [arg.to_dict() for arg in self.facts]
+		}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(*([Argument.from_dict(arg) for arg in data[section]] for section in ("formalities", "jurisdiction", "facts")))
+
+	def to_tuple(self):
+		return tuple([arg.to_tuple() for arg in section] for section in (self.formalities, self.jurisdiction, self.facts))
+
+	@classmethod
+	def from_tuple(cls, values):
+		return cls(*([Argument.from_tuple(arg) for arg in section] for section in values))
+
+@dataclass(slots = True)
 class Info:
-	def __init__(self, header, claims, justification):
-		self.header = header
-		self.claims = claims
-		self.justification = justification
+	header: Header
+	claims: List[str]
+	justification: Justification
 
 	def print(self, print_header = False):
 		if print_header:
@@ -155,26 +262,108 @@ class Info:
 		with open(filepath, "w", encoding = "utf-8") as f:
 			f.write(self.to_string(print_header))
 
+	def to_dict(self):
+		return {
+			"header": self.header.to_dict(),
+			"claims": self.claims,
+			"justification": self.justification.to_dict()
+		}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(Header.from_dict(data["header"]), list(data["claims"]), Justification.from_dict(data["justification"]))
+
+	def to_tuple(self):
+		return (self.header.to_tuple(), self.claims, self.justification.to_tuple())
+
+	@classmethod
+	def from_tuple(cls, values):
+		header, claims, justification = values
+		return cls(Header.from_tuple(header), list(claims), Justification.from_tuple(justification))
+
+	def to_json(self):
+		return json.dumps({"version": SCHEMA_VERSION, **self.to_dict()}, ensure_ascii = False)
+
+	@classmethod
+	def from_json(cls, data):
+		data = json.loads(data)
+		check_version(data.get("version"))
+		return cls.from_dict(data)
+
+	def to_msgpack(self):
+		# Positional arrays instead of maps: no field names in every document
+		import msgpack # type: ignore
+		return msgpack.packb((SCHEMA_VERSION, self.to_tuple()))
+
+	@classmethod
+	def from_msgpack(cls, data):
+		import msgpack # type: ignore
+		version, values = msgpack.unpackb(data)
+		check_version(version)
+		return cls.from_tuple(values)
+
 def is_bold(span):
 	return "Bold" in span["font"]
 
-def get_spans(filename):
-	doc = fitz.open(filename)
+def has_anchor(span, name):
+	# Anchor labels are set once per span by get_spans (see anchors.py)
+	return name in span["anchors"]
+
+# PyMuPDF and python-docx are imported on first use, so importing the data model stays cheap
+# (see warmup.py for preloading them in web and job pool workers)
+HEAVY_MODULES = ("fitz", "docx", "python_docx_replace")
+
+def open_document(source):
+	"""Open a PDF with PyMuPDF; use it as a context manager so the document is closed deterministically."""
+	import fitz # type: ignore
+	# source is a file path or the PDF content (e.g. an upload buffer)
+	if isinstance(source, (bytes, bytearray, memoryview)):
+		return fitz.open(stream=source, filetype="pdf")
+	return fitz.open(source)
+
+def open_docx(source):
+	"""
+	Open a DOCX with python-docx from a path, the file content or a file object.
+
+	A path is read through a handle closed as soon as the package is loaded,
+	so there is nothing to close afterwards and this is a plain function.
+	python-docx keeps the package, its parts and their XML trees in reference
+	cycles, which refcounting never frees: code running many documents in
+	one process should let the job pool collect them after every job (see
+	memory.run_measured) instead of waiting for a full garbage collection.
+	"""
+	from docx import Document # type: ignore
+	if isinstance(source, (bytes, bytearray)):
+		source = io.BytesIO(source)
+	if isinstance(source, (str, os.PathLike)):
+		with open(source, "rb") as f:
+			doc = Document(f)
+	else:
+		doc = Document(source)
+	return doc
+
+def get_spans(filename, ruleset = None):
 	spans = []
-	for page in doc:
-		for block in page.get_text("dict")["blocks"]:
-			for line in block.get("lines", []):
-				for span in line.get("spans", []):
-					if span["text"].strip():
-						spans.append(span)
-	return (spans)
+	page_heights = []
+	with open_document(filename) as doc:
+		for page in doc:
+			page_heights.append(page.rect.height)
+			for block in page.get_text("dict")["blocks"]:
+				for line in block.get("lines", []):
+					for span in line.get("spans", []):
+						if span["text"].strip():
+							span["page"] = page.number
+							spans.append(span)
+	# Drop running headers, footers and page numbers before any extractor sees them
+	spans = analyze_layout(spans, page_heights)
+	return classify_spans(spans, get_ruleset(ruleset))
 
 def get_court(spans):
 	lines = []
 	collecting = False
 	for span in spans:
 		text = span["text"].strip()
-		if "An das" in text:
+		if has_anchor(span, "court_intro"):
 			collecting = True
 			continue
 		if collecting:
@@ -184,15 +373,15 @@ def get_court(spans):
 			break
 	return (Entity(lines[0], Address(lines[1], lines[3], po_box = lines[2])))
 
-def get_po_box(lines):
+def get_po_box(lines, matcher):
 	for line in lines:
-		if "Postfach" in line:
+		if "po_box" in matcher.labels(line):
 			return (line)
 
-def build_person(line, role, representative = None):
+def build_person(line, role, representative = None, ruleset = None):
 	lines = line.split(", ")
 	name = lines[0]
-	po_box = get_po_box(lines)
+	po_box = get_po_box(lines, get_ruleset(ruleset).matcher)
 	if len(lines) == 3:
 		additional = None
 		address = Address(lines[1], lines[2])
@@ -207,34 +396,36 @@ def build_person(line, role, representative = None):
 		address = Address(lines[2], lines[4], po_box = po_box)
 	return Entity(name, address, role, additional, representative)
 
-def get_plaintiff(spans):
+def get_plaintiff(spans, ruleset = None):
+	ruleset = get_ruleset(ruleset)
 	first_line = ""
 	second_line = ""
 	collecting_first = False
 	collecting_second = False
 	for span in spans:
 		text = span["text"]
-		if "in Sachen" in text:
+		if has_anchor(span, "plaintiff_intro"):
 			collecting_first = True
 			continue
-		if "Klägerin" in text:
+		if has_anchor(span, "plaintiff_label"):
 			collecting_first = False
 			collecting_second = True
 			continue
 		if collecting_first:
 			first_line += text
-		if collecting_second and "gegen" in text:
+		if collecting_second and has_anchor(span, "opposing_party"):
 			break
 		if collecting_second:
 			second_line += text
 	if second_line:
-		lawyer = build_person(second_line[len("vertreten durch RA "):], "Representative")
+		lawyer = build_person(second_line[len(ruleset.representative_prefix):], "Representative", ruleset = ruleset.name)
 	else:
 		lawyer = None
-	plaintiff = build_person(first_line, "Plaintiff", lawyer)
+	plaintiff = build_person(first_line, "Plaintiff", lawyer, ruleset = ruleset.name)
 	return (plaintiff)
 
-def get_defendant(spans):
+def get_defendant(spans, ruleset = None):
+	ruleset = get_ruleset(ruleset)
 	first_line = ""
 	second_line = ""
 	collecting_first = False
@@ -242,7 +433,7 @@ def get_defendant(spans):
 	found_klagerin = False
 	for span in spans:
 		text = span["text"]
-		if "Klägerin" in text:
+		if has_anchor(span, "plaintiff_label"):
 			found_klagerin = True
 			continue
 		if found_klagerin and is_bold(span):
@@ -250,7 +441,7 @@ def get_defendant(spans):
 			found_klagerin = False
 			first_line += text
 			continue
-		if "Beklagter" in text:
+		if has_anchor(span, "defendant_label"):
 			collecting_first = False
 			collecting_second = True
 			continue
@@ -261,30 +452,34 @@ def get_defendant(spans):
 		elif collecting_second:
 			second_line += text
 	if second_line:
-		lawyer = build_person(second_line[len("vertreten durch RA "):], "Representative")
+		lawyer = build_person(second_line[len(ruleset.representative_prefix):], "Representative", ruleset = ruleset.name)
 	else:
 		lawyer = None
-	defendant = build_person(first_line, "Defendant", lawyer)
+	defendant = build_person(first_line, "Defendant", lawyer, ruleset = ruleset.name)
 	return (defendant)
 
-def get_header(spans):
-	return Header(get_court(spans), get_plaintiff(spans), get_defendant(spans))
+def get_header(spans, ruleset = None):
+	return Header(get_court(spans), get_plaintiff(spans, ruleset), get_defendant(spans, ruleset))
 
 def get_claims(spans):
 	claims = []
 	line = ""
 	collecting = False
+	marker_indent = None
 	for span in spans:
 		text = span["text"]
-		if "Rechtsbegehren" in text:
+		if has_anchor(span, "claims_start"):
 			collecting = True
 			continue
-		if collecting and text.strip()[0].isdigit():
+		marker = LIST_MARKER.match(text) if collecting else None
+		# Numbers of nested lists are indented further than the claim numbers
+		if marker and (marker_indent is None or span["indent"] <= marker_indent):
+			marker_indent = span["indent"]
 			if line != "":
 				claims.append(line)
-			line = ""
+			line = text[marker.end():]
 			continue
-		if collecting and "Begründung" in text:
+		if collecting and has_anchor(span, "justification_start"):
 			claims.append(line)
 			break
 		if collecting:
@@ -292,6 +487,7 @@ def get_claims(spans):
 	return claims
 
 def get_arguments(spans, upper_bound, lower_bound):
+	# upper_bound and lower_bound are anchor names, e.g. "formalities_start"
 	formalities = []
 	statement = ""
 	evidence = ""
@@ -303,14 +499,14 @@ def get_arguments(spans, upper_bound, lower_bound):
 	for span in spans:
 		text = span["text"].strip()
 
-		if collecting and (lower_bound in text):
+		if collecting and has_anchor(span, lower_bound):
 			break
-		if upper_bound in text:
+		if has_anchor(span, upper_bound):
 			collecting = True
 			in_statement = True
 			continue
 		if in_statement:
-			if "BO:" in text:
+			if has_anchor(span, "evidence"):
 				in_statement = False
 				in_evidence = 2
 				continue
@@ -336,32 +532,42 @@ def get_arguments(spans, upper_bound, lower_bound):
 	return (formalities)
 	
 def get_justification(spans):
-	formalities = get_arguments(spans, "Formelles", "II")
-	jurisdiction = get_arguments(spans, "Zuständigkeit", "III")
-	facts = get_arguments(spans, "Materielles", "Zinsanspruch")
+	formalities = get_arguments(spans, "formalities_start", "formalities_end")
+	jurisdiction = get_arguments(spans, "jurisdiction_start", "jurisdiction_end")
+	facts = get_arguments(spans, "facts_start", "facts_end")
 	return Justification(formalities, jurisdiction, facts)
 
-def get_info(filename):
-	spans = get_spans(filename)
-	return Info(get_header(spans), get_claims(spans), get_justification(spans))
+def get_info(filename, ruleset = None):
+	spans = get_spans(filename, ruleset)
+	return Info(get_header(spans, ruleset), get_claims(spans), get_justification(spans))
 
-def replace_placeholders_in_docx(template_path, output_path, replacements):
-	doc = Document(template_path)
-	docx_replace(doc, **replacements)
+def replace_placeholders_in_docx(template_path, output_path, replacements, locations = None):
+	from python_docx_replace import docx_replace # type: ignore
+	from python_docx_replace.paragraph import Paragraph # type: ignore
+	doc = open_docx(template_path)
+	if locations is None:
+		docx_replace(doc, **replacements)
+	else:
+		# Paragraphs holding placeholders are known from the template inventory (see placeholders.py),
+		# so only those are searched instead of every paragraph once per key
+		paragraphs = Paragraph.get_all(doc)
+		for index, names in locations:
+			paragraph = Paragraph(paragraphs[index])
+			for name in names:
+				if name in replacements:
+					paragraph.replace_key(f"${{{name}}}", str(replacements[name]))
 	doc.save(output_path)
 
 
 
-def get_replacements(info, json_data):
+def get_replacements(info, json_data, value_names = ("counter", "formelles", "materielles")):
     header = info.header
     
     # Extract the list from the JSON data
     placeholder_values = json_data.get("placeholder_values", [])
     
-    # Safely get the first 3 values or empty strings if not enough lines
-    counter = placeholder_values[0] if len(placeholder_values) > 0 else ""
-    formelles = placeholder_values[1] if len(placeholder_values) > 1 else ""
-    materielles = placeholder_values[2] if len(placeholder_values) > 2 else ""
+    # The values answer the placeholders of the prompt template in order; missing values stay empty
+    values = {name: placeholder_values[i] if len(placeholder_values) > i else "" for i, name in enumerate(value_names)}
 
     replacements = {
         "court-name": header.court.name,
@@ -373,11 +579,8 @@ def get_replacements(info, json_data):
         "defendant-info": header.defendant.get_info(),
         "defendant-representative": "vertreten durch RA " + header.defendant.representative.to_str(),
         "representative-name": header.defendant.representative.name,
-
-        "counter": counter,
-        "formelles": formelles,
-        "materielles": materielles,
 	}
+    replacements.update(values)
     return replacements
 
 # Define the input docx file and the output file
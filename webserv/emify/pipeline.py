@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .ai_lawyer_service import OPENAI_MODEL, aget_placeholder_values, get_placeholder_mock_values
+from .job_pool import run_job
+from .llm_scheduler import INTERACTIVE
+from .memory import track_stage
+from .models import LlmUsage
+from .parsing import Info, get_replacements
+from .placeholders import get_inventory
+from .profiling import sync_to_async
+from .retrieval import add_precedent, find_precedents
+from .reuse import find_reusable_answer, remember_answer
+from .search import index_document
+from .singleflight import acoalesce, flight_key
+from .styles import render_docx
+from .template_registry import template_inventory
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE_TEXT = "ein und stelle folgendes\n\nRechtbegehren:\n \n${counter}\n\nBegründung:\n\nI.\tFormelles\n\n\n${formelles}\n\n \nII.\tMaterielles\n\n\n${materielles}\n\n\n\n\n\n\nFreundliche Grüsse\n"
+
+
+async def generate_placeholder_values(
+    file_text: str,
+    template_text: Optional[str] = DEFAULT_TEMPLATE_TEXT,
+    placeholder_regex: Optional[str] = None,
+    use_mock: bool = False,
+    document_key: Optional[str] = None,
+    info: Optional[Info] = None,
+    priority: str = INTERACTIVE,
+    user: str = ''
+) -> Tuple[List[Optional[str]], Optional[Dict[str, Any]]]:
+    """
+    Get the placeholder values for a Klageschrift from the configured LLM backend.
+
+    If the parsed document is given and its claims and statements nearly
+    equal those of a document answered before, the stored values are
+    adapted and returned without calling the LLM. Otherwise the prompt is
+    grounded with the most similar past cases from the retrieval index, and
+    the new answer is stored for both.
+
+    Args:
+        file_text: The Klageschrift text
+        template_text: The template text with placeholders
+        placeholder_regex: Optional regex pattern for the placeholders
+        use_mock: Return the mock values instead of calling the LLM
+        document_key: Content hash of the document, excluded from its own precedents
+        info: The parsed document, needed for answer reuse and to store the answer
+        priority: Scheduling class of the LLM request, INTERACTIVE or BATCH
+        user: Identifies the user for fair queuing and usage accounting
+
+    Returns:
+        Tuple of (placeholder_values, ai_prompt); ai_prompt is None for mock values and
+        holds reused_from and similarity for reused values
+
+    Raises:
+        ValueError: If the placeholder regex does not compile
+    """
+    # Identical requests in flight (same document, same template) share one LLM call
+    document_hash = document_key or hashlib.sha256(file_text.encode('utf-8')).hexdigest()
+    template_hash = get_inventory(template_text or '', placeholder_regex).key
+    key = flight_key('answer', document_hash, template_hash, 'mock' if use_mock else None)
+    with span('answer', document=document_hash):
+        return await acoalesce(
+            key, _generate_placeholder_values, file_text, template_text, placeholder_regex, use_mock, document_key,
+            info, priority, user
+        )
+
+
+async def _generate_placeholder_values(
+    file_text: str,
+    template_text: Optional[str],
+    placeholder_regex: Optional[str],
+    use_mock: bool,
+    document_key: Optional[str],
+    info: Optional[Info],
+    priority: str,
+    user: str
+) -> Tuple[List[Optional[str]], Optional[Dict[str, Any]]]:
+    # Prepare input data
+    file_data = {'text': file_text}
+    template_data = {'text': template_text} if template_text else None
+
+    # Add regex to file_data if provided
+    if placeholder_regex:
+        file_data['placeholder_regex'] = placeholder_regex
+
+    if use_mock or settings.LLM_BACKEND == 'mock':
+        # Simulated provider latency for load tests of the mock backend
+        if settings.MOCK_LLM_LATENCY:
+            await asyncio.sleep(settings.MOCK_LLM_LATENCY)
+        values, _ = get_placeholder_mock_values(file_data, template_data)
+        return values, None
+
+    if info is not None and not placeholder_regex:
+        with span('reuse') as current:
+            reused = await sync_to_async(find_reusable_answer, thread_sensitive=False)(info, template_text)
+            if current is not None:
+                current.set(hit=bool(reused))
+        if reused:
+            return reused['values'], {'reused_from': reused['document_key'], 'similarity': reused['similarity']}
+
+    # Reading the memory-mapped index may hit the disk, so it runs off the event loop
+    with span('precedents'):
+        file_data['precedents'] = await sync_to_async(find_precedents, thread_sensitive=False)(file_text, document_key)
+
+    with track_stage('llm'):
+        values, ai_prompt = await aget_placeholder_values(
+            file_data, parsed_json_template_file=template_data, priority=priority, user=user
+        )
+    if 'usage' in ai_prompt:
+        await sync_to_async(_record_usage, thread_sensitive=False)(user, document_key, ai_prompt)
+    # Fallback values after an LLM error are not worth keeping
+    if info is not None and document_key and 'error' not in ai_prompt:
+        await sync_to_async(_remember, thread_sensitive=False)(document_key, info, template_text, values)
+    return values, ai_prompt
+
+
+def _record_usage(user: str, document_key: Optional[str], ai_prompt: Dict[str, Any]) -> None:
+    usage = ai_prompt['usage']
+    try:
+        LlmUsage.objects.create(
+            user=user[:150], priority=usage['priority'], document_key=document_key or '', model=OPENAI_MODEL,
+            input_tokens=usage['input_tokens'], output_tokens=usage['output_tokens'], cost=usage['cost'],
+            queued_seconds=usage['queued_seconds'], seconds=usage['seconds'], error=ai_prompt.get('error', ''),
+        )
+    except DatabaseError:
+        logger.exception("Recording LLM usage failed")
+
+
+def _remember(document_key: str, info: Info, template_text: Optional[str], values: List[Optional[str]]) -> None:
+    """Store a new LLM answer for reuse on near-duplicates and as a precedent for later prompts."""
+    try:
+        remember_answer(document_key, info, template_text, values)
+    except DatabaseError:
+        logger.exception("Storing the answer of %s for reuse failed", document_key)
+    try:
+        add_precedent(document_key, info, values)
+    except OSError:
+        logger.exception("Storing precedent %s failed", document_key)
+
+
+async def generate_klageantwort(
+    info: Info,
+    template,
+    output_path: str,
+    document=None,
+    priority: str = INTERACTIVE,
+    user: str = '',
+    style=None
+) -> Dict[str, Any]:
+    """
+    Generate the placeholder values for a parsed Klageschrift and render its Klageantwort.
+
+    Args:
+        info: The parsed Klageschrift
+        template: The registered DOCX template to fill
+        output_path: Where the filled DOCX is written
+        document: The UploadedFile, if the Klageschrift was uploaded; it is indexed for search
+        priority: Scheduling class of the LLM request, INTERACTIVE or BATCH
+        user: Identifies the user for fair queuing and usage accounting
+        style: Registered DOCX template whose formatting is applied to the output, if any
+
+    Returns:
+        Dict with placeholder_values, original_text and (if any) prompt
+
+    Raises:
+        PoolBusy, JobTimeout, WorkerCrashed: If the render job cannot run
+    """
+    return await generate_klageantworten(info, [(template, output_path)], document, priority, user, style)
+
+
+async def generate_klageantworten(
+    info: Info,
+    renders: Sequence[Tuple[Any, str]],
+    document=None,
+    priority: str = INTERACTIVE,
+    user: str = '',
+    style=None
+) -> Dict[str, Any]:
+    """
+    Render a Klageschrift's Klageantwort into several templates from one LLM run.
+
+    The placeholder values are generated once and answer the placeholders
+    of the prompt template; every DOCX template takes the values its own
+    placeholders name. The renders run in parallel in the job pool, at most
+    one per pool worker at a time, with the cached inventory of each
+    template (see template_registry.template_inventory). With a style
+    template, every output is formatted like it (see styles.py).
+
+    Args:
+        info: The parsed Klageschrift
+        renders: (registered DOCX template, output path) pairs
+        document: The UploadedFile, if the Klageschrift was uploaded; it is indexed for search
+        priority: Scheduling class of the LLM request, INTERACTIVE or BATCH
+        user: Identifies the user for fair queuing and usage accounting
+        style: Registered DOCX template whose formatting is applied to the outputs, if any
+
+    Returns:
+        Dict with placeholder_values, original_text and (if any) prompt
+
+    Raises:
+        PoolBusy, JobTimeout, WorkerCrashed: If a render job cannot run
+    """
+    file_text = info.to_string()
+    placeholder_array, ai_prompt = await generate_placeholder_values(
+        file_text, document_key=document.sha256 if document is not None else None, info=info,
+        priority=priority, user=user
+    )
+    json_data = {'placeholder_values': placeholder_array, 'original_text': file_text}
+    if ai_prompt:
+        json_data['prompt'] = ai_prompt
+
+    if document is not None:
+        try:
+            with track_stage('index'), span('index'):
+                await sync_to_async(index_document, thread_sensitive=False)(document, info, placeholder_array)
+        except DatabaseError:
+            # The answer is still delivered, the document is indexed when it is processed again
+            logger.exception("Indexing document %s failed", document.sha256)
+
+    # The values answer the placeholders of the prompt template; the DOCX inventory says where they go
+    replacements = get_replacements(info, json_data, get_inventory(DEFAULT_TEMPLATE_TEXT).names)
+    # More renders than workers would be rejected by the pool instead of queued
+    semaphore = asyncio.Semaphore(settings.JOB_POOL_WORKERS)
+    # Workers read the style map of a template once and keep it by template hash
+    style_source = (style.key, style.file.path) if style is not None else None
+
+    async def render(template, output_path: str) -> None:
+        async with semaphore:
+            with span('render', template=template.key):
+                await run_job(render_docx, template.file.path, output_path, replacements,
+                              template_inventory(template).locations, style_source)
+
+    await asyncio.gather(*(render(template, output_path) for template, output_path in renders))
+    return json_data
@@ -0,0 +1,152 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# ${name}, the only placeholder syntax python_docx_replace can fill in a DOCX
+DEFAULT_PLACEHOLDER_REGEX = r'\$\{(.*?)\}'
+INVENTORY_CACHE_SIZE = 256
+
+
+def clean_regex(regex: Optional[str]) -> str:
+    """Turn a JS-style regex literal ('/.../g') into a Python pattern."""
+    if not regex:
+        return DEFAULT_PLACEHOLDER_REGEX
+    regex = regex.rstrip('g')
+    if regex.startswith('/'):
+        regex = regex[1:]
+    if regex.endswith('/'):
+        regex = regex[:-1]
+    return regex
+
+
+def template_key(text: str, regex: Optional[str] = None) -> str:
+    """Hash of a text template and its placeholder regex."""
+    digest = hashlib.sha256(clean_regex(regex).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class PlaceholderInventory:
+    """The placeholders of a template, worked out once per template hash."""
+    key: str
+    regex: str
+    # Placeholder names in template order, repeated placeholders included
+    placeholders: Tuple[str, ...]
+    # DOCX templates: (paragraph index, names) of every paragraph holding placeholders
+    locations: Tuple[Tuple[int, Tuple[str, ...]], ...] = ()
+
+    @property
+    def count(self) -> int:
+        return len(self.placeholders)
+
+    @property
+    def names(self) -> List[str]:
+        """Distinct placeholder names in order of first occurrence."""
+        return list(dict.fromkeys(self.placeholders))
+
+    @property
+    def pattern(self) -> re.Pattern:
+        return re.compile(self.regex)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'key': self.key,
+            'regex': self.regex,
+            'placeholders': list(self.placeholders),
+            'locations': [[index, list(names)] for index, names in self.locations],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> 'PlaceholderInventory':
+        return cls(
+            key=data['key'],
+            regex=data['regex'],
+            placeholders=tuple(data['placeholders']),
+            locations=tuple((index, tuple(names)) for index, names in data.get('locations', [])),
+        )
+
+
+def _findall(pattern: re.Pattern, text: str) -> List[str]:
+    # A pattern without a group yields whole matches, as re.findall does
+    return [match.group(1) if pattern.groups else match.group(0) for match in pattern.finditer(text)]
+
+
+def scan_text(text: str, regex: Optional[str] = None) -> PlaceholderInventory:
+    """
+    Find the placeholders of a text template.
+
+    Raises:
+        ValueError: If the regex does not compile
+    """
+    cleaned = clean_regex(regex)
+    try:
+        pattern = re.compile(cleaned)
+    except re.error as e:
+        raise ValueError(f"Invalid placeholder regex: {e}")
+    return PlaceholderInventory(template_key(text, regex), cleaned, tuple(_findall(pattern, text)))
+
+
+def scan_docx(data: bytes) -> Tuple[str, PlaceholderInventory]:
+    """
+    Find the ${name} placeholders of a DOCX template and the paragraphs holding them.
+
+    Paragraphs are numbered in the order python_docx_replace visits them
+    (body, then the header and footer of every section), so rendering can
+    go straight to them.
+
+    Args:
+        data: The DOCX file content
+
+    Returns:
+        Tuple of (template text, inventory); the inventory key is the hash of the file
+    """
+    from python_docx_replace.paragraph import Paragraph  # type: ignore
+
+    from .parsing import open_docx
+
+    pattern = re.compile(DEFAULT_PLACEHOLDER_REGEX)
+    texts, placeholders, locations = [], [], []
+    for index, paragraph in enumerate(Paragraph.get_all(open_docx(data))):
+        text = Paragraph(paragraph).get_text()
+        texts.append(text)
+        names = _findall(pattern, text)
+        if names:
+            placeholders.extend(names)
+            locations.append((index, tuple(dict.fromkeys(names))))
+    inventory = PlaceholderInventory(hashlib.sha256(data).hexdigest(), DEFAULT_PLACEHOLDER_REGEX,
+                                     tuple(placeholders), tuple(locations))
+    return "\n".join(texts), inventory
+
+
+_inventories: 'OrderedDict[str, PlaceholderInventory]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def cache_inventory(inventory: PlaceholderInventory) -> PlaceholderInventory:
+    with _lock:
+        _inventories[inventory.key] = inventory
+        _inventories.move_to_end(inventory.key)
+        while len(_inventories) > INVENTORY_CACHE_SIZE:
+            _inventories.popitem(last=False)
+    return inventory
+
+
+def cached_inventory(key: str) -> Optional[PlaceholderInventory]:
+    with _lock:
+        inventory = _inventories.get(key)
+        if inventory is not None:
+            _inventories.move_to_end(key)
+        return inventory
+
+
+def get_inventory(text: str, regex: Optional[str] = None) -> PlaceholderInventory:
+    """Return the inventory of a text template, scanning it only the first time its hash is seen."""
+    inventory = cached_inventory(template_key(text, regex))
+    if inventory is None:
+        inventory = cache_inventory(scan_text(text, regex))
+    return inventory
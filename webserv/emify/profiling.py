@@ -0,0 +1,319 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from asgiref.sync import sync_to_async as _sync_to_async
+from django.conf import settings
+
+from .memory import run_measured
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Emify-Profile'
+PROFILE_ID_HEADER = 'X-Emify-Profile-Id'
+# Files written per profile: merged pstats dump, text report and summary
+PROFILE_FORMATS = ('prof', 'txt', 'json')
+# Modules whose functions are reported as pipeline stages in the summary
+STAGE_MODULES = ('parsing.py', 'ai_lawyer_service.py')
+REPORT_LINES = 80
+
+_current: ContextVar[Optional['RequestProfile']] = ContextVar('emify_request_profile', default=None)
+# cProfile hooks the thread it is enabled in, and an ASGI worker serves every request from one event loop thread
+_profiling = threading.Lock()
+
+
+def current_profile() -> Optional['RequestProfile']:
+    """The profile of the request being served, None unless it asked for profiling."""
+    return _current.get()
+
+
+def run_profiled(fn: Callable, *args: Any) -> Tuple[Tuple[Any, Dict[str, Any]], Dict]:
+    """
+    Run a job pool job of a profiled request under cProfile in its worker.
+
+    Returns:
+        Tuple of (run_measured result, raw cProfile stats)
+    """
+    profiler = cProfile.Profile()
+    measured = profiler.runcall(run_measured, fn, *args)
+    profiler.create_stats()
+    return measured, profiler.stats
+
+
+def sync_to_async(fn: Callable, *, thread_sensitive: bool = True) -> Callable:
+    """
+    asgiref's sync_to_async, recording the thread's work in the profile of a profiled request.
+
+    cProfile only sees the thread it runs in, so work handed to a thread
+    (hashing, storage, the database) is profiled there and merged into the
+    request's profile, like job pool jobs.
+    """
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        return profile.run_in_thread(fn, *args, **kwargs)
+    return _sync_to_async(run, thread_sensitive=thread_sensitive)
+
+
+class _JobStats:
+    # pstats.Stats.add takes objects with create_stats() and a stats dict, like cProfile.Profile
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+def _stage_name(filename: str, function: str) -> Optional[str]:
+    module = os.path.basename(filename)
+    if module in STAGE_MODULES and os.path.basename(os.path.dirname(filename)) == 'emify':
+        return f"{module[:-3]}.{function}"
+    return None
+
+
+class RequestProfile:
+    """cProfile data of one request: its own thread, the threads it handed work to and its job pool jobs."""
+
+    def __init__(self, method: str, path: str, user: str):
+        self.id = secrets.token_hex(8)
+        self.method = method
+        self.path = path
+        self.user = user
+        self.started_at = time.time()
+        self._jobs: List[Tuple[str, Dict]] = []
+        self._threads: List[Tuple[str, Dict]] = []
+        # Threads running under a profiler of this request, so it is not enabled twice
+        self._profiled_threads: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def add_job(self, name: str, stats: Dict) -> None:
+        with self._lock:
+            self._jobs.append((name, stats))
+
+    def mark_thread(self) -> None:
+        """Note that the calling thread is profiled already (the request's own thread)."""
+        with self._lock:
+            self._profiled_threads.add(threading.get_ident())
+
+    def in_profiled_thread(self) -> bool:
+        with self._lock:
+            return threading.get_ident() in self._profiled_threads
+
+    def run_in_thread(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run fn for this request under cProfile in the calling thread."""
+        thread = threading.get_ident()
+        with self._lock:
+            nested = thread in self._profiled_threads
+            self._profiled_threads.add(thread)
+        if nested:
+            return fn(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process
+            with self._lock:
+                self._profiled_threads.discard(thread)
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.create_stats()
+            with self._lock:
+                self._profiled_threads.discard(thread)
+                self._threads.append((getattr(fn, '__qualname__', type(fn).__name__), profiler.stats))
+
+    def stages(self, stats: pstats.Stats) -> List[Dict[str, Any]]:
+        """Calls and times of the functions of parsing.py and ai_lawyer_service.py, slowest first."""
+        stages = []
+        for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+            name = _stage_name(filename, function)
+            if name:
+                stages.append({'function': name, 'line': line, 'calls': calls,
+                               'seconds': round(cumulative, 6), 'own_seconds': round(own, 6)})
+        return sorted(stages, key=lambda stage: stage['seconds'], reverse=True)
+
+    def save(self, profiler: cProfile.Profile, seconds: float, status: int) -> Dict[str, Any]:
+        """Merge the request and job profiles and write them to PROFILE_DIR."""
+        stats = pstats.Stats(profiler)
+        with self._lock:
+            jobs, threads = list(self._jobs), list(self._threads)
+        for _, job_stats in jobs + threads:
+            stats.add(_JobStats(job_stats))
+
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        base = os.path.join(settings.PROFILE_DIR, self.id)
+        stats.dump_stats(f"{base}.prof")
+        report = io.StringIO()
+        stats.stream = report
+        stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        summary = {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'user': self.user,
+            'started_at': self.started_at,
+            'seconds': seconds,
+            'status': status,
+            'jobs': [name for name, _ in jobs],
+            'threads': [name for name, _ in threads],
+            'stages': self.stages(stats),
+        }
+        with open(f"{base}.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        _prune()
+        return summary
+
+
+def _prune() -> None:
+    """Keep the PROFILE_KEEP newest profiles."""
+    summaries = sorted(
+        (entry for entry in os.scandir(settings.PROFILE_DIR) if entry.name.endswith('.json')),
+        key=lambda entry: entry.stat().st_mtime, reverse=True,
+    )
+    for entry in summaries[settings.PROFILE_KEEP:]:
+        for extension in PROFILE_FORMATS:
+            try:
+                os.remove(os.path.join(settings.PROFILE_DIR, f"{entry.name[:-5]}.{extension}"))
+            except FileNotFoundError:
+                pass
+
+
+def profile_path(profile_id: str, extension: str) -> Optional[str]:
+    """Path of a stored profile file, None if there is no such profile or format."""
+    if extension not in PROFILE_FORMATS or not profile_id.isalnum():
+        return None
+    path = os.path.join(settings.PROFILE_DIR, f"{profile_id}.{extension}")
+    return path if os.path.exists(path) else None
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Summaries of the stored profiles, newest first, without their stage tables."""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(settings.PROFILE_DIR):
+        if entry.name.endswith('.json'):
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                # Pruned or still being written
+                continue
+            summary['stages'] = summary['stages'][:5]
+            profiles.append(summary)
+    return sorted(profiles, key=lambda summary: summary['started_at'], reverse=True)
+
+
+def _requested(request) -> bool:
+    return settings.PROFILING and (request.headers.get(PROFILE_HEADER) == '1' or request.GET.get('profile') == '1')
+
+
+def _allowed(user) -> bool:
+    # Profiles name source files and show request timings
+    return settings.DEBUG or user.is_staff
+
+
+class ProfilingMiddleware:
+    """
+    Profile a request with cProfile when a staff user asks for it.
+
+    Requests with the header ``X-Emify-Profile: 1`` or the query parameter
+    ``profile=1`` run under cProfile; the profile id is returned in the
+    ``X-Emify-Profile-Id`` response header. Job pool jobs of the request
+    are profiled in their worker processes (see run_profiled) and merged
+    into the request's profile, as is work the request hands to threads
+    through sync_to_async above and sync views run by ASGI (see
+    process_view). Under ASGI the profiler records the event loop thread, so
+    coroutines of other requests served meanwhile show up as well; one
+    request per process is profiled at a time.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _requested(request) or not _allowed(request.user):
+            return self.get_response(request)
+        if not _profiling.acquire(blocking=False):
+            return self._busy(self.get_response(request))
+        try:
+            profile, profiler, token, start = self._start(request, request.user)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                _current.reset(token)
+        finally:
+            _profiling.release()
+        return self._finish(response, profile, profiler, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not _requested(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not _allowed(user):
+            return await self.get_response(request)
+        if not _profiling.acquire(blocking=False):
+            return self._busy(await self.get_response(request))
+        try:
+            profile, profiler, token, start = self._start(request, user)
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+                _current.reset(token)
+        finally:
+            _profiling.release()
+        # Writing the profile files blocks, so it runs off the event loop
+        return await sync_to_async(self._finish, thread_sensitive=False)(
+            response, profile, profiler, time.perf_counter() - start)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Under ASGI a sync view runs in a thread of its own; under WSGI in the profiled request thread
+        profile = _current.get()
+        if profile is None or iscoroutinefunction(view_func) or profile.in_profiled_thread():
+            return None
+        return profile.run_in_thread(view_func, request, *view_args, **view_kwargs)
+
+    @staticmethod
+    def _start(request, user):
+        profile = RequestProfile(request.method, request.get_full_path(), user.get_username())
+        token = _current.set(profile)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        profile.mark_thread()
+        return profile, profiler, token, start
+
+    @staticmethod
+    def _finish(response, profile: RequestProfile, profiler: cProfile.Profile, seconds: float):
+        profile.save(profiler, seconds, response.status_code)
+        response[PROFILE_ID_HEADER] = profile.id
+        return response
+
+    @staticmethod
+    def _busy(response):
+        logger.info("Profiling skipped: another request of this process is being profiled")
+        response[PROFILE_HEADER] = 'busy'
+        return response
@@ -0,0 +1,362 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .parsing import Info
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIM = 512
+# Characters of a precedent's answer that are put into the prompt
+PRECEDENT_ANSWER_CHARS = 1500
+BATCH_SIZE = 4096
+
+TOKEN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "der die das den dem des ein eine einer eines einem einen und oder zu zur zum im in am an auf aus "
+    "bei mit nach von vom vor für über unter um sei sich ist sind wird wurde hat haben als auch dass nicht "
+    "es er sie wie so da wo bis seit durch".split()
+)
+
+VECTORS_FILE = 'vectors.f32'
+OFFSETS_FILE = 'entries.idx'
+ENTRIES_FILE = 'entries.jsonl'
+IDF_FILE = 'idf.npy'
+META_FILE = 'meta.json'
+LOCK_FILE = 'index.lock'
+
+
+def features(text: str) -> List[str]:
+    """Lower-cased words without stopwords, plus word bigrams."""
+    words = [word for word in TOKEN.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+@lru_cache(maxsize=1 << 18)
+def _bucket(feature: str, dim: int) -> Tuple[int, float]:
+    # crc32 is stable across processes (unlike hash()); the top bit picks the sign
+    # so that colliding features tend to cancel out instead of adding up
+    value = zlib.crc32(feature.encode('utf-8'))
+    return value % dim, 1.0 if value & 0x80000000 else -1.0
+
+
+def term_frequencies(texts: Sequence[str], dim: int) -> np.ndarray:
+    """Signed, sublinear hashed term frequencies, one row per text."""
+    rows, columns, signs = [], [], []
+    for row, text in enumerate(texts):
+        for feature in features(text):
+            column, sign = _bucket(feature, dim)
+            rows.append(row)
+            columns.append(column)
+            signs.append(sign)
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)),
+              np.asarray(signs, dtype=np.float32))
+    return np.sign(matrix) * np.log1p(np.abs(matrix))
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def document_text(info: Info) -> str:
+    """The text a document is embedded by: its claims and the statements of its arguments."""
+    justification = info.justification
+    arguments = justification.formalities + justification.jurisdiction + justification.facts
+    return "\n".join(list(info.claims) + [argument.statement for argument in arguments])
+
+
+class RetrievalIndex:
+    """
+    Append-only vector index of processed documents and their answers.
+
+    Documents are embedded offline with TF-IDF weighted feature hashing
+    (no model, no network). The vectors are stored as a raw float32 matrix
+    that is memory-mapped for queries, so the index does not have to fit
+    into the heap of every worker; top-k cosine search is one matrix-vector
+    product. Entries (key, text and payload) live in a JSONL file addressed
+    through an offset table.
+
+    ``build`` writes an index from scratch and fixes the IDF weights;
+    ``add`` appends single documents with the current weights and is safe
+    across processes (file lock). Run ``build`` again (see the
+    rebuild_retrieval_index command) after many additions to refresh IDF.
+    """
+
+    def __init__(self, path: str, dim: int = DEFAULT_DIM):
+        self.path = path
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                dim = json.load(f)['dim']
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._idf: Optional[np.ndarray] = None
+        self._signature: Optional[Tuple[int, int]] = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _rows(self) -> int:
+        try:
+            vectors_size = os.path.getsize(self._file(VECTORS_FILE))
+            offsets = os.path.getsize(self._file(OFFSETS_FILE)) // 8
+        except OSError:
+            return 0
+        if vectors_size % (self.dim * 4):
+            # An interrupted append; the next add truncates it, so later rows stay aligned
+            logger.warning("Retrieval index %s has a partial vector row", self.path)
+        # A row is visible once both its vector and its entry offset are complete
+        return min(vectors_size // (self.dim * 4), offsets)
+
+    def _truncate_partial_rows(self) -> None:
+        """Cut the index files back to their complete rows. Call with the file lock held."""
+        rows = self._rows()
+        entries_size = 0
+        if rows:
+            # Entries of torn appends follow the entry of the last complete row
+            last = int(np.fromfile(self._file(OFFSETS_FILE), dtype=np.uint64, count=1, offset=(rows - 1) * 8)[0])
+            with open(self._file(ENTRIES_FILE), 'rb') as entries:
+                entries.seek(last)
+                entries.readline()
+                entries_size = entries.tell()
+        for name, size in ((VECTORS_FILE, rows * self.dim * 4), (OFFSETS_FILE, rows * 8),
+                           (ENTRIES_FILE, entries_size)):
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                logger.warning("Truncating %s to %d complete rows", path, rows)
+                os.truncate(path, size)
+
+    def __len__(self) -> int:
+        return self._rows()
+
+    def _load(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Memory-map the matrix again when other processes appended rows or rebuilt the index."""
+        with self._lock:
+            rows = self._rows()
+            try:
+                signature = (os.stat(self._file(VECTORS_FILE)).st_ino, rows)
+            except OSError:
+                signature = (0, 0)
+            if signature != self._signature:
+                self._signature = signature
+                if rows:
+                    self._matrix = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode='r',
+                                             shape=(rows, self.dim))
+                    self._offsets = np.memmap(self._file(OFFSETS_FILE), dtype=np.uint64, mode='r', shape=(rows,))
+                else:
+                    self._matrix, self._offsets = None, None
+                self._idf = None
+            if self._idf is None:
+                idf_path = self._file(IDF_FILE)
+                self._idf = np.load(idf_path) if os.path.exists(idf_path) else np.ones(self.dim, dtype=np.float32)
+            return self._matrix, self._offsets
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        self._load()
+        return normalize(term_frequencies(texts, self.dim) * self._idf)
+
+    def build(self, items: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """
+        Write a new index from (key, text, payload) items, replacing the current one.
+
+        Returns:
+            The number of indexed items
+        """
+        items = list(items)
+        os.makedirs(self.path, exist_ok=True)
+        texts = [text for _, text, _ in items]
+        vectors_path = self._file(VECTORS_FILE) + '.tmp'
+
+        with self._locked():
+            # First pass: hashed term frequencies to disk and document frequencies
+            document_frequency = np.zeros(self.dim, dtype=np.int64)
+            with open(vectors_path, 'wb') as vectors:
+                for start in range(0, len(texts), BATCH_SIZE):
+                    batch = term_frequencies(texts[start:start + BATCH_SIZE], self.dim)
+                    document_frequency += (batch != 0).sum(axis=0)
+                    vectors.write(batch.tobytes())
+            idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+            # Second pass: apply IDF and normalise in place
+            if texts:
+                matrix = np.memmap(vectors_path, dtype=np.float32, mode='r+', shape=(len(texts), self.dim))
+                for start in range(0, len(texts), BATCH_SIZE):
+                    matrix[start:start + BATCH_SIZE] = normalize(matrix[start:start + BATCH_SIZE] * idf)
+                matrix.flush()
+                del matrix
+
+            offsets = []
+            with open(self._file(ENTRIES_FILE) + '.tmp', 'wb') as entries:
+                for key, text, payload in items:
+                    offsets.append(entries.tell())
+                    entries.write(self._entry_line(key, text, payload))
+            np.asarray(offsets, dtype=np.uint64).tofile(self._file(OFFSETS_FILE) + '.tmp')
+            np.save(self._file(IDF_FILE) + '.tmp.npy', idf)
+            with open(self._file(META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'dim': self.dim}, f)
+            # Open memory maps keep reading the replaced files until they are reloaded
+            for name in (ENTRIES_FILE, OFFSETS_FILE, VECTORS_FILE):
+                os.replace(self._file(name) + '.tmp', self._file(name))
+            os.replace(self._file(IDF_FILE) + '.tmp.npy', self._file(IDF_FILE))
+        with self._lock:
+            self._signature = None
+        return len(items)
+
+    def add(self, key: str, text: str, payload: Dict[str, Any]) -> None:
+        """Append one document to the index."""
+        os.makedirs(self.path, exist_ok=True)
+        vector = self.embed([text]).astype(np.float32)
+        with self._locked():
+            if not os.path.exists(self._file(META_FILE)):
+                with open(self._file(META_FILE), 'w', encoding='utf-8') as f:
+                    json.dump({'dim': self.dim}, f)
+            # Appending after a torn row would shift every later row
+            self._truncate_partial_rows()
+            with open(self._file(ENTRIES_FILE), 'ab') as entries:
+                offset = entries.tell()
+                entries.write(self._entry_line(key, text, payload))
+            # The entry is written before its offset and vector, so readers never see a half row
+            with open(self._file(OFFSETS_FILE), 'ab') as offsets:
+                offsets.write(np.uint64(offset).tobytes())
+            with open(self._file(VECTORS_FILE), 'ab') as vectors:
+                vectors.write(vector.tobytes())
+
+    def search(self, text: str, k: int = 3, exclude: Optional[str] = None,
+               min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Return the k most similar entries by cosine similarity.
+
+        Args:
+            text: Query text
+            k: Number of results
+            exclude: Key of an entry to leave out (e.g. the document itself)
+            min_score: Minimum cosine similarity
+
+        Returns:
+            Entries (key, text, payload) with their score, best match first; a key
+            added several times (a re-answered document) is returned once, with its latest entry
+        """
+        matrix, offsets = self._load()
+        if matrix is None or k <= 0:
+            return []
+        scores = matrix @ self.embed([text])[0]
+        wanted = min(len(scores), 2 * k + 1)
+        loaded: Dict[int, Dict[str, Any]] = {}
+        with open(self._file(ENTRIES_FILE), 'rb') as entries:
+            while True:
+                candidates = np.argpartition(-scores, wanted - 1)[:wanted]
+                results = []
+                seen = {exclude}
+                # Best score first; among equal scores (copies of one document) the latest row
+                for row in candidates[np.lexsort((-candidates, -scores[candidates]))]:
+                    score = float(scores[row])
+                    if score < min_score:
+                        return results
+                    if row not in loaded:
+                        entries.seek(int(offsets[row]))
+                        loaded[row] = json.loads(entries.readline())
+                    if loaded[row]['key'] in seen:
+                        continue
+                    seen.add(loaded[row]['key'])
+                    results.append({**loaded[row], 'score': score})
+                    if len(results) == k:
+                        return results
+                if wanted == len(scores):
+                    return results
+                # Skipped keys used up the candidates: look further down the ranking
+                wanted = min(len(scores), 2 * wanted)
+
+    def entries(self) -> Iterable[Tuple[str, str, Dict[str, Any]]]:
+        """All (key, text, payload) items, e.g. for a rebuild."""
+        _, offsets = self._load()
+        if offsets is None:
+            return
+        # Through the offsets, as search() does: entries of torn appends have none
+        with open(self._file(ENTRIES_FILE), 'rb') as f:
+            for offset in offsets:
+                f.seek(int(offset))
+                entry = json.loads(f.readline())
+                yield entry['key'], entry['text'], entry['payload']
+
+    def _locked(self):
+        return _FileLock(self._file(LOCK_FILE))
+
+    @staticmethod
+    def _entry_line(key: str, text: str, payload: Dict[str, Any]) -> bytes:
+        return (json.dumps({'key': key, 'text': text, 'payload': payload}, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class _FileLock:
+    """Exclusive lock shared by all processes writing the same index."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+_index: Optional[RetrievalIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_retrieval_index() -> RetrievalIndex:
+    """Return the index of this worker process (memory maps are shared through the page cache)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = RetrievalIndex(settings.RETRIEVAL_INDEX_DIR)
+    return _index
+
+
+def add_precedent(key: str, info: Info, placeholder_values: Sequence[Optional[str]]) -> None:
+    """Store a processed document and its generated answer for later prompts."""
+    get_retrieval_index().add(key, document_text(info), {
+        'claims': list(info.claims),
+        'answer': "\n".join(value for value in placeholder_values if value),
+    })
+
+
+def find_precedents(file_text: str, exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Find the past documents most similar to a Klageschrift.
+
+    Args:
+        file_text: The Klageschrift text (Info.to_string())
+        exclude: Content hash of the document itself
+
+    Returns:
+        Up to RETRIEVAL_TOP_K precedents with claims, answer (shortened) and score
+    """
+    if settings.RETRIEVAL_TOP_K <= 0:
+        return []
+    matches = get_retrieval_index().search(file_text, settings.RETRIEVAL_TOP_K, exclude,
+                                           settings.RETRIEVAL_MIN_SCORE)
+    return [
+        {
+            'claims': match['payload']['claims'],
+            'answer': match['payload']['answer'][:PRECEDENT_ANSWER_CHARS],
+            'score': round(match['score'], 3),
+        }
+        for match in matches
+    ]
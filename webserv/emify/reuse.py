@@ -0,0 +1,223 @@
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import AnsweredDocument, ClaimSignature, LshBucket, ReuseCounter
+from .parsing import Info
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+# Universal hashing modulo a Mersenne prime; a * x stays below 2**62, so uint64 cannot overflow
+PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240517)
+_A = _rng.randint(1, PRIME, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, PRIME, size=NUM_PERM).astype(np.uint64)
+
+WORD = re.compile(r"\w+")
+NUMBER = re.compile(r"\d[\d'‘’.]*\d|\d")
+
+COUNTERS = ('documents', 'document_hits', 'claims', 'claim_hits')
+
+
+def shingles(text: str) -> List[str]:
+    """Word 3-grams of the text with numbers replaced, so amounts and dates do not count as differences."""
+    words = WORD.findall(NUMBER.sub('0', text.lower()))
+    if len(words) < SHINGLE_WORDS:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of a text's shingles."""
+    values = np.fromiter((zlib.crc32(shingle.encode('utf-8')) & PRIME for shingle in shingles(text)),
+                         dtype=np.uint64)
+    if not len(values):
+        return np.full(NUM_PERM, PRIME, dtype=np.uint32)
+    return ((np.outer(values, _A) + _B) % PRIME).min(axis=0).astype(np.uint32)
+
+
+def bucket_keys(signature: np.ndarray) -> List[str]:
+    """One LSH bucket key per band of ROWS signature values."""
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(BANDS)
+    ]
+
+
+def template_key(template_text: Optional[str]) -> str:
+    return hashlib.sha256((template_text or '').encode('utf-8')).hexdigest()
+
+
+def _statements(info: Info) -> List[str]:
+    justification = info.justification
+    arguments = justification.formalities + justification.jurisdiction + justification.facts
+    return [argument.statement for argument in arguments]
+
+
+def _header(info: Info) -> Dict[str, object]:
+    header = info.header
+    names = {
+        'court': header.court.name,
+        'plaintiff': header.plaintiff.name,
+        'defendant': header.defendant.name,
+    }
+    for role, party in (('plaintiff_representative', header.plaintiff), ('defendant_representative', header.defendant)):
+        if party.representative:
+            names[role] = party.representative.name
+    return {'names': names, 'claim_numbers': [NUMBER.findall(claim) for claim in info.claims]}
+
+
+def _count(**increments: int) -> None:
+    for name, value in increments.items():
+        if value:
+            counter, _ = ReuseCounter.objects.get_or_create(name=name)
+            ReuseCounter.objects.filter(pk=counter.pk).update(value=F('value') + value)
+
+
+def remember_answer(document_key: str, info: Info, template_text: Optional[str],
+                    values: Sequence[Optional[str]]) -> AnsweredDocument:
+    """
+    Store the generated values of a document with the signatures of its claims and statements.
+
+    Args:
+        document_key: Content hash of the document
+        info: The parsed document
+        template_text: The template the values were generated for
+        values: The generated placeholder values
+
+    Returns:
+        The stored AnsweredDocument
+    """
+    texts = [(ClaimSignature.CLAIM, claim) for claim in info.claims]
+    texts += [(ClaimSignature.STATEMENT, statement) for statement in _statements(info)]
+    with transaction.atomic():
+        AnsweredDocument.objects.filter(document_key=document_key).delete()
+        answer = AnsweredDocument.objects.create(
+            document_key=document_key, template_key=template_key(template_text),
+            values=list(values), header=_header(info),
+        )
+        signatures = [minhash(text) for _, text in texts]
+        records = ClaimSignature.objects.bulk_create([
+            ClaimSignature(answer=answer, kind=kind, text=text, minhash=signature.tobytes())
+            for (kind, text), signature in zip(texts, signatures)
+        ])
+        LshBucket.objects.bulk_create([
+            LshBucket(signature=record, key=key)
+            for record, signature in zip(records, signatures) for key in bucket_keys(signature)
+        ])
+    return answer
+
+
+def _candidates(signatures: List[np.ndarray], template: str) -> Dict[int, List[Tuple[str, np.ndarray]]]:
+    """Signatures of answered documents sharing an LSH bucket with any of the given signatures."""
+    keys = {key for signature in signatures for key in bucket_keys(signature)}
+    ids = LshBucket.objects.filter(
+        key__in=keys, signature__answer__template_key=template
+    ).values_list('signature_id', flat=True).distinct()
+    candidates: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+    rows = ClaimSignature.objects.filter(id__in=list(ids)).values_list('answer_id', 'kind', 'minhash')
+    for answer_id, kind, data in rows:
+        candidates.setdefault(answer_id, []).append((kind, np.frombuffer(bytes(data), dtype=np.uint32)))
+    return candidates
+
+
+def _best_matches(queries: List[np.ndarray], stored: List[np.ndarray]) -> np.ndarray:
+    if not queries:
+        return np.zeros(0)
+    if not stored:
+        return np.zeros(len(queries))
+    # Pairwise share of equal signature values: queries x stored
+    equal = np.stack(queries)[:, None, :] == np.stack(stored)[None, :, :]
+    return equal.mean(axis=2).max(axis=1)
+
+
+def adapt_values(values: Sequence[Optional[str]], old_header: Dict[str, object], info: Info) -> List[Optional[str]]:
+    """Replace names and claim amounts of the answered document with those of the new one."""
+    new_header = _header(info)
+    replacements = {}
+    for role, old_name in old_header.get('names', {}).items():
+        new_name = new_header['names'].get(role)
+        if new_name and old_name and new_name != old_name:
+            replacements[old_name] = new_name
+    for old_numbers, new_numbers in zip(old_header.get('claim_numbers', []), new_header['claim_numbers']):
+        if len(old_numbers) != len(new_numbers):
+            continue
+        for old, new in zip(old_numbers, new_numbers):
+            # Short numbers (percentages, claim numbers) are too ambiguous to replace
+            if old != new and sum(char.isdigit() for char in old) >= 3:
+                replacements.setdefault(old, new)
+    if not replacements:
+        return list(values)
+    pattern = re.compile("|".join(re.escape(old) for old in sorted(replacements, key=len, reverse=True)))
+    return [pattern.sub(lambda match: replacements[match.group(0)], value) if value else value for value in values]
+
+
+def find_reusable_answer(info: Info, template_text: Optional[str]) -> Optional[Dict[str, object]]:
+    """
+    Find an answered document whose claims and statements nearly equal those of a new document.
+
+    Every claim has to match a claim of the answered document with an
+    estimated Jaccard similarity of at least REUSE_CLAIM_THRESHOLD, and at
+    least REUSE_STATEMENT_COVERAGE of the statements have to match one of
+    its statements as closely.
+
+    Args:
+        info: The parsed new document
+        template_text: The template the values are needed for
+
+    Returns:
+        None, or a dict with the adapted values, the source document_key and the similarity
+    """
+    if not settings.REUSE_ANSWERS or not info.claims:
+        return None
+    threshold = settings.REUSE_CLAIM_THRESHOLD
+    claims = [minhash(claim) for claim in info.claims]
+    statements = [minhash(statement) for statement in _statements(info)]
+    candidates = _candidates(claims + statements, template_key(template_text))
+
+    best, best_score = None, 0.0
+    claim_hits = np.zeros(len(claims), dtype=bool)
+    for answer_id, stored in candidates.items():
+        claim_scores = _best_matches(claims, [signature for kind, signature in stored if kind == ClaimSignature.CLAIM])
+        claim_hits |= claim_scores >= threshold
+        if not (claim_scores >= threshold).all():
+            continue
+        statement_scores = _best_matches(
+            statements, [signature for kind, signature in stored if kind == ClaimSignature.STATEMENT]
+        )
+        coverage = float((statement_scores >= threshold).mean()) if len(statements) else 1.0
+        if coverage < settings.REUSE_STATEMENT_COVERAGE:
+            continue
+        score = float(np.concatenate([claim_scores, statement_scores]).mean())
+        if score > best_score:
+            best, best_score = answer_id, score
+
+    _count(documents=1, document_hits=int(best is not None), claims=len(claims), claim_hits=int(claim_hits.sum()))
+    if best is None:
+        return None
+    answer = AnsweredDocument.objects.get(pk=best)
+    return {
+        'values': adapt_values(answer.values, answer.header, info),
+        'document_key': answer.document_key,
+        'similarity': round(best_score, 3),
+    }
+
+
+def reuse_stats() -> Dict[str, object]:
+    """Counters and hit rates of answer reuse since the counters were created."""
+    counts = dict.fromkeys(COUNTERS, 0)
+    counts.update(ReuseCounter.objects.filter(name__in=COUNTERS).values_list('name', 'value'))
+    return {
+        **counts,
+        'document_hit_rate': counts['document_hits'] / counts['documents'] if counts['documents'] else 0.0,
+        'claim_hit_rate': counts['claim_hits'] / counts['claims'] if counts['claims'] else 0.0,
+        'answered_documents': AnsweredDocument.objects.count(),
+    }
@@ -0,0 +1,122 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from django.db import connection
+
+from .parsing import Info
+
+SEARCH_TABLE = 'emify_search'
+
+# Searchable columns of the FTS5 table (see migration 0003) with their bm25
+# weights: a match in a party or court name ranks above one in the body text
+SEARCH_COLUMNS: Dict[str, float] = {
+    'court': 4.0,
+    'plaintiff': 4.0,
+    'defendant': 4.0,
+    'representatives': 2.0,
+    'claims': 2.0,
+    'statements': 1.0,
+    'evidence': 1.0,
+    'answers': 1.0,
+}
+
+TOKEN = re.compile(r"(\w+)(\*?)")
+
+
+def document_fields(info: Info, placeholder_values: Optional[Sequence[Optional[str]]] = None) -> Dict[str, str]:
+    """Flatten a parsed Klageschrift and its generated answers into the search columns."""
+    header = info.header
+    justification = info.justification
+    arguments = justification.formalities + justification.jurisdiction + justification.facts
+    representatives = [party.representative for party in (header.plaintiff, header.defendant) if party.representative]
+    return {
+        'court': header.court.to_str(),
+        'plaintiff': header.plaintiff.to_str(),
+        'defendant': header.defendant.to_str(),
+        'representatives': "\n".join(person.to_str() for person in representatives),
+        'claims': "\n".join(info.claims),
+        'statements': "\n".join(argument.statement for argument in arguments),
+        'evidence': "\n".join(item for argument in arguments for item in argument.evidence or []),
+        'answers': "\n".join(value for value in placeholder_values or [] if value),
+    }
+
+
+def index_fields(rowid: int, document: str, name: str, fields: Dict[str, str]) -> None:
+    """Insert or replace the index row of one document."""
+    columns = list(SEARCH_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, document, name, {', '.join(columns)}) "
+            f"VALUES (%s, %s, %s, {', '.join(['%s'] * len(columns))})",
+            [rowid, document, name] + [fields.get(column, '') for column in columns],
+        )
+
+
+def index_document(document, info: Info, placeholder_values: Optional[Sequence[Optional[str]]] = None) -> None:
+    """
+    Add a processed upload to the full-text index, replacing an earlier entry.
+
+    Args:
+        document: The UploadedFile record
+        info: The parsed Klageschrift
+        placeholder_values: The generated placeholder values, if any
+    """
+    index_fields(document.pk, document.sha256, document.original_name, document_fields(info, placeholder_values))
+
+
+def fts_query(text: str, columns: Optional[Iterable[str]] = None) -> str:
+    """
+    Build an FTS5 query from free text.
+
+    Every word must occur (in any order); a trailing * makes it a prefix
+    search. Words are quoted so user input never reaches the FTS5 syntax.
+
+    Raises:
+        ValueError: If the text has no words or a column is unknown
+    """
+    terms = [f'"{word}"{star}' for word, star in TOKEN.findall(text)]
+    if not terms:
+        raise ValueError("Query contains no searchable words")
+    query = " ".join(terms)
+    if columns:
+        columns = list(columns)
+        unknown = [column for column in columns if column not in SEARCH_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown search fields: {', '.join(unknown)}")
+        query = f"{{{' '.join(columns)}}} : ({query})"
+    return query
+
+
+def search(text: str, limit: int = 20, columns: Optional[Iterable[str]] = None, cases=None) -> List[Dict]:
+    """
+    Search the indexed documents, best match first.
+
+    Args:
+        text: Free-text query
+        limit: Maximum number of results
+        columns: Restrict matching to these search columns
+        cases: Restrict results to the documents of these stored cases (a Case QuerySet, see case_store.find_cases)
+
+    Returns:
+        List of dicts with document (content hash), name, score (higher is better) and snippet
+    """
+    weights = ', '.join(str(weight) for weight in SEARCH_COLUMNS.values())
+    condition, params = f"{SEARCH_TABLE} MATCH %s", [fts_query(text, columns)]
+    if cases is not None:
+        # The case tables live in the same database, so the filter runs as a subquery
+        subquery, subquery_params = cases.values('document_key').query.sql_with_params()
+        condition += f" AND document IN ({subquery})"
+        params.extend(subquery_params)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT document, name, bm25({SEARCH_TABLE}, 0, 0, {weights}) AS score, "
+            f"snippet({SEARCH_TABLE}, -1, '[', ']', '…', 16) "
+            f"FROM {SEARCH_TABLE} WHERE {condition} ORDER BY score LIMIT %s",
+            params + [limit],
+        )
+        rows = cursor.fetchall()
+    # bm25 is lower for better matches
+    return [
+        {'document': document, 'name': name, 'score': -score, 'snippet': snippet}
+        for document, name, score, snippet in rows
+    ]
@@ -17,7 +17,106 @@ import os
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_ROOT = os.getenv('EMIFY_MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+# LLM backend used by the placeholder_values view: 'openai' or 'mock'
+LLM_BACKEND = os.getenv('EMIFY_LLM_BACKEND', 'openai')
+# Seconds the mock backend waits per call to simulate provider latency
+MOCK_LLM_LATENCY = float(os.getenv('EMIFY_MOCK_LLM_LATENCY', '0'))
+
+# Process pool for CPU-bound parse/render jobs (see emify/job_pool.py)
+JOB_POOL_WORKERS = int(os.getenv('EMIFY_JOB_POOL_WORKERS', os.cpu_count() or 2))
+# Jobs accepted beyond the busy workers before submissions are rejected
+JOB_POOL_QUEUE_SIZE = int(os.getenv('EMIFY_JOB_POOL_QUEUE_SIZE', '16'))
+# Seconds a submission waits for a free slot when the pool is full (0 = reject immediately)
+JOB_POOL_QUEUE_TIMEOUT = float(os.getenv('EMIFY_JOB_POOL_QUEUE_TIMEOUT', '0'))
+JOB_POOL_JOB_TIMEOUT = float(os.getenv('EMIFY_JOB_POOL_JOB_TIMEOUT', '120'))
+# Worker processes are replaced after this many jobs to cap memory growth
+JOB_POOL_MAX_TASKS_PER_CHILD = int(os.getenv('EMIFY_JOB_POOL_MAX_TASKS_PER_CHILD', '100'))
+
+# Preload the parser, the template and the LLM client when a web worker or job pool process starts (see emify/warmup.py)
+WARM_UP = os.getenv('EMIFY_WARM_UP', '1') == '1'
+# Also start the job pool processes during the warm-up instead of on the first jobs
+WARM_UP_JOB_POOL = os.getenv('EMIFY_WARM_UP_JOB_POOL', '1') == '1'
+
+# Seconds the Info parsed at upload time is kept in the cache for send_file
+INGEST_INFO_CACHE_TIMEOUT = 3600
+
+# LLM scheduler limits of each worker process (see emify/llm_scheduler.py); set them to the
+# provider's limits divided by the number of worker processes. 0 disables a limit.
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('EMIFY_LLM_REQUESTS_PER_MINUTE', '500'))
+LLM_TOKENS_PER_MINUTE = float(os.getenv('EMIFY_LLM_TOKENS_PER_MINUTE', '30000'))
+# LLM requests in flight at once, and how many of them batch requests may hold
+LLM_MAX_CONCURRENCY = int(os.getenv('EMIFY_LLM_MAX_CONCURRENCY', '16'))
+LLM_BATCH_MAX_CONCURRENCY = int(os.getenv('EMIFY_LLM_BATCH_MAX_CONCURRENCY', '8'))
+# Times a request answered with 429 is queued again before the mock values are used
+LLM_RATE_LIMIT_RETRIES = int(os.getenv('EMIFY_LLM_RATE_LIMIT_RETRIES', '2'))
+# USD per million input and output tokens of OPENAI_MODEL, for cost accounting
+LLM_INPUT_COST_PER_MTOK = float(os.getenv('EMIFY_LLM_INPUT_COST_PER_MTOK', '2.5'))
+LLM_OUTPUT_COST_PER_MTOK = float(os.getenv('EMIFY_LLM_OUTPUT_COST_PER_MTOK', '10'))
+
+# Concurrent identical parses and LLM calls (same document and template hash) run once (see emify/singleflight.py)
+SINGLE_FLIGHT = os.getenv('EMIFY_SINGLE_FLIGHT', '1') == '1'
+# Also coalesce across worker processes through flock leases in SINGLE_FLIGHT_DIR
+SINGLE_FLIGHT_ACROSS_PROCESSES = os.getenv('EMIFY_SINGLE_FLIGHT_ACROSS_PROCESSES', '1') == '1'
+# Local directory of the lease files and the results handed to waiting processes
+SINGLE_FLIGHT_DIR = os.getenv('EMIFY_SINGLE_FLIGHT_DIR', os.path.join(BASE_DIR, 'singleflight'))
+# Seconds a process waits for another one before computing the result itself
+SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.getenv('EMIFY_SINGLE_FLIGHT_WAIT_TIMEOUT', '180'))
+
+# Log a warning when a processing stage leaves its process above this RSS in bytes (0 disables, see emify/memory.py)
+MEMORY_RSS_WARNING = int(os.getenv('EMIFY_MEMORY_RSS_WARNING', str(1024 * 1024 * 1024)))
+
+# Staff users can profile a request with the X-Emify-Profile: 1 header or ?profile=1 (see emify/profiling.py)
+PROFILING = os.getenv('EMIFY_PROFILING', '1') == '1'
+# Local directory of the stored profiles
+PROFILE_DIR = os.getenv('EMIFY_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+# Number of profiles kept; older ones are deleted
+PROFILE_KEEP = int(os.getenv('EMIFY_PROFILE_KEEP', '100'))
+
+# Record a trace of nested spans for every request and batch document (see emify/tracing.py)
+TRACING = os.getenv('EMIFY_TRACING', '1') == '1'
+# JSON lines file the spans are appended to, one trace at a time
+TRACE_FILE = os.getenv('EMIFY_TRACE_FILE', os.path.join(BASE_DIR, 'traces', 'traces.jsonl'))
+# Size in bytes at which the trace file is rotated to TRACE_FILE.1 (0 never rotates)
+TRACE_FILE_MAX_BYTES = int(os.getenv('EMIFY_TRACE_FILE_MAX_BYTES', str(100 * 1024 * 1024)))
+
+# Hand file transfers of /download/ and /media/ to the front proxy: '' (serve from Django),
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache mod_xsendfile, lighttpd)
+DOWNLOAD_OFFLOAD = os.getenv('EMIFY_DOWNLOAD_OFFLOAD', '')
+# Internal nginx location that aliases MEDIA_ROOT, used with x-accel-redirect
+DOWNLOAD_ACCEL_PREFIX = os.getenv('EMIFY_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+# Generated files are rewritten under the same name, so clients revalidate them with their ETag
+DOWNLOAD_CACHE_CONTROL = os.getenv('EMIFY_DOWNLOAD_CACHE_CONTROL', 'private, no-cache')
+
+# JSON responses of /placeholder_values/ from this size on are compressed (brotli if installed, else gzip)
+COMPRESS_MIN_SIZE = int(os.getenv('EMIFY_COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_GZIP_LEVEL = 6
+# Brotli quality 4 compresses better than gzip -6 at a similar speed
+COMPRESS_BROTLI_QUALITY = 4
+
+# Documents of one /batch/ upload processed at the same time (they also share the job pool)
+BATCH_CONCURRENCY = int(os.getenv('EMIFY_BATCH_CONCURRENCY', '4'))
+# Documents per batch, ZIP members included
+BATCH_MAX_DOCUMENTS = int(os.getenv('EMIFY_BATCH_MAX_DOCUMENTS', '100'))
+# Bytes per document, checked before a ZIP member is unpacked
+BATCH_MAX_FILE_SIZE = int(os.getenv('EMIFY_BATCH_MAX_FILE_SIZE', str(20 * 1024 * 1024)))
+# Templates one /render/ request may fill from the same placeholder values
+RENDER_MAX_TEMPLATES = int(os.getenv('EMIFY_RENDER_MAX_TEMPLATES', '10'))
+
+# Vector index of past documents and answers used to ground prompts (see emify/retrieval.py)
+RETRIEVAL_INDEX_DIR = os.getenv('EMIFY_RETRIEVAL_DIR', os.path.join(BASE_DIR, 'retrieval'))
+# Precedents added to each prompt (0 disables retrieval)
+RETRIEVAL_TOP_K = int(os.getenv('EMIFY_RETRIEVAL_TOP_K', '3'))
+# Minimum cosine similarity of a precedent
+RETRIEVAL_MIN_SCORE = float(os.getenv('EMIFY_RETRIEVAL_MIN_SCORE', '0.3'))
+
+# Reuse the answer of a near-duplicate document instead of calling the LLM (see emify/reuse.py)
+REUSE_ANSWERS = os.getenv('EMIFY_REUSE_ANSWERS', '1') == '1'
+# Minimum estimated Jaccard similarity of a claim or statement to its stored counterpart
+REUSE_CLAIM_THRESHOLD = float(os.getenv('EMIFY_REUSE_CLAIM_THRESHOLD', '0.8'))
+# Share of the statements that must have a near-duplicate in the answered document
+REUSE_STATEMENT_COVERAGE = float(os.getenv('EMIFY_REUSE_STATEMENT_COVERAGE', '0.8'))
 
 
 # Quick-start development settings - unsuitable for production
@@ -46,11 +145,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'emify.tracing.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'emify.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,7 +183,7 @@ WSGI_APPLICATION = 'emify.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('EMIFY_DB_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
@@ -0,0 +1,279 @@
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .profiling import sync_to_async
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing stays within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.05
+
+_calls: Dict[str, Future] = {}
+_lock = threading.Lock()
+_stats = {'leaders': 0, 'shared_in_process': 0, 'shared_across_processes': 0}
+# Running async computations, referenced so they are not garbage collected
+_tasks = set()
+
+
+def flight_key(*parts: Optional[str]) -> str:
+    """Key of a computation from the hashes it depends on (document, template, ...)."""
+    return ':'.join(part or '-' for part in parts)
+
+
+def _join(key: str) -> Tuple[Future, bool]:
+    """Return the call for key and whether the caller leads it."""
+    with _lock:
+        call = _calls.get(key)
+        if call is not None:
+            _stats['shared_in_process'] += 1
+            return call, False
+        call = _calls[key] = Future()
+        _stats['leaders'] += 1
+        return call, True
+
+
+def _finish(key: str, call: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+    with _lock:
+        del _calls[key]
+    if error is not None:
+        call.set_exception(error)
+    else:
+        call.set_result(result)
+
+
+class _Lease:
+    """
+    Cross-process lease on a key: an flock on a lock file of its own.
+
+    The leader writes its result next to the lock before releasing it.
+    Processes that waited for the lease read that result instead of
+    computing it again, if it was finished after they started waiting.
+    The kernel drops the lock when a process dies, so a crashed leader
+    never blocks the others.
+    """
+
+    def __init__(self, key: str):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        directory = settings.SINGLE_FLIGHT_DIR
+        self.key = key
+        self.lock_path = os.path.join(directory, f"{digest}.lock")
+        self.result_path = os.path.join(directory, f"{digest}.result")
+        self.waiting_since = time.time()
+        self._fd = None
+
+    def try_acquire(self) -> bool:
+        while True:
+            if self._fd is None:
+                os.makedirs(settings.SINGLE_FLIGHT_DIR, exist_ok=True)
+                self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                current = os.stat(self.lock_path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current == os.fstat(self._fd).st_ino:
+                # Marks the lock file as used, so _sweep() keeps it
+                os.utime(self._fd)
+                return True
+            # Swept while we waited: lock the file that replaced it
+            self.release()
+
+    def shared_result(self) -> Tuple[bool, Any]:
+        """Return (True, result) if another process finished the computation while we waited."""
+        try:
+            with open(self.result_path, 'rb') as f:
+                key, finished_at, result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+        if key != self.key or finished_at < self.waiting_since:
+            return False, None
+        return True, result
+
+    def store(self, result: Any) -> None:
+        try:
+            temporary = f"{self.result_path}.{os.getpid()}.tmp"
+            with open(temporary, 'wb') as f:
+                pickle.dump((self.key, time.time(), result), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.result_path)
+        except (OSError, pickle.PicklingError, TypeError):
+            logger.exception("Storing the shared result of %s failed", self.key)
+        _sweep()
+
+    def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def timed_out(self) -> bool:
+        return time.time() - self.waiting_since > settings.SINGLE_FLIGHT_WAIT_TIMEOUT
+
+
+_last_sweep = 0.0
+
+
+def _sweep() -> None:
+    """
+    Delete results and lock files older than SINGLE_FLIGHT_WAIT_TIMEOUT, at most once per timeout.
+
+    Such a result was finished before any process still waiting started
+    waiting, so nobody can use it any more. A lock file is only deleted
+    while nobody holds it; the lock is taken for the deletion.
+    """
+    global _last_sweep
+    now = time.time()
+    with _lock:
+        if now - _last_sweep < settings.SINGLE_FLIGHT_WAIT_TIMEOUT:
+            return
+        _last_sweep = now
+    with os.scandir(settings.SINGLE_FLIGHT_DIR) as entries:
+        for entry in entries:
+            try:
+                if now - entry.stat().st_mtime <= settings.SINGLE_FLIGHT_WAIT_TIMEOUT:
+                    continue
+                if entry.name.endswith('.result'):
+                    os.remove(entry.path)
+                elif entry.name.endswith('.lock'):
+                    _remove_lock(entry.path)
+            except OSError:
+                pass
+
+
+def _remove_lock(path: str) -> None:
+    fd = os.open(path, os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return
+    else:
+        os.remove(path)
+    finally:
+        os.close(fd)
+
+
+def _count_shared() -> None:
+    with _lock:
+        _stats['shared_across_processes'] += 1
+
+
+def _cross_process() -> bool:
+    return fcntl is not None and settings.SINGLE_FLIGHT_ACROSS_PROCESSES
+
+
+def _lead(key: str, function: Callable, args: tuple) -> Any:
+    if not _cross_process():
+        return function(*args)
+    lease = _Lease(key)
+    try:
+        while not lease.try_acquire():
+            if lease.timed_out():
+                logger.warning("Waiting for %s in another process timed out, computing it here", key)
+                return function(*args)
+            time.sleep(POLL_INTERVAL)
+        found, result = lease.shared_result()
+        if found:
+            _count_shared()
+            return result
+        result = function(*args)
+        lease.store(result)
+        return result
+    finally:
+        lease.release()
+
+
+async def _alead(key: str, function: Callable[..., Awaitable], args: tuple) -> Any:
+    if not _cross_process():
+        return await function(*args)
+    lease = _Lease(key)
+    try:
+        while not await sync_to_async(lease.try_acquire, thread_sensitive=False)():
+            if lease.timed_out():
+                logger.warning("Waiting for %s in another process timed out, computing it here", key)
+                return await function(*args)
+            await asyncio.sleep(POLL_INTERVAL)
+        found, result = await sync_to_async(lease.shared_result, thread_sensitive=False)()
+        if found:
+            _count_shared()
+            return result
+        result = await function(*args)
+        await sync_to_async(lease.store, thread_sensitive=False)(result)
+        return result
+    finally:
+        lease.release()
+
+
+def coalesce(key: str, function: Callable, *args: Any) -> Any:
+    """
+    Run function(*args) once for all concurrent callers with the same key.
+
+    The first caller computes the result; callers arriving while it runs,
+    in other threads or (through the lease directory) other processes, wait
+    and get the same result or exception. Results are not kept after the
+    computation finished; caching is left to the caller.
+
+    Args:
+        key: Identifies the computation, see flight_key()
+        function: The computation
+        *args: Its arguments
+
+    Returns:
+        The result of the computation
+    """
+    if not settings.SINGLE_FLIGHT:
+        return function(*args)
+    call, leader = _join(key)
+    if not leader:
+        return call.result()
+    try:
+        result = _lead(key, function, args)
+    except BaseException as e:
+        _finish(key, call, error=e)
+        raise
+    _finish(key, call, result)
+    return result
+
+
+async def acoalesce(key: str, function: Callable[..., Awaitable], *args: Any) -> Any:
+    """
+    Async variant of coalesce() for coroutine functions.
+
+    Sync and async callers of the same key share one computation. The
+    computation runs as its own task, so a leader whose request is
+    cancelled does not cancel it for the callers waiting on it.
+    """
+    if not settings.SINGLE_FLIGHT:
+        return await function(*args)
+    call, leader = _join(key)
+    if leader:
+        async def run():
+            try:
+                result = await _alead(key, function, args)
+            except BaseException as e:
+                _finish(key, call, error=e)
+            else:
+                _finish(key, call, result)
+        task = asyncio.ensure_future(run())
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    return await asyncio.shield(asyncio.wrap_future(call))
+
+
+def coalescing_stats() -> Dict[str, int]:
+    """Computations led, and calls that shared a result within this process or from another one."""
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,335 @@
+import copy
+import hashlib
+import io
+import os
+import posixpath
+import threading
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Union
+
+from lxml import etree
+
+from .parsing import replace_placeholders_in_docx
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+STYLE_MAP_CACHE_SIZE = 32
+# Elements whose w:val refers to a style by its id
+STYLE_REFERENCES = tuple(f'{W}{name}' for name in (
+    'pStyle', 'rStyle', 'tblStyle', 'basedOn', 'next', 'link', 'numStyleLink', 'styleLink'))
+# Parts besides the main document whose paragraphs and runs refer to styles
+STYLED_PARTS = ('header', 'footer', 'footnotes', 'endnotes', 'comments')
+# Page setup taken from the template's last section, in the order CT_SectPr defines
+SECTION_ORDER = (
+    'headerReference', 'footerReference', 'footnotePr', 'endnotePr', 'type', 'pgSz', 'pgMar', 'paperSrc',
+    'pgBorders', 'lnNumType', 'pgNumType', 'cols', 'formProt', 'vAlign', 'noEndnote', 'titlePg',
+    'textDirection', 'bidi', 'rtlGutter', 'docGrid', 'printerSettings', 'sectPrChange',
+)
+SECTION_PROPERTIES = ('pgSz', 'pgMar', 'cols', 'docGrid')
+
+
+@dataclass(frozen=True)
+class _SplicedPart:
+    """A template part kept serialized, split where elements of the generated document are inserted."""
+    head: bytes
+    middle: bytes
+    tail: bytes
+
+
+@dataclass(frozen=True)
+class StyleMap:
+    """
+    The formatting of a DOCX template: its styles, list numbering, theme and page setup.
+
+    Built once per template by extract_style_map. The styles and numbering
+    are kept serialized, so applying the map splices the generated
+    document's own definitions into them instead of parsing the template again.
+    """
+    key: str
+    styles: Optional[_SplicedPart]
+    style_ids: FrozenSet[str]
+    # (style type, lower-case name) -> style id, to match built-in styles whose ids are localised
+    style_names: Dict[Tuple[str, str], str]
+    numbering: Optional[_SplicedPart]
+    num_ids: FrozenSet[str]
+    next_abstract_id: int
+    theme: Optional[bytes]
+    section: Tuple[Any, ...]
+
+
+def _rels_name(part: str) -> str:
+    return posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+
+
+def _related_parts(archive: zipfile.ZipFile, part: str) -> Dict[str, List[str]]:
+    """Names of the parts a part refers to, by relationship type (the last segment of its URI)."""
+    try:
+        rels = etree.fromstring(archive.read(_rels_name(part)))
+    except KeyError:
+        return {}
+    related: Dict[str, List[str]] = {}
+    for rel in rels:
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target')
+        name = target[1:] if target.startswith('/') else posixpath.normpath(
+            posixpath.join(posixpath.dirname(part), target))
+        related.setdefault(rel.get('Type').rsplit('/', 1)[-1], []).append(name)
+    return related
+
+
+def _has_rels(archive: zipfile.ZipFile, part: str) -> bool:
+    return _rels_name(part) in archive.NameToInfo
+
+
+def _serialize(element) -> bytes:
+    return etree.tostring(element, with_tail=False)
+
+
+def _document(root) -> bytes:
+    return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+
+def _splice(root, first_middle: str, after_middle: Tuple[str, ...] = ()) -> _SplicedPart:
+    """
+    Serialize a part so elements can be inserted before the first child named
+    first_middle and before the first child named in after_middle (or the end).
+
+    A part without first_middle children gets an empty middle, so both
+    insertions land before the first after_middle child.
+    """
+    shell = etree.Element(root.tag, dict(root.attrib), nsmap=root.nsmap)
+    shell.text = ''
+    opening, closing = _document(shell).rsplit(b'</', 1)
+    pieces: List[List[bytes]] = [[opening], [], []]
+    section = 0
+    for child in root:
+        if not isinstance(child.tag, str):
+            continue
+        name = etree.QName(child).localname
+        if section == 0 and name == first_middle:
+            section = 1
+        if name in after_middle:
+            section = 2
+        pieces[section].append(_serialize(child))
+    pieces[2].append(b'</' + closing)
+    return _SplicedPart(*(b''.join(piece) for piece in pieces))
+
+
+def extract_style_map(source: Union[str, bytes], key: Optional[str] = None) -> StyleMap:
+    """
+    Read the style map of a DOCX template.
+
+    Parts with relationships of their own (e.g. picture bullets, or a theme
+    with images) are left out, since their targets would not exist in the
+    generated document.
+
+    Args:
+        source: Path or content of the template
+        key: Hash of the template (computed from the content if not given)
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            source = f.read()
+    key = key or hashlib.sha256(source).hexdigest()
+    with zipfile.ZipFile(io.BytesIO(source)) as archive:
+        main = _related_parts(archive, '')['officeDocument'][0]
+        parts = _related_parts(archive, main)
+
+        def usable(kind: str) -> Optional[str]:
+            names = parts.get(kind)
+            return names[0] if names and not _has_rels(archive, names[0]) else None
+
+        styles, style_ids, style_names = None, frozenset(), {}
+        if usable('styles'):
+            root = etree.fromstring(archive.read(usable('styles')))
+            styles = _splice(root, 'style')
+            style_ids = frozenset(style.get(f'{W}styleId') for style in root.iterfind(f'{W}style'))
+            for style in root.iterfind(f'{W}style'):
+                name = style.find(f'{W}name')
+                if name is not None:
+                    style_names.setdefault((style.get(f'{W}type'), name.get(f'{W}val', '').lower()),
+                                           style.get(f'{W}styleId'))
+
+        numbering, num_ids, next_abstract_id = None, frozenset(), 0
+        if usable('numbering'):
+            root = etree.fromstring(archive.read(usable('numbering')))
+            numbering = _splice(root, 'num', ('numIdMacAtCleanup',))
+            num_ids = frozenset(num.get(f'{W}numId') for num in root.iterfind(f'{W}num'))
+            next_abstract_id = 1 + max((int(abstract.get(f'{W}abstractNumId'))
+                                        for abstract in root.iterfind(f'{W}abstractNum')), default=-1)
+
+        theme = archive.read(usable('theme')) if usable('theme') else None
+
+        sect_pr = etree.fromstring(archive.read(main)).find(f'{W}body/{W}sectPr')
+        # Copied out of the document tree, which is not kept
+        section = tuple(copy.deepcopy(child) for child in (sect_pr if sect_pr is not None else ())
+                        if isinstance(child.tag, str) and etree.QName(child).localname in SECTION_PROPERTIES)
+    return StyleMap(key, styles, style_ids, style_names, numbering, num_ids, next_abstract_id, theme, section)
+
+
+def _rename_styles(root, renames: Dict[str, str]) -> None:
+    if renames:
+        for element in root.iter(*STYLE_REFERENCES):
+            value = element.get(f'{W}val')
+            if value in renames:
+                element.set(f'{W}val', renames[value])
+
+
+def _merge_styles(style_map: StyleMap, data: bytes) -> Tuple[bytes, Dict[str, str]]:
+    """
+    The template's styles plus those of the generated document it lacks.
+
+    Styles the template defines under another id but the same name (built-in
+    styles are named in English whatever the language of Word) are mapped
+    to the template's id.
+
+    Returns:
+        Tuple of (styles part, generated style id -> template style id)
+    """
+    root = etree.fromstring(data)
+    renames, extra = {}, []
+    for style in root.iterfind(f'{W}style'):
+        style_id = style.get(f'{W}styleId')
+        if style_id in style_map.style_ids:
+            continue
+        name = style.find(f'{W}name')
+        match = None if name is None else style_map.style_names.get(
+            (style.get(f'{W}type'), name.get(f'{W}val', '').lower()))
+        if match:
+            renames[style_id] = match
+        else:
+            extra.append(style)
+    for style in extra:
+        _rename_styles(style, renames)
+    part = style_map.styles
+    return part.head + part.middle + b''.join(map(_serialize, extra)) + part.tail, renames
+
+
+def _merge_numbering(style_map: StyleMap, data: bytes) -> bytes:
+    """The template's lists plus the lists of the generated document whose ids the template does not use."""
+    root = etree.fromstring(data)
+    abstracts = {abstract.get(f'{W}abstractNumId'): abstract for abstract in root.iterfind(f'{W}abstractNum')}
+    abstract_ids: Dict[str, str] = {}
+    carried_abstracts, carried_nums = [], []
+    for num in root.iterfind(f'{W}num'):
+        reference = num.find(f'{W}abstractNumId')
+        if num.get(f'{W}numId') in style_map.num_ids or reference is None:
+            continue
+        old_id = reference.get(f'{W}val')
+        if old_id not in abstract_ids:
+            abstract = abstracts.get(old_id)
+            if abstract is None:
+                continue
+            # Renumbered after the template's own definitions
+            abstract_ids[old_id] = str(style_map.next_abstract_id + len(abstract_ids))
+            abstract.set(f'{W}abstractNumId', abstract_ids[old_id])
+            carried_abstracts.append(abstract)
+        reference.set(f'{W}val', abstract_ids[old_id])
+        carried_nums.append(num)
+    part = style_map.numbering
+    return (part.head + b''.join(map(_serialize, carried_abstracts)) + part.middle
+            + b''.join(map(_serialize, carried_nums)) + part.tail)
+
+
+def _set_page_setup(document, section: Tuple[Any, ...]) -> None:
+    """Give every section of the document the template's page size, margins, columns and grid."""
+    for sect_pr in document.iter(f'{W}sectPr'):
+        if sect_pr.getparent().tag == f'{W}sectPrChange':
+            # The tracked previous properties of a section
+            continue
+        for prop in section:
+            replacement = copy.deepcopy(prop)
+            existing = sect_pr.find(prop.tag)
+            if existing is not None:
+                sect_pr.replace(existing, replacement)
+                continue
+            position = SECTION_ORDER.index(etree.QName(prop).localname)
+            later = next((child for child in sect_pr if isinstance(child.tag, str)
+                          and etree.QName(child).localname in SECTION_ORDER
+                          and SECTION_ORDER.index(etree.QName(child).localname) > position), None)
+            if later is not None:
+                later.addprevious(replacement)
+            else:
+                sect_pr.append(replacement)
+
+
+def apply_style_map(path: str, style_map: StyleMap) -> None:
+    """
+    Format a generated DOCX like the template of a style map, in place.
+
+    The styles, list numbering and theme of the template replace those of
+    the document (definitions only the document has are kept), and its page
+    setup is applied to every section. Parts the document does not have are
+    not added.
+    """
+    with zipfile.ZipFile(path) as archive:
+        main = _related_parts(archive, '')['officeDocument'][0]
+        parts = _related_parts(archive, main)
+        replaced: Dict[str, bytes] = {}
+        renames: Dict[str, str] = {}
+        if style_map.styles is not None and parts.get('styles'):
+            replaced[parts['styles'][0]], renames = _merge_styles(style_map, archive.read(parts['styles'][0]))
+        if style_map.numbering is not None and parts.get('numbering'):
+            replaced[parts['numbering'][0]] = _merge_numbering(style_map, archive.read(parts['numbering'][0]))
+        if style_map.theme is not None and parts.get('theme'):
+            replaced[parts['theme'][0]] = style_map.theme
+
+        document = etree.fromstring(archive.read(main))
+        _rename_styles(document, renames)
+        _set_page_setup(document, style_map.section)
+        replaced[main] = _document(document)
+        if renames:
+            for kind in STYLED_PARTS:
+                for name in parts.get(kind, ()):
+                    root = etree.fromstring(archive.read(name))
+                    _rename_styles(root, renames)
+                    replaced[name] = _document(root)
+
+        with zipfile.ZipFile(f"{path}.tmp", 'w', zipfile.ZIP_DEFLATED) as output:
+            for item in archive.infolist():
+                data = replaced[item.filename] if item.filename in replaced else archive.read(item)
+                output.writestr(zipfile.ZipInfo(item.filename, item.date_time), data, zipfile.ZIP_DEFLATED)
+    os.replace(f"{path}.tmp", path)
+
+
+_style_maps: 'OrderedDict[str, StyleMap]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_style_map(key: str, path: str) -> StyleMap:
+    """Return the style map of a registered template, reading the template only the first time its hash is seen."""
+    with _lock:
+        style_map = _style_maps.get(key)
+        if style_map is not None:
+            _style_maps.move_to_end(key)
+            return style_map
+    style_map = extract_style_map(path, key)
+    with _lock:
+        _style_maps[key] = style_map
+        while len(_style_maps) > STYLE_MAP_CACHE_SIZE:
+            _style_maps.popitem(last=False)
+    return style_map
+
+
+def render_docx(
+    template_path: str,
+    output_path: str,
+    replacements: Dict[str, Any],
+    locations=None,
+    style: Optional[Tuple[str, str]] = None
+) -> None:
+    """
+    Fill a DOCX template and format the result like a style template.
+
+    Args:
+        template_path: The DOCX template with the placeholders
+        output_path: Where the filled DOCX is written
+        replacements: Placeholder values by name
+        locations: Paragraphs holding placeholders, from the template inventory
+        style: (key, path) of the registered template whose formatting is applied, if any
+    """
+    replace_placeholders_in_docx(template_path, output_path, replacements, locations)
+    if style is not None:
+        apply_style_map(output_path, get_style_map(*style))
@@ -0,0 +1,120 @@
+import hashlib
+import os
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+
+from .models import Template
+from .placeholders import PlaceholderInventory, cache_inventory, cached_inventory, scan_docx, scan_text
+
+DEFAULT_DOCX_TEMPLATE = os.path.join(settings.BASE_DIR, 'emify', 'template.docx')
+TEMPLATE_DIR = 'templates'
+
+
+def register_template(
+    name: str = '',
+    text: Optional[str] = None,
+    docx: Union[bytes, object, None] = None,
+    placeholder_regex: Optional[str] = None
+) -> Tuple[Template, bool]:
+    """
+    Store a template and its placeholder inventory, once per template hash.
+
+    A DOCX template is kept in the file store and its placeholders are found
+    in its paragraphs; a text template is scanned with placeholder_regex.
+
+    Args:
+        name: Display name
+        text: The template text, for text templates
+        docx: The DOCX content or an uploaded file, for DOCX templates
+        placeholder_regex: Regex of the placeholders of a text template (JS-style literals are accepted)
+
+    Returns:
+        Tuple of (template, created)
+
+    Raises:
+        ValueError: If neither text nor a DOCX is given, the DOCX cannot be read or the regex does not compile
+    """
+    file_name = ''
+    if docx is not None:
+        data = docx if isinstance(docx, bytes) else b''.join(docx.chunks())
+        existing = Template.objects.filter(key=hashlib.sha256(data).hexdigest()).first()
+        if existing:
+            return existing, False
+        try:
+            text, inventory = scan_docx(data)
+        except Exception as e:
+            raise ValueError(f"Not a readable DOCX file: {e}")
+        file_name = default_storage.save(os.path.join(TEMPLATE_DIR, f"{inventory.key}.docx"), ContentFile(data))
+    elif text:
+        inventory = scan_text(text, placeholder_regex)
+        existing = Template.objects.filter(key=inventory.key).first()
+        if existing:
+            return existing, False
+    else:
+        raise ValueError("A template needs text or a DOCX file")
+
+    try:
+        template = Template.objects.create(
+            key=inventory.key, name=name, file=file_name, text=text, placeholder_regex=inventory.regex,
+            placeholders=list(inventory.placeholders), placeholder_count=inventory.count,
+            locations=inventory.to_dict()['locations'],
+        )
+    except IntegrityError:
+        # A concurrent request registered the same template first
+        existing = Template.objects.filter(key=inventory.key).first()
+        if existing is None:
+            raise
+        if file_name:
+            default_storage.delete(file_name)
+        return existing, False
+    cache_inventory(inventory)
+    return template, True
+
+
+def get_template(key: str) -> Optional[Template]:
+    return Template.objects.filter(key=key).first()
+
+
+def style_template(key: str) -> Template:
+    """
+    A registered DOCX template whose formatting is applied to generated documents.
+
+    Raises:
+        ValueError: If there is no such template or it is a text template
+    """
+    template = get_template(key)
+    if template is None:
+        raise ValueError(f"Unknown style template {key}")
+    if not template.is_docx:
+        raise ValueError(f"Style template {key} is a text template")
+    return template
+
+
+def template_inventory(template: Template) -> PlaceholderInventory:
+    """Return the stored inventory of a registered template without scanning it again."""
+    inventory = cached_inventory(template.key)
+    if inventory is None:
+        inventory = cache_inventory(PlaceholderInventory.from_dict({
+            'key': template.key,
+            'regex': template.placeholder_regex,
+            'placeholders': template.placeholders,
+            'locations': template.locations,
+        }))
+    return inventory
+
+
+@lru_cache(maxsize=None)
+def _default_docx() -> bytes:
+    with open(DEFAULT_DOCX_TEMPLATE, 'rb') as f:
+        return f.read()
+
+
+def default_docx_template() -> Template:
+    """The DOCX template used by send_file, registered on first use."""
+    template, _ = register_template('Klageantwort', docx=_default_docx())
+    return template
@@ -0,0 +1,150 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from emify.ai_lawyer_service import get_placeholder_values
+from emify.llm_scheduler import BATCH, INTERACTIVE, LlmScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(600, clock)
+        self.assertEqual(bucket.wait_time(600), 0)
+        bucket.take(600)
+        self.assertAlmostEqual(bucket.wait_time(100), 10)
+        clock.now = 5
+        self.assertAlmostEqual(bucket.available, 50)
+        clock.now = 1000
+        self.assertEqual(bucket.available, 600)
+
+    def test_debt_and_oversized_requests(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock)
+        bucket.take(120)
+        # Used more than it held: waits until the debt is refilled
+        self.assertAlmostEqual(bucket.wait_time(1), 61)
+        clock.now = 120
+        # Larger than the bucket: waits for a full one only
+        self.assertEqual(bucket.wait_time(1000), 0)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(0)
+        bucket.take(10 ** 9)
+        self.assertTrue(bucket.unlimited)
+        self.assertEqual(bucket.wait_time(10 ** 9), 0)
+
+
+class LlmSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.order = []
+
+    async def _job(self, scheduler, name, priority=INTERACTIVE, user='', hold=None):
+        async with scheduler.slot(priority, user, 100) as job:
+            self.order.append(name)
+            if hold is not None:
+                await hold.wait()
+            job.record(80, 30)
+
+    async def _queue(self, scheduler, *jobs):
+        """Start jobs behind a blocker holding every slot, in order, then free the slots."""
+        release = asyncio.Event()
+        blockers = [asyncio.ensure_future(self._job(scheduler, None, hold=release))
+                    for _ in range(scheduler.max_concurrency)]
+        await asyncio.sleep(0)
+        tasks = []
+        for name, priority, user in jobs:
+            tasks.append(asyncio.ensure_future(self._job(scheduler, name, priority, user)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*blockers, *tasks)
+        return [name for name in self.order if name is not None]
+
+    async def test_interactive_before_batch(self):
+        scheduler = LlmScheduler(0, 0, max_concurrency=1)
+        order = await self._queue(scheduler, ('batch-1', BATCH, 'a'), ('batch-2', BATCH, 'a'),
+                                  ('interactive', INTERACTIVE, 'b'))
+        self.assertEqual(order, ['interactive', 'batch-1', 'batch-2'])
+
+    async def test_users_take_turns(self):
+        scheduler = LlmScheduler(0, 0, max_concurrency=1)
+        order = await self._queue(scheduler, ('a1', BATCH, 'a'), ('a2', BATCH, 'a'), ('a3', BATCH, 'a'),
+                                  ('b1', BATCH, 'b'))
+        self.assertEqual(order, ['a1', 'b1', 'a2', 'a3'])
+
+    async def test_batch_leaves_room_for_interactive(self):
+        scheduler = LlmScheduler(0, 0, max_concurrency=2, batch_max_concurrency=1)
+        release = asyncio.Event()
+        batch = [asyncio.ensure_future(self._job(scheduler, f'batch-{i}', BATCH, hold=release)) for i in range(2)]
+        await asyncio.sleep(0.01)
+        self.assertEqual(scheduler.state()['running'], {INTERACTIVE: 0, BATCH: 1})
+        await asyncio.wait_for(self._job(scheduler, 'interactive'), 1)
+        release.set()
+        await asyncio.gather(*batch)
+        self.assertEqual(self.order, ['batch-0', 'interactive', 'batch-1'])
+
+    async def test_cancelled_job_frees_its_place(self):
+        scheduler = LlmScheduler(0, 0, max_concurrency=1)
+        release = asyncio.Event()
+        blocker = asyncio.ensure_future(self._job(scheduler, 'blocker', hold=release))
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(self._job(scheduler, 'cancelled'))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        release.set()
+        await blocker
+        await asyncio.wait_for(self._job(scheduler, 'next'), 1)
+        self.assertEqual(self.order, ['blocker', 'next'])
+        self.assertEqual(scheduler.state()['running'], {INTERACTIVE: 0, BATCH: 0})
+
+    async def test_token_limit_holds_back_jobs(self):
+        # 100 tokens per job against 150 per minute: the second job waits for the bucket
+        scheduler = LlmScheduler(0, 150, max_concurrency=2)
+        await self._job(scheduler, 'first')
+        second = asyncio.ensure_future(self._job(scheduler, 'second'))
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.order, ['first'])
+        self.assertEqual(scheduler.state()['queued'][INTERACTIVE], 1)
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+
+    async def test_usage_totals(self):
+        scheduler = LlmScheduler(0, 0, max_concurrency=2)
+        await asyncio.gather(self._job(scheduler, 'a'), self._job(scheduler, 'b', BATCH))
+        totals = scheduler.state()['totals']
+        self.assertEqual(totals[INTERACTIVE]['jobs'], 1)
+        self.assertEqual(totals[BATCH]['input_tokens'], 80)
+        self.assertEqual(totals[BATCH]['output_tokens'], 30)
+
+    def test_unknown_priority(self):
+        with self.assertRaises(ValueError):
+            LlmScheduler(0, 0, max_concurrency=1).slot('urgent')
+
+
+class FakeResponses:
+    async def parse(self, **kwargs):
+        return SimpleNamespace(output_parsed=SimpleNamespace(values=['Die Klage sei abzuweisen']),
+                               usage=SimpleNamespace(input_tokens=1200, output_tokens=300))
+
+
+class SyncEntryPointTests(SimpleTestCase):
+    def test_goes_through_the_scheduler(self):
+        scheduler = LlmScheduler(0, 0, max_concurrency=1)
+        client = SimpleNamespace(responses=FakeResponses())
+        with mock.patch('emify.ai_lawyer_service.get_scheduler', return_value=scheduler), \
+                mock.patch('emify.ai_lawyer_service.get_async_client', return_value=client):
+            values, prompt = get_placeholder_values({'text': 'Klageschrift'}, {'text': '${counter}'},
+                                                    priority=BATCH, user='kanzlei')
+        self.assertEqual(values, ['Die Klage sei abzuweisen'])
+        self.assertEqual(prompt['usage']['priority'], BATCH)
+        self.assertEqual(scheduler.state()['totals'][BATCH]['input_tokens'], 1200)
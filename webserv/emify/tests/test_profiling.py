@@ -0,0 +1,63 @@
+import io
+import json
+import os
+import pstats
+import tempfile
+from unittest import mock
+
+import docx
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from emify import profiling
+from emify.profiling import PROFILE_ID_HEADER, RequestProfile, sync_to_async
+
+
+def _hash(data: bytes) -> int:
+    return sum(data)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(DEBUG=True, PROFILING=True, PROFILE_DIR=os.path.join(directory.name, 'profiles'),
+                                     MEDIA_ROOT=os.path.join(directory.name, 'media'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    async def test_sync_to_async_threads_are_profiled(self):
+        profile = RequestProfile('GET', '/', '')
+        token = profiling._current.set(profile)
+        try:
+            self.assertEqual(await sync_to_async(_hash, thread_sensitive=False)(b'abc'), 294)
+        finally:
+            profiling._current.reset(token)
+        self.assertEqual([name for name, _ in profile._threads], ['_hash'])
+        self.assertTrue(any(function == '_hash' for _, _, function in profile._threads[0][1]))
+
+    async def test_unprofiled_requests_are_not_recorded(self):
+        self.assertEqual(await sync_to_async(_hash, thread_sensitive=False)(b'a'), 97)
+
+    async def test_sync_view_under_asgi(self):
+        buffer = io.BytesIO()
+        docx.Document().save(buffer)
+        upload = SimpleUploadedFile('klage.docx', buffer.getvalue())
+        with mock.patch('subprocess.run', side_effect=FileNotFoundError('unoconv')):
+            response = await self.async_client.post('/upload/?profile=1', {'file': upload})
+        self.assertEqual(response.status_code, 302)
+        base = os.path.join(profiling.settings.PROFILE_DIR, response[PROFILE_ID_HEADER])
+        with open(f"{base}.json", encoding='utf-8') as f:
+            self.assertIn('upload_file', json.load(f)['threads'])
+        functions = {(os.path.basename(filename), function)
+                     for filename, _, function in pstats.Stats(f"{base}.prof").stats}
+        self.assertIn(('ingest.py', 'hash_upload'), functions)
+        self.assertIn(('views.py', 'upload_file'), functions)
+
+    def test_sync_view_under_wsgi(self):
+        response = self.client.get('/upload/?profile=1')
+        self.assertEqual(response.status_code, 200)
+        with open(os.path.join(profiling.settings.PROFILE_DIR, f"{response[PROFILE_ID_HEADER]}.json"),
+                  encoding='utf-8') as f:
+            # Profiled by the request's own profiler, not a second one
+            self.assertEqual(json.load(f)['threads'], [])
@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from emify.retrieval import ENTRIES_FILE, OFFSETS_FILE, VECTORS_FILE, RetrievalIndex
+
+DOCUMENTS = [
+    ('a', 'Die Beklagte sei zu verurteilen, der Klägerin CHF 5000 zu bezahlen', {'answer': 'Mietzins'}),
+    ('b', 'Die Kündigung des Arbeitsvertrags sei aufzuheben', {'answer': 'Kündigung'}),
+    ('c', 'Der Beklagte sei zur Herausgabe des Fahrzeugs zu verpflichten', {'answer': 'Fahrzeug'}),
+]
+
+
+class RetrievalIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = RetrievalIndex(directory.name, dim=64)
+        self.index.build(DOCUMENTS[:1])
+
+    def _append(self, name: str, data: bytes) -> None:
+        with open(os.path.join(self.index.path, name), 'ab') as f:
+            f.write(data)
+
+    def test_entries_after_torn_appends(self):
+        # An entry line written without its offset and vector, then one with its offset only
+        self._append(ENTRIES_FILE, b'{"key": "orphan", "text": "x", "payload": {}}\n')
+        self._append(ENTRIES_FILE, b'{"key": "torn"')
+        with self.assertLogs('emify.retrieval', 'WARNING'):
+            self.index.add(*DOCUMENTS[1])
+        self._append(ENTRIES_FILE, b'{"key": "orphan", "text": "x", "payload": {}}\n')
+        self._append(OFFSETS_FILE, b'\0' * 8)
+        self._append(VECTORS_FILE, b'\0' * 10)
+        with self.assertLogs('emify.retrieval', 'WARNING'):
+            self.assertEqual(list(self.index.entries()), DOCUMENTS[:2])
+            self.index.add(*DOCUMENTS[2])
+        self.assertEqual(list(self.index.entries()), DOCUMENTS)
+        with open(os.path.join(self.index.path, ENTRIES_FILE), 'rb') as f:
+            self.assertNotIn(b'orphan', f.read().split(b'\n', 1)[1])
+        match = self.index.search(DOCUMENTS[2][1], k=1)[0]
+        self.assertEqual((match['key'], match['payload']), ('c', {'answer': 'Fahrzeug'}))
+
+    def test_search_returns_a_key_once(self):
+        self.index.add('a', DOCUMENTS[0][1], {'answer': 'Neu'})
+        self.index.add(*DOCUMENTS[1])
+        matches = self.index.search(DOCUMENTS[0][1], k=3)
+        self.assertEqual([match['key'] for match in matches], ['a', 'b'])
+        self.assertEqual(matches[0]['payload'], {'answer': 'Neu'})
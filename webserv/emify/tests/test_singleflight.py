@@ -0,0 +1,179 @@
+import asyncio
+import fcntl
+import hashlib
+import itertools
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase, override_settings
+
+from emify import singleflight
+from emify.singleflight import _Lease, acoalesce, coalesce, coalescing_stats
+
+FOLLOWERS = 4
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+def _shared(before, kind: str) -> int:
+    return coalescing_stats()[kind] - before[kind]
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SINGLE_FLIGHT=True, SINGLE_FLIGHT_ACROSS_PROCESSES=True,
+                                     SINGLE_FLIGHT_DIR=directory.name, SINGLE_FLIGHT_WAIT_TIMEOUT=10)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.release = threading.Event()
+        self.calls = 0
+
+    def compute(self, value):
+        self.calls += 1
+        self.release.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def _run_threads(self, key: str, value):
+        """Call coalesce from a leader and FOLLOWERS threads that join it while it runs."""
+        before = coalescing_stats()
+        with ThreadPoolExecutor(FOLLOWERS + 1) as executor:
+            futures = [executor.submit(coalesce, key, self.compute, value) for _ in range(FOLLOWERS + 1)]
+            _wait_for(lambda: _shared(before, 'shared_in_process') == FOLLOWERS)
+            self.release.set()
+        return futures
+
+    def test_threads_share_one_call(self):
+        futures = self._run_threads('threads', {'answer': 42})
+        self.assertEqual([future.result() for future in futures], [{'answer': 42}] * (FOLLOWERS + 1))
+        self.assertEqual(self.calls, 1)
+
+    def test_exception_reaches_followers(self):
+        futures = self._run_threads('failing', ValueError('parse failed'))
+        for future in futures:
+            with self.assertRaisesMessage(ValueError, 'parse failed'):
+                future.result()
+        self.assertEqual(self.calls, 1)
+
+    def test_finished_call_is_not_kept(self):
+        self.release.set()
+        self.assertEqual(coalesce('sequential', self.compute, 1), 1)
+        # The result stored for other processes predates this call, so it is computed again
+        self.assertEqual(coalesce('sequential', self.compute, 2), 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_result_of_another_process(self):
+        other = _Lease('shared')
+        self.assertTrue(other.try_acquire())
+        try:
+            with ThreadPoolExecutor(1) as executor:
+                waiting = executor.submit(coalesce, 'shared', self.compute, 'mine')
+                _wait_for(lambda: 'shared' in singleflight._calls)
+                other.store('theirs')
+                other.release()
+                self.assertEqual(waiting.result(5), 'theirs')
+        finally:
+            other.release()
+        self.assertEqual(self.calls, 0)
+
+    def test_stale_result_of_another_process(self):
+        other = _Lease('stale')
+        self.assertTrue(other.try_acquire())
+        other.store('old')
+        time.sleep(0.01)
+        with ThreadPoolExecutor(1) as executor:
+            self.release.set()
+            waiting = executor.submit(coalesce, 'stale', self.compute, 'new')
+            _wait_for(lambda: 'stale' in singleflight._calls)
+            other.release()
+            self.assertEqual(waiting.result(5), 'new')
+        self.assertEqual(self.calls, 1)
+
+    def test_other_keys_do_not_wait(self):
+        # Two keys that shared one of 256 lock files when keys were striped
+        def stripe(key):
+            return int(hashlib.sha256(key.encode('utf-8')).hexdigest(), 16) % 256
+        first = 'answer:0'
+        second = next(key for key in (f'answer:{i}' for i in itertools.count(1)) if stripe(key) == stripe(first))
+        other = _Lease(first)
+        self.assertTrue(other.try_acquire())
+        try:
+            self.release.set()
+            with ThreadPoolExecutor(1) as executor:
+                self.assertEqual(executor.submit(coalesce, second, self.compute, 'value').result(1), 'value')
+        finally:
+            other.release()
+        self.assertNotEqual(_Lease(first).lock_path, _Lease(second).lock_path)
+
+    def test_sweep_keeps_held_locks(self):
+        held, idle = _Lease('held'), _Lease('idle')
+        self.assertTrue(held.try_acquire())
+        self.assertTrue(idle.try_acquire())
+        # Still open, like the lease of a process waiting for the lock
+        fcntl.flock(idle._fd, fcntl.LOCK_UN)
+        for path in (held.lock_path, idle.lock_path):
+            os.utime(path, (0, 0))
+        singleflight._last_sweep = 0.0
+        try:
+            singleflight._sweep()
+            self.assertTrue(os.path.exists(held.lock_path))
+            self.assertFalse(os.path.exists(idle.lock_path))
+        finally:
+            held.release()
+        # The waiting lease locks a new file instead of the deleted one
+        self.assertTrue(idle.try_acquire())
+        self.assertEqual(os.fstat(idle._fd).st_ino, os.stat(idle.lock_path).st_ino)
+        idle.release()
+
+    @override_settings(SINGLE_FLIGHT_ACROSS_PROCESSES=False)
+    def test_in_process_only(self):
+        futures = self._run_threads('local', 'value')
+        self.assertEqual({future.result() for future in futures}, {'value'})
+        self.assertEqual(self.calls, 1)
+
+    async def test_async_callers_share_one_call(self):
+        started, release = asyncio.Event(), asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            started.set()
+            await release.wait()
+            return 'done'
+
+        before = coalescing_stats()
+        callers = [asyncio.ensure_future(acoalesce('async', compute)) for _ in range(FOLLOWERS + 1)]
+        await started.wait()
+        # Cancelling the leader's request does not cancel the computation its followers wait for
+        callers[0].cancel()
+        release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        self.assertIsInstance(results[0], asyncio.CancelledError)
+        self.assertEqual(results[1:], ['done'] * FOLLOWERS)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(_shared(before, 'shared_in_process'), FOLLOWERS)
+
+    async def test_async_exception_reaches_followers(self):
+        started = asyncio.Event()
+
+        async def compute():
+            started.set()
+            await asyncio.sleep(0.05)
+            raise KeyError('missing')
+
+        callers = [asyncio.ensure_future(acoalesce('async-failing', compute)) for _ in range(FOLLOWERS + 1)]
+        await started.wait()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        self.assertTrue(all(isinstance(result, KeyError) for result in results))
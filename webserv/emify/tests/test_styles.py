@@ -0,0 +1,116 @@
+import io
+import os
+import tempfile
+import zipfile
+
+import docx
+from django.test import SimpleTestCase
+from docx.shared import Pt
+from lxml import etree
+
+from emify.styles import W, _splice, apply_style_map, extract_style_map
+
+NUMBERING = f'<w:numbering xmlns:w="{W[1:-1]}">{{}}</w:numbering>'
+ABSTRACT_NUM = '<w:abstractNum w:abstractNumId="{}"><w:lvl w:ilvl="0"><w:numFmt w:val="decimal"/></w:lvl></w:abstractNum>'
+NUM = '<w:num w:numId="{}"><w:abstractNumId w:val="{}"/></w:num>'
+
+
+def _save(document) -> bytes:
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def _with_numbering(source: bytes, numbering: str) -> bytes:
+    """The DOCX with its numbering part replaced."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(source)) as archive, zipfile.ZipFile(buffer, 'w') as output:
+        for item in archive.infolist():
+            data = numbering.encode('utf-8') if item.filename == 'word/numbering.xml' else archive.read(item)
+            output.writestr(item, data)
+    return buffer.getvalue()
+
+
+def _children(part: bytes):
+    return [etree.QName(child).localname for child in etree.fromstring(part) if isinstance(child.tag, str)]
+
+
+class StyleMapTests(SimpleTestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, 'generated.docx')
+        generated = docx.Document()
+        generated.styles.add_style('Schriftsatz', docx.enum.style.WD_STYLE_TYPE.PARAGRAPH)
+        generated.add_paragraph('Klageantwort', style='Schriftsatz')
+        generated.add_paragraph('Erstens', style='List Number')
+        generated.save(self.path)
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def _apply(self, template: bytes) -> None:
+        apply_style_map(self.path, extract_style_map(template))
+
+    def _numbering(self) -> bytes:
+        with zipfile.ZipFile(self.path) as archive:
+            return archive.read('word/numbering.xml')
+
+    def assert_numbering_valid(self, numbering: bytes) -> None:
+        names = _children(numbering)
+        order = ['abstractNum', 'num', 'numIdMacAtCleanup']
+        self.assertEqual(names, sorted(names, key=order.index))
+        root = etree.fromstring(numbering)
+        abstract_ids = [abstract.get(f'{W}abstractNumId') for abstract in root.iterfind(f'{W}abstractNum')]
+        num_ids = [num.get(f'{W}numId') for num in root.iterfind(f'{W}num')]
+        self.assertEqual(len(abstract_ids), len(set(abstract_ids)))
+        self.assertEqual(len(num_ids), len(set(num_ids)))
+        for reference in root.iterfind(f'{W}num/{W}abstractNumId'):
+            self.assertIn(reference.get(f'{W}val'), abstract_ids)
+
+    def test_round_trip(self):
+        template = docx.Document()
+        template.styles['Normal'].font.name = 'Garamond'
+        template.styles['Normal'].font.size = Pt(12)
+        for section in template.sections:
+            section.left_margin = Pt(90)
+        self._apply(_save(template))
+
+        result = docx.Document(self.path)
+        self.assertEqual(result.styles['Normal'].font.name, 'Garamond')
+        self.assertEqual(result.styles['Normal'].font.size, Pt(12))
+        self.assertEqual(result.sections[0].left_margin, Pt(90))
+        # Styles only the generated document defines are kept
+        self.assertEqual([(p.text, p.style.name) for p in result.paragraphs],
+                         [('Klageantwort', 'Schriftsatz'), ('Erstens', 'List Number')])
+        self.assert_numbering_valid(self._numbering())
+
+    def test_template_lists_win(self):
+        template = _with_numbering(_save(docx.Document()), NUMBERING.format(
+            ABSTRACT_NUM.format(0) + NUM.format(1, 0) + '<w:numIdMacAtCleanup w:val="1"/>'))
+        self._apply(template)
+
+        numbering = self._numbering()
+        self.assert_numbering_valid(numbering)
+        root = etree.fromstring(numbering)
+        # numId 1 is the template's; the generated document's own numId 1 is dropped
+        self.assertEqual(root.find(f'{W}num[@{W}numId="1"]/{W}abstractNumId').get(f'{W}val'), '0')
+        self.assertEqual(_children(numbering)[-1], 'numIdMacAtCleanup')
+
+    def test_template_without_num(self):
+        template = _with_numbering(_save(docx.Document()), NUMBERING.format(
+            ABSTRACT_NUM.format(0) + '<w:numIdMacAtCleanup w:val="0"/>'))
+        self._apply(template)
+
+        numbering = self._numbering()
+        self.assert_numbering_valid(numbering)
+        names = _children(numbering)
+        self.assertIn('num', names)
+        self.assertEqual(names[-1], 'numIdMacAtCleanup')
+        docx.Document(self.path)
+
+    def test_splice_without_first_middle(self):
+        root = etree.fromstring(NUMBERING.format(ABSTRACT_NUM.format(0) + '<w:numIdMacAtCleanup w:val="0"/>'))
+        part = _splice(root, 'num', ('numIdMacAtCleanup',))
+        self.assertEqual(part.middle, b'')
+        self.assertIn(b'abstractNum', part.head)
+        self.assertIn(b'numIdMacAtCleanup', part.tail)
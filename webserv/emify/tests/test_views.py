@@ -0,0 +1,82 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+import docx
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from emify.models import UploadedFile
+
+
+class TemplatesViewTests(TestCase):
+    def post(self, data):
+        return self.client.post('/templates/', json.dumps(data), content_type='application/json')
+
+    def test_register_text_template(self):
+        response = self.post({'name': 'Kurz', 'template_text': 'Antwort: ${antwort}'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['placeholders'], ['antwort'])
+        self.assertEqual(self.post({'template_text': 'Antwort: ${antwort}'}).status_code, 200)
+
+    def test_invalid_regex(self):
+        response = self.post({'template_text': 'Antwort: ${antwort}', 'placeholder_regex': '(unclosed'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid placeholder regex', response.json()['error'])
+
+    def test_fields_must_be_strings(self):
+        for data in ({'name': None, 'template_text': 'x'}, {'name': 1, 'template_text': 'x'},
+                     {'template_text': ['x']}, {'template_text': 'x', 'placeholder_regex': 5}):
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+
+
+class PlaceholderValuesViewTests(TestCase):
+    def post(self, data):
+        return self.client.post('/placeholder_values/', json.dumps(data), content_type='application/json')
+
+    def test_mock_values(self):
+        response = self.post({'file_text': 'Klageschrift', 'mock': True, 'fields': ['placeholder_values']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), ['placeholder_values'])
+
+    def test_invalid_regex(self):
+        response = self.post({'file_text': 'Klageschrift', 'placeholder_regex': '(unclosed', 'mock': True})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid placeholder regex', response.json()['error'])
+
+    def test_fields_must_be_strings(self):
+        for data in ({'file_text': ['Klageschrift']}, {'file_text': 42}, {'file_text': 'x', 'template_text': 1},
+                     {'file_text': 'x', 'placeholder_regex': {}}):
+            with self.subTest(data=data):
+                self.assertEqual(self.post(dict(data, mock=True)).status_code, 400)
+
+
+class UploadViewTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_docx_is_stored_when_conversion_cannot_run(self):
+        buffer = io.BytesIO()
+        docx.Document().save(buffer)
+        upload = SimpleUploadedFile('klage.docx', buffer.getvalue())
+        with mock.patch('subprocess.run', side_effect=FileNotFoundError('unoconv')):
+            response = self.client.post('/upload/', {'file': upload})
+        self.assertEqual(response.status_code, 302)
+        document = UploadedFile.objects.get()
+        self.assertTrue(os.path.exists(document.file.path))
+
+
+class JsonObjectTests(TestCase):
+    def test_body_must_be_an_object(self):
+        for url in ('/render/', '/templates/', '/placeholder_values/'):
+            for body in ('[1]', '"file_text"', '["file_text"]', 'null'):
+                with self.subTest(url=url, body=body):
+                    response = self.client.post(url, body, content_type='application/json')
+                    self.assertEqual(response.status_code, 400)
@@ -0,0 +1,16 @@
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from emify.models import Template
+from emify.placeholders import cached_inventory
+from emify.warmup import warm_up_template
+
+
+class WarmUpTests(TestCase):
+    def test_template_inventory_is_cached(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            warm_up_template()
+        template = Template.objects.get()
+        self.assertIsNotNone(cached_inventory(template.key))
+        self.assertIn('counter', cached_inventory(template.key).names)
@@ -0,0 +1,341 @@
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = 'X-Emify-Trace-Id'
+
+
+class SpanContext(NamedTuple):
+    """Trace and span id of a parent span in another process (a job pool worker's view of its caller)."""
+    trace_id: str
+    span_id: str
+
+
+class Span:
+    """One timed operation of a trace; nested spans share the trace id and point to their parent."""
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start', 'end', 'error', '_started')
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        # Wall clock, comparable between the processes of one host
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> Dict[str, Any]:
+        self.end = self.start + (time.perf_counter() - self._started)
+        record = {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'end': self.end,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+        }
+        if self.attributes:
+            record['attributes'] = self.attributes
+        if self.error:
+            record['error'] = self.error
+        return record
+
+
+_current: ContextVar[Union[Span, SpanContext, None]] = ContextVar('emify_span', default=None)
+# Spans of a job pool job, returned to the caller with the job's result instead of being written
+_collected: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar('emify_collected_spans', default=None)
+
+
+class _Recorder:
+    """
+    Buffers the spans of the traces open in this process and appends each
+    trace to TRACE_FILE as one write when its local root span finishes.
+    """
+
+    def __init__(self):
+        self._open: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+
+    def open(self, trace_id: str) -> None:
+        with self._lock:
+            count, records = self._open.get(trace_id, (0, []))
+            self._open[trace_id] = (count + 1, records)
+
+    def add(self, records: List[Dict[str, Any]], close: Optional[str] = None) -> None:
+        """Buffer spans of open traces and write the others; close ends one local root of a trace."""
+        flush = []
+        with self._lock:
+            for record in records:
+                trace = self._open.get(record['trace_id'])
+                if trace is None:
+                    # A job that outlived its request
+                    flush.append(record)
+                else:
+                    trace[1].append(record)
+            if close is not None:
+                count, buffered = self._open.pop(close)
+                if count > 1:
+                    self._open[close] = (count - 1, buffered)
+                else:
+                    flush.extend(buffered)
+        if flush:
+            _write(flush)
+
+
+_recorder = _Recorder()
+_write_lock = threading.Lock()
+
+
+def _write(records: List[Dict[str, Any]]) -> None:
+    data = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in records)
+    path = settings.TRACE_FILE
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if settings.TRACE_FILE_MAX_BYTES and os.path.exists(path) and \
+                    os.path.getsize(path) > settings.TRACE_FILE_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+            # One append per trace; other worker processes append to the same file
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(data)
+    except OSError:
+        logger.exception("Writing %d spans to %s failed", len(records), path)
+
+
+def current_span() -> Union[Span, SpanContext, None]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    parent = _current.get()
+    return parent.trace_id if parent is not None else None
+
+
+@contextmanager
+def span(name: str, trace_id: Optional[str] = None, /, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a span of the current trace, or as the root of a new one.
+
+    Nesting follows the context: asyncio tasks and sync_to_async threads
+    started inside the block get its span as their parent. Exceptions are
+    recorded on the span and re-raised.
+
+    Args:
+        name: What the block does, e.g. a stage or job function name
+        trace_id: Trace to join when there is no current span (e.g. from a request header)
+        **attributes: JSON-serializable details stored with the span
+
+    Yields:
+        The span, or None when tracing is disabled
+    """
+    if not settings.TRACING:
+        yield None
+        return
+    parent = _current.get()
+    if parent is None:
+        current = Span(trace_id or secrets.token_hex(16), None, name, attributes)
+    else:
+        current = Span(parent.trace_id, parent.span_id, name, attributes)
+    # The outermost span of this process writes the trace
+    local_root = not isinstance(parent, Span)
+    collected = _collected.get()
+    if local_root and collected is None:
+        _recorder.open(current.trace_id)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        record = current.finish()
+        if collected is not None:
+            collected.append(record)
+        else:
+            _recorder.add([record], current.trace_id if local_root else None)
+
+
+def record_spans(records: List[Dict[str, Any]]) -> None:
+    """Add the spans a job pool worker returned to their trace."""
+    if records:
+        _recorder.add(records)
+
+
+def run_traced(parent: SpanContext, wrapper: Callable, fn: Callable, *args: Any) -> Tuple[Any, List[Dict[str, Any]]]:
+    """
+    Run a job pool job as a child span of its caller, in the worker process.
+
+    Spans of the job are collected and returned with its result, so the
+    web worker writes them with the rest of the trace.
+
+    Returns:
+        Tuple of (wrapper result, span records)
+    """
+    records: List[Dict[str, Any]] = []
+    collected = _collected.set(records)
+    parent_token = _current.set(parent)
+    try:
+        with span(fn.__name__):
+            outcome = wrapper(fn, *args)
+    finally:
+        _current.reset(parent_token)
+        _collected.reset(collected)
+    return outcome, records
+
+
+class TracingMiddleware:
+    """
+    Trace every request: the request is the root span, and the trace id is
+    returned in the X-Emify-Trace-Id response header. A request that sends
+    that header joins the given trace.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with span(f"{request.method} {request.path}", _incoming_trace_id(request)) as current:
+            response = self.get_response(request)
+            return self._finish(current, response)
+
+    async def __acall__(self, request):
+        with span(f"{request.method} {request.path}", _incoming_trace_id(request)) as current:
+            response = await self.get_response(request)
+            return self._finish(current, response)
+
+    @staticmethod
+    def _finish(current: Optional[Span], response):
+        if current is not None:
+            current.set(status=response.status_code)
+            response[TRACE_HEADER] = current.trace_id
+        return response
+
+
+def _incoming_trace_id(request) -> Optional[str]:
+    trace_id = request.headers.get(TRACE_HEADER, '')
+    # Trace ids end up in file names and log lines
+    return trace_id if trace_id.isalnum() and len(trace_id) <= 64 else None
+
+
+def load_trace(trace_id: str, path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Spans of one trace from the trace file and its rotated predecessor, oldest first."""
+    path = path or settings.TRACE_FILE
+    spans = []
+    for candidate in (f"{path}.1", path):
+        if not os.path.exists(candidate):
+            continue
+        with open(candidate, encoding='utf-8') as f:
+            for line in f:
+                # Cheap substring test before decoding every line of a large file
+                if trace_id in line:
+                    record = json.loads(line)
+                    if record['trace_id'] == trace_id:
+                        spans.append(record)
+    return sorted(spans, key=lambda record: record['start'])
+
+
+def last_trace_id(path: Optional[str] = None, name: str = '') -> Optional[str]:
+    """Id of the last trace written whose root span name starts with name."""
+    path = path or settings.TRACE_FILE
+    if not os.path.exists(path):
+        return None
+    trace_id = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['parent_id'] is None and record['name'].startswith(name):
+                trace_id = record['trace_id']
+    return trace_id
+
+
+def _children(spans: List[Dict[str, Any]]) -> Dict[Optional[str], List[Dict[str, Any]]]:
+    span_ids = {record['span_id'] for record in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for record in spans:
+        # Spans whose parent is missing (e.g. in a rotated file) are shown as roots
+        parent_id = record['parent_id'] if record['parent_id'] in span_ids else None
+        children.setdefault(parent_id, []).append(record)
+    return children
+
+
+def critical_path(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The chain of spans that determined how long a trace took.
+
+    Starting at the root, the child that finished last is followed; before
+    that child started, the child that finished last before its start, and
+    so on. Time on the path not covered by a child is spent in the span
+    itself (or waiting for something untraced).
+
+    Returns:
+        Spans on the critical path, in the order they ran
+    """
+    children = _children(spans)
+    roots = children.get(None, [])
+    if not roots:
+        return []
+
+    def walk(record) -> List[Dict[str, Any]]:
+        path = [record]
+        cursor = record['end']
+        for child in sorted(children.get(record['span_id'], []), key=lambda child: child['end'], reverse=True):
+            if child['end'] <= cursor:
+                path.extend(walk(child))
+                cursor = child['start']
+        return path
+
+    path = walk(max(roots, key=lambda record: record['end'] - record['start']))
+    return sorted(path, key=lambda record: record['start'])
+
+
+def format_trace(spans: List[Dict[str, Any]]) -> str:
+    """Render a trace as an indented tree with durations, marking the critical path with '*'."""
+    if not spans:
+        return "No spans"
+    critical = {record['span_id'] for record in critical_path(spans)}
+    children = _children(spans)
+    origin = min(record['start'] for record in spans)
+    lines = [f"trace {spans[0]['trace_id']}, {len(spans)} spans, "
+             f"{(max(record['end'] for record in spans) - origin) * 1000:.1f} ms"]
+
+    def render(record, depth: int) -> None:
+        details = ' '.join(f"{key}={value}" for key, value in (record.get('attributes') or {}).items())
+        error = f" ERROR {record['error']}" if record.get('error') else ''
+        lines.append(
+            f"{'*' if record['span_id'] in critical else ' '} "
+            f"{(record['start'] - origin) * 1000:9.1f} ms {(record['end'] - record['start']) * 1000:9.1f} ms  "
+            f"{'  ' * depth}{record['name']}  [pid {record['pid']} {record['thread']}]"
+            f"{' ' + details if details else ''}{error}"
+        )
+        for child in sorted(children.get(record['span_id'], []), key=lambda child: child['start']):
+            render(child, depth + 1)
+
+    for root in sorted(children.get(None, []), key=lambda record: record['start']):
+        render(root, 0)
+    return '\n'.join(lines)
@@ -18,7 +18,6 @@ from django.contrib import admin
 from django.urls import path
 from . import views
 from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -28,6 +27,16 @@ urlpatterns = [
 	path('send_file/', views.send_file, name='send_file'),
 	path('placeholder_values/', views.placeholder_values, name='placeholder_values'),
 	path('download/<str:filename>', views.download_file, name='download_file'),
-
-	
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+	path('search/', views.search, name='search'),
+	path('reuse_stats/', views.reuse_stats, name='reuse_stats'),
+	path('llm_usage/', views.llm_usage, name='llm_usage'),
+	path('debug/memory/', views.debug_memory, name='debug_memory'),
+	path('debug/profiles/', views.debug_profiles, name='debug_profiles'),
+	path('debug/traces/<slug:trace_id>/', views.debug_trace, name='debug_trace'),
+	path('debug/profiles/<slug:profile_id>.<str:extension>', views.debug_profile, name='debug_profile'),
+	path('templates/', views.templates, name='templates'),
+	path('batch/', views.batch, name='batch'),
+	path('render/', views.render_klageantworten, name='render_klageantworten'),
+	# Served with ETag and Range support, or handed to the front proxy (see downloads.py)
+	path(settings.MEDIA_URL.lstrip('/') + '<path:path>', views.media_file, name='media_file'),
+]
@@ -1,16 +1,40 @@
-from django.urls import path
-from django.http import HttpResponse, JsonResponse
+from django.urls import path, reverse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from .forms import UploadFileForm
 import os
-from .parsing import get_info, get_replacements, replace_placeholders_in_docx
+from .parsing import get_info
 from .convert_docx_to_pdf import convert_docx_to_pdf
-from .ai_lawyer_service import get_placeholder_values
+from .pipeline import DEFAULT_TEMPLATE_TEXT, generate_klageantwort, generate_placeholder_values
+from .job_pool import JobTimeout, PoolBusy, WorkerCrashed, run_job
+from .ingest import aload_info, ingest_upload
+from .batch import BatchError, collect_files, run_batch
+from .fanout import RENDER_DIR, FanoutError, render_templates, resolve_templates
+from .compression import compressed
+from .downloads import serve_media
+from .llm_scheduler import get_scheduler
+from .memory import memory_report
+from .profiling import list_profiles, profile_path, sync_to_async
+from .tracing import format_trace, load_trace
+from .models import LlmUsage, Template, UploadedFile
+from .placeholders import get_inventory
+from .template_registry import default_docx_template, register_template, style_template
+from .search import search as search_documents
+from .case_store import case_summaries, find_cases
+from .reuse import reuse_stats as get_reuse_stats
 import json
+import logging
+import time
+import uuid
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-import requests
 from django.http import FileResponse, Http404
+from django.db.models import Count, Sum
+from django.utils import timezone
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
 def hello(request):
 	return HttpResponse("Hello, world. You're at the polls index.")
 
@@ -18,73 +42,139 @@ def upload_file(request):
     if request.method == 'POST':
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
-            form.save()
-            return redirect('send_file')
+            document, _ = ingest_upload(form.cleaned_data['file'])
+            return redirect(f"{reverse('send_file')}?document={document.sha256}")
     else:
         form = UploadFileForm()
     return render(request, 'upload.html', {'form': form})
 
-def send_file(request):
-    if request.method == 'GET':
-        upload_dir = 'media/uploads/'
-        
-        files = os.listdir(upload_dir)
-        if not files:
+def latest_upload():
+    """Return the path of the most recent upload as PDF, or None if there is none."""
+    upload_dir = os.path.join(settings.MEDIA_ROOT, 'uploads')
+    files = os.listdir(upload_dir)
+    if not files:
+        return None
+
+    files.sort(key=lambda x: os.path.getmtime(os.path.join(upload_dir, x)))
+    latest_file = os.path.join(upload_dir, files[-1])
+    if latest_file.endswith('.docx'):
+        pdf_file = latest_file.replace('.docx', '.pdf')
+        if not os.path.exists(pdf_file):
+            convert_docx_to_pdf(latest_file, pdf_file)
+        latest_file = pdf_file
+    return latest_file
+
+async def _client_id(request):
+    # Fair queuing and usage accounting group requests by user, or by client address for anonymous ones
+    user = await request.auser()
+    if user.is_authenticated:
+        return user.get_username()
+    return request.META.get('REMOTE_ADDR', '')
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as outfile:
+        json.dump(data, outfile, ensure_ascii=False, indent=2)
+
+async def send_file(request):
+    if request.method != 'GET':
+        return HttpResponse("Only GET requests are allowed", status=405)
+
+    # Uploads made through upload_file are identified by their content hash
+    document = None
+    sha256 = request.GET.get('document')
+    if sha256:
+        document = await UploadedFile.objects.filter(sha256=sha256).afirst()
+        if document is None:
+            raise Http404("Document not found.")
+    else:
+        # Directory listing and DOCX conversion block, so they run in a worker thread
+        latest_file = await sync_to_async(latest_upload, thread_sensitive=False)()
+        if latest_file is None:
             return HttpResponse("No files found in uploads folder")
-            
-        files.sort(key=lambda x: os.path.getmtime(os.path.join(upload_dir, x)))
-        latest_file = os.path.join(upload_dir, files[-1])
-        if latest_file.endswith('.docx'):
-            pdf_file = latest_file.replace('.docx', '.pdf')
-            if not os.path.exists(pdf_file):
-                convert_docx_to_pdf(latest_file, pdf_file)
-            latest_file = pdf_file
         if not os.path.exists(latest_file):
             return HttpResponse("File not found in uploads folder")
-            
-        output_file = 'output.pdf'
-        
-    try:
-        input_file = "emify/template.docx"
-        output_filename = "klageantwort.docx"
-        output_path = os.path.join(settings.MEDIA_ROOT, output_filename)
-
-        # Process input data
-        success = get_info(latest_file)
-        response = requests.post(
-            'http://localhost:8000/placeholder_values/',
-            json={"file_text": success.to_string()}
-        )
 
-        if response.status_code == 200:
-            # Optional: save JSON output
-            json_output_path = os.path.join(settings.MEDIA_ROOT, "output.json")
-            json_data = response.json()  # Extract JSON data once here
-            with open(json_output_path, "w", encoding="utf-8") as outfile:
-                json.dump(response.json(), outfile, ensure_ascii=False, indent=2)
+    # Formatting of a registered template (e.g. a lawyer's empty house-style document)
+    style = None
+    if request.GET.get('style'):
+        try:
+            style = await sync_to_async(style_template, thread_sensitive=False)(request.GET['style'])
+        except ValueError as e:
+            return HttpResponse(str(e), status=400)
 
-            # Replace placeholders and save filled DOCX to MEDIA folder
-            replace_placeholders_in_docx(input_file, output_path, get_replacements(success, json_data))
+    try:
+        template = await sync_to_async(default_docx_template, thread_sensitive=False)()
+        # Every request renders into its own directory, so concurrent requests never share an output file
+        output_dir = f"{RENDER_DIR}/{uuid.uuid4().hex}"
+        await sync_to_async(os.makedirs, thread_sensitive=False)(
+            os.path.join(settings.MEDIA_ROOT, output_dir), exist_ok=True)
+        output_path = os.path.join(settings.MEDIA_ROOT, output_dir, "klageantwort.docx")
 
-            return render(request, 'upload_success.html', {
-                'download_url': f'/media/{output_filename}'
-            })
+        # Process input data (parsed at upload time or CPU-bound in the shared process pool)
+        if document is not None:
+            success = await aload_info(document)
         else:
-            return HttpResponse("Error parsing file")
+            success = await run_job(get_info, latest_file)
+        json_data = await generate_klageantwort(success, template, output_path, document,
+                                                user=await _client_id(request), style=style)
 
+        # Optional: save JSON output next to the document
+        await sync_to_async(_write_json, thread_sensitive=False)(
+            os.path.join(settings.MEDIA_ROOT, output_dir, "output.json"), json_data)
+
+        return render(request, 'upload_success.html', {
+            'download_url': f'{settings.MEDIA_URL}{output_dir}/klageantwort.docx'
+        })
+
+    except PoolBusy:
+        response = HttpResponse("Server is busy, please try again shortly", status=503)
+        response['Retry-After'] = '5'
+        return response
+    except JobTimeout:
+        return HttpResponse("Processing the file took too long", status=504)
+    except WorkerCrashed:
+        return HttpResponse("Processing the file failed, please try again", status=500)
     except ImportError:
         return HttpResponse("Parser module not implemented yet")
     except Exception as e:
         return HttpResponse(f"An error occurred: {str(e)}")
         
 def download_file(request, filename):
-    file_path = os.path.join(settings.MEDIA_ROOT, filename)
-    if os.path.exists(file_path):
-        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=filename)
-    else:
-        raise Http404("File not found.")
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponse("Only GET requests are allowed", status=405)
+    return serve_media(request, filename, as_attachment=True)
+
+def media_file(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponse("Only GET requests are allowed", status=405)
+    return serve_media(request, path)
+# Top-level keys of a /placeholder_values/ response that can be selected with `fields`
+RESPONSE_FIELDS = ('placeholder_values', 'original_text', 'prompt')
+
+def _response_fields(value):
+    """Parse `fields` (a list or a comma-separated string); None selects every field."""
+    if value is None:
+        return RESPONSE_FIELDS
+    if isinstance(value, str):
+        value = [field.strip() for field in value.split(',') if field.strip()]
+    if not isinstance(value, list) or not value:
+        raise ValueError("fields must be a non-empty list or comma-separated string")
+    unknown = [field for field in value if field not in RESPONSE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(map(str, unknown))}; choose from {', '.join(RESPONSE_FIELDS)}")
+    return tuple(value)
+
+async def _ndjson_lines(response, names):
+    # One line per placeholder value, then one line per other selected field
+    for i, value in enumerate(response.pop('placeholder_values', [])):
+        line = {'index': i, 'placeholder': names[i] if i < len(names) else None, 'value': value}
+        yield (json.dumps(line, ensure_ascii=False) + '\n').encode('utf-8')
+    for field, value in response.items():
+        yield (json.dumps({field: value}, ensure_ascii=False) + '\n').encode('utf-8')
+
 @csrf_exempt
-def placeholder_values(request):
+@compressed
+async def placeholder_values(request):
     # Only accept POST requests
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST requests are allowed'}, status=405)
@@ -98,6 +188,8 @@ def placeholder_values(request):
         data = json.loads(request.body)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Request must be a JSON object'}, status=400)
     
     # check if file_text is in the request
     if 'file_text' not in data:
@@ -107,35 +199,50 @@ def placeholder_values(request):
     file_text = data['file_text']
 
     # Get template text if provided, otherwise use default
-    default_template = "ein und stelle folgendes\n\nRechtbegehren:\n \n${counter}\n\nBegründung:\n\nI.\tFormelles\n\n\n${formelles}\n\n \nII.\tMaterielles\n\n\n${materielles}\n\n\n\n\n\n\nFreundliche Grüsse\n"
-    template_text = data.get('template_text', default_template)
+    template_text = data.get('template_text', DEFAULT_TEMPLATE_TEXT)
     
     # Get placeholder regex if provided
     placeholder_regex = data.get('placeholder_regex', None)
+
+    # A registered template replaces template_text and placeholder_regex
+    if data.get('template'):
+        template = await Template.objects.filter(key=data['template']).afirst()
+        if template is None:
+            return JsonResponse({'error': 'Unknown template'}, status=404)
+        template_text, placeholder_regex = template.text, template.placeholder_regex
     
     # check if file_text is null or empty
     if not file_text:
         return JsonResponse({'error': 'file_text cannot be empty'}, status=400)
+    if not isinstance(file_text, str):
+        return JsonResponse({'error': 'file_text must be a string'}, status=400)
+    for name, value in (('template_text', template_text), ('placeholder_regex', placeholder_regex)):
+        if value is not None and not isinstance(value, str):
+            return JsonResponse({'error': f'{name} must be a string'}, status=400)
+    # Also caches the inventory used for the coalescing key
+    try:
+        get_inventory(template_text or '', placeholder_regex)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
     # Check if mock parameter is set to true
     use_mock = data.get('mock', False)
+
+    # Response shaping: selected fields, JSON or NDJSON (one line per placeholder value)
+    try:
+        fields = _response_fields(data.get('fields', request.GET.get('fields')))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    output_format = data.get('format', request.GET.get('format'))
+    if output_format is None:
+        output_format = 'ndjson' if 'application/x-ndjson' in request.headers.get('Accept', '') else 'json'
+    if output_format not in ('json', 'ndjson'):
+        return JsonResponse({'error': 'format must be json or ndjson'}, status=400)
     
-    # Prepare input data
-    file_data = {'text': file_text}
-    template_data = {'text': template_text} if template_text else None
-    
-    # Add regex to file_data if provided
-    if placeholder_regex:
-        file_data['placeholder_regex'] = placeholder_regex
-    
-    if use_mock:
-        # Use mock values if explicitly requested
-        from .ai_lawyer_service import get_placeholder_mock_values
-        filled_placeholder_array = get_placeholder_mock_values(file_data, template_data)
-        ai_prompt = None
-    else:
-        # Use OpenAI API for real values
-        filled_placeholder_array, ai_prompt = get_placeholder_values(file_data, parsed_json_template_file=template_data)
+    # The LLM call is awaited, so the worker is free while it is in flight
+    filled_placeholder_array, ai_prompt = await generate_placeholder_values(
+        file_text, template_text, placeholder_regex, use_mock, user=await _client_id(request)
+    )
 
     response = {
         'placeholder_values': filled_placeholder_array,
@@ -145,8 +252,210 @@ def placeholder_values(request):
     # Include AI prompt in response if available
     if ai_prompt:
         response['prompt'] = ai_prompt
+    response = {field: response[field] for field in fields if field in response}
 
+    if output_format == 'ndjson':
+        names = get_inventory(template_text, placeholder_regex).placeholders if template_text else ()
+        return StreamingHttpResponse(_ndjson_lines(response, names), content_type='application/x-ndjson')
     return JsonResponse(response)
 
+def search(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET requests are allowed'}, status=405)
+
+    query = request.GET.get('q', '').strip()
+    filters = {name: request.GET.get(name, '').strip() for name in ('court', 'party', 'case_number')}
+    if not query and not any(filters.values()):
+        return JsonResponse({'error': 'q, court, party or case_number is required'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    fields = [field for field in request.GET.get('fields', '').split(',') if field]
+
+    start = time.perf_counter()
+    # Structured filters are answered from the case tables
+    cases = find_cases(**filters) if any(filters.values()) else None
+    try:
+        if query:
+            results = search_documents(query, limit, fields or None, cases)
+        else:
+            results = case_summaries(cases, limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'query': query,
+        'results': results,
+        'took_ms': round((time.perf_counter() - start) * 1000, 2),
+    })
+
+def reuse_stats(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET requests are allowed'}, status=405)
+    return JsonResponse(get_reuse_stats())
+
+def _usage_totals(queryset, group_by):
+    rows = queryset.values(group_by).annotate(
+        requests=Count('id'), input_tokens=Sum('input_tokens'), output_tokens=Sum('output_tokens'), cost=Sum('cost'),
+    ).order_by('-cost')
+    return {row.pop(group_by): dict(row, cost=round(row['cost'], 4)) for row in rows}
+
+def llm_usage(request):
+    # Only with DEBUG or for staff users: the totals name every user and client address with their spend
+    if not (settings.DEBUG or request.user.is_staff):
+        raise Http404()
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET requests are allowed'}, status=405)
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        return JsonResponse({'error': 'days must be a number'}, status=400)
+    # The scheduler state is that of the worker process answering this request
+    usage = LlmUsage.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+    return JsonResponse({
+        'scheduler': get_scheduler().state(),
+        'days': days,
+        'by_priority': _usage_totals(usage, 'priority'),
+        'by_user': _usage_totals(usage, 'user'),
+    })
+
+def debug_memory(request):
+    # Only with DEBUG or for staff users: the report names source files and allocation sites
+    if not (settings.DEBUG or request.user.is_staff):
+        raise Http404()
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET requests are allowed'}, status=405)
+    try:
+        allocations = min(int(request.GET.get('allocations', 20)), 200)
+    except ValueError:
+        return JsonResponse({'error': 'allocations must be a number'}, status=400)
+    return JsonResponse(memory_report(allocations))
+
+def debug_profiles(request):
+    # Same access as debug_memory; profiles are recorded with the X-Emify-Profile header (see profiling.py)
+    if not (settings.DEBUG or request.user.is_staff):
+        raise Http404()
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET requests are allowed'}, status=405)
+    profiles = list_profiles()
+    for profile in profiles:
+        profile['downloads'] = {
+            extension: reverse('debug_profile', args=[profile['id'], extension]) for extension in ('prof', 'txt', 'json')
+        }
+    return JsonResponse({'profiles': profiles})
+
+def debug_trace(request, trace_id):
+    # Same access as debug_memory: spans name documents and users
+    if not (settings.DEBUG or request.user.is_staff):
+        raise Http404()
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET requests are allowed'}, status=405)
+    spans = load_trace(trace_id)
+    if not spans:
+        raise Http404("Trace not found.")
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'trace_id': trace_id, 'spans': spans})
+    return HttpResponse(format_trace(spans), content_type='text/plain; charset=utf-8')
+
+def debug_profile(request, profile_id, extension):
+    if not (settings.DEBUG or request.user.is_staff):
+        raise Http404()
+    file_path = profile_path(profile_id, extension)
+    if file_path is None:
+        raise Http404("Profile not found.")
+    return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=f"profile-{profile_id}.{extension}")
+
+def _template_json(template):
+    return {
+        'key': template.key,
+        'name': template.name,
+        'kind': 'docx' if template.is_docx else 'text',
+        'placeholders': template.placeholders,
+        'placeholder_count': template.placeholder_count,
+        'created_at': template.created_at.isoformat(),
+    }
+
+@csrf_exempt
+def templates(request):
+    if request.method == 'GET':
+        return JsonResponse({'templates': [_template_json(t) for t in Template.objects.order_by('-created_at')]})
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only GET and POST requests are allowed'}, status=405)
+
+    # JSON for text templates, multipart for DOCX uploads
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'error': 'Request must be a JSON object'}, status=400)
+        docx = None
+    else:
+        data = request.POST
+        docx = request.FILES.get('file')
+    if not isinstance(data.get('name', ''), str):
+        return JsonResponse({'error': 'name must be a string'}, status=400)
+    for field in ('template_text', 'placeholder_regex'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return JsonResponse({'error': f'{field} must be a string'}, status=400)
+    try:
+        template, created = register_template(
+            name=data.get('name', ''), text=data.get('template_text'), docx=docx,
+            placeholder_regex=data.get('placeholder_regex'),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(_template_json(template), status=201 if created else 200)
+
+@csrf_exempt
+async def batch(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST requests are allowed'}, status=405)
+
+    # Several documents under 'files' (or 'file'); ZIP archives are unpacked
+    uploads = request.FILES.getlist('files') + request.FILES.getlist('file')
+    try:
+        files = await sync_to_async(collect_files, thread_sensitive=False)(uploads)
+    except BatchError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return StreamingHttpResponse(run_batch(files, await _client_id(request)), content_type='application/x-ndjson')
+
+@csrf_exempt
+async def render_klageantworten(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST requests are allowed'}, status=405)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Request must be a JSON object'}, status=400)
+    keys = data.get('templates')
+    if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+        return JsonResponse({'error': 'templates must be a list of template keys'}, status=400)
+
+    document = await UploadedFile.objects.filter(sha256=data.get('document') or '').afirst()
+    if document is None:
+        return JsonResponse({'error': 'Document not found'}, status=404)
+    try:
+        templates = await sync_to_async(resolve_templates, thread_sensitive=False)(keys)
+        style = await sync_to_async(style_template, thread_sensitive=False)(data['style']) \
+            if data.get('style') else None
+    except (FanoutError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    try:
+        result = await render_templates(document, templates, await _client_id(request), style)
+    except PoolBusy:
+        response = JsonResponse({'error': 'Server is busy, please try again shortly'}, status=503)
+        response['Retry-After'] = '5'
+        return response
+    except JobTimeout:
+        return JsonResponse({'error': 'Processing the file took too long'}, status=504)
+    except WorkerCrashed:
+        return JsonResponse({'error': 'Processing the file failed, please try again'}, status=500)
+    return JsonResponse(result)
+
 def nada(request):
      return render(request, 'home.html')
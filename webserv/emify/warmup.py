@@ -0,0 +1,82 @@
+import importlib
+import logging
+import os
+import time
+from typing import Dict
+
+from django.conf import settings
+
+from .anchors import get_ruleset
+from .parsing import HEAVY_MODULES
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_parser() -> None:
+    """Import PyMuPDF and python-docx and compile the section anchor matcher."""
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    get_ruleset()
+
+
+def warm_up_template() -> None:
+    """
+    Load the default DOCX template and the placeholder inventories that send_file reuses.
+
+    The template file is read and its registration looked up once, and the
+    inventories of the DOCX and the default text template are cached.
+    """
+    from .pipeline import DEFAULT_TEMPLATE_TEXT
+    from .placeholders import get_inventory
+    from .template_registry import default_docx_template, template_inventory
+
+    template_inventory(default_docx_template())
+    get_inventory(DEFAULT_TEMPLATE_TEXT)
+
+
+def warm_up_llm() -> None:
+    """Create the async OpenAI client that requests use (imports the SDK and loads .env)."""
+    from .ai_lawyer_service import get_async_client, placeholder_values_format
+
+    get_async_client()
+    placeholder_values_format()
+
+
+def warm_up_job_worker() -> None:
+    """Initializer of job pool processes: preload what parse and render jobs need."""
+    # Render jobs open the template they are given, so only the libraries can be preloaded
+    warm_up_parser()
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Preload the parser, the default template and the LLM client in a web worker.
+
+    Called once per worker process from asgi.py / wsgi.py (disable with
+    EMIFY_WARM_UP=0), so the first request does not pay for the imports
+    that are deferred to keep management commands fast. The processes of the
+    job pool are started as well and run warm_up_job_worker.
+
+    Returns:
+        Seconds spent per step
+    """
+    steps = [('parser', warm_up_parser), ('template', warm_up_template)]
+    if settings.LLM_BACKEND != 'mock':
+        steps.append(('llm', warm_up_llm))
+    if settings.WARM_UP_JOB_POOL:
+        from .job_pool import get_job_pool
+
+        steps.append(('job_pool', get_job_pool().start_workers))
+
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # A failed step is retried implicitly by the first request that needs it
+            logger.exception("Warm-up step %s failed", name)
+        timings[name] = time.perf_counter() - start
+    logger.info("Worker %d warmed up: %s", os.getpid(),
+                ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items()))
+    return timings